@@ -0,0 +1,49 @@
+"""
+⏱️ Бенчмарк кэша проверенных access токенов (src/auth/jwt.py).
+
+Сравнивает jwt.decode на каждый запрос с verify_access_token, который
+отдаёт payload из _verified_access_tokens. Нужны те же переменные
+окружения, что и приложению (.env):
+
+    uv run python -m benchmarks.access_token_cache [--calls 50000] [--repeat 3]
+"""
+
+import argparse
+import timeit
+from collections.abc import Callable
+
+import jwt
+
+from src.auth.jwt import _verified_access_tokens, create_access_token, verify_access_token
+from src.config import config
+
+
+def best_of(statement: Callable[[], None], calls: int, repeat: int) -> float:
+    """Лучшее из repeat прогонов — микросекунд на один вызов."""
+    return min(timeit.repeat(statement, number=calls, repeat=repeat)) / calls * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": "0" * 24})
+    _verified_access_tokens.clear()
+
+    def decode() -> None:
+        _ = jwt.decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+
+    def cached() -> None:
+        _ = verify_access_token(token)
+
+    print(f"{config.JWT_ALGORITHM}, {args.calls} calls of one token, best of {args.repeat}")
+    print(f"  jwt.decode per request:     {best_of(decode, args.calls, args.repeat):8.2f} us")
+    print(f"  cached verify_access_token: {best_of(cached, args.calls, args.repeat):8.2f} us")
+    stats = _verified_access_tokens.stats()
+    print(f"  cache hits / misses:        {stats['hits']} / {stats['misses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from typing import Any
@@ -7,6 +8,10 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.encoders import jsonable_encoder
 
+from src.auth.google_certs import google_certs
+from src.auth.passwords import password_pool
+from src.auth.user_cache import build_invalidation_backend, user_cache
+from src.config import config
 from src.database import init_db
 from src.routers import (
     account,
@@ -15,18 +20,31 @@ from src.routers import (
     auth,
     budget,
     categories,
+    metrics,
     payment_methods,
     plaid,
     transactions,
 )
+from src.utils.categories import default_categories
+from src.utils.category_jobs import resume_category_jobs
+from src.utils.responses import MongoORJSONResponse
 
 _ = load_dotenv()
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI) -> AsyncGenerator[Any]:
-    await init_db()
+    mongo_client = await init_db()
+    await default_categories.load()
+    await user_cache.start(build_invalidation_backend())
+    # ♻️ Каскады по категориям, брошенные прошлым запуском воркера
+    category_jobs = asyncio.create_task(resume_category_jobs())
     yield
+    _ = category_jobs.cancel()
+    await user_cache.close()
+    password_pool.shutdown()
+    await google_certs.close()
+    mongo_client.close()
 
 
 def custom_encoder(obj: Any) -> Any:
@@ -40,6 +58,7 @@ app = FastAPI(
     description="API for tracking expenses and managing budgets",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=MongoORJSONResponse,
     json_encoders={PydanticObjectId: str},
 )
 
@@ -56,6 +75,8 @@ app.include_router(ai.router)  # AI
 app.include_router(analytics.router)  # Аналитика
 app.include_router(payment_methods.router)  # Способы оплаты
 app.include_router(plaid.router)  # Plaid
+if config.METRICS_TOKEN:
+    app.include_router(metrics.router)  # Метрики воркера (по METRICS_TOKEN)
 
 
 @app.get("/")
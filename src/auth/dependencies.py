@@ -1,6 +1,9 @@
 # Annotated нужен для объявления зависимостей (здесь — токен из запроса)
 from typing import Annotated
 
+# InvalidId — ошибка, если в токене лежит строка, не похожая на ObjectId
+from bson.errors import InvalidId
+
 # Импорт зависимостей из FastAPI
 from fastapi import Depends, HTTPException, status
 
@@ -16,6 +19,9 @@ from src.auth.exceptions import raise_unauthorized_error
 # Импорт нашей функции для верификации токена
 from src.auth.jwt import verify_access_token
 
+# Кэш пользователей (LRU/TTL с инвалидацией между воркерами)
+from src.auth.user_cache import user_cache
+
 # Импорт модели пользователя из базы (Beanie модель)
 from src.models import User
 
@@ -38,14 +44,14 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Use
         if user_id is None:
             raise_unauthorized_error("Invalid token: user ID not found")
 
-        # Ищем пользователя по ID в базе данных
-        user = await User.get(user_id)
+        # Ищем пользователя по ID: сначала в кэше, потом в базе данных
+        user = await user_cache.get_user(str(user_id))
 
         # Если пользователь не найден — значит токен "указал" на несуществующего
         if user is None:
             raise_unauthorized_error("User not found")
 
-    except JWTError:
+    except (JWTError, InvalidId):
         raise_unauthorized_error("Could not validate credentials")
     else:
         return user
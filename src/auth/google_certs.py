@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import logging
+import re
+import time
+from typing import Any
+
+import httpx
+import jwt
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+# Публичные сертификаты Google, которыми подписаны id_token (kid -> PEM)
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Если Google не прислал max-age — держим ключи час
+DEFAULT_MAX_AGE_SECONDS = 3600
+# За сколько секунд до истечения начинаем фоновое обновление
+REFRESH_MARGIN_SECONDS = 300
+# Незнакомый kid может прислать кто угодно — из-за него ходим в Google не чаще раза в минуту
+MIN_FORCED_REFRESH_SECONDS = 60
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def parse_max_age(cache_control: str | None) -> int:
+    """Достаёт max-age из заголовка Cache-Control."""
+    if cache_control:
+        match = _MAX_AGE_RE.search(cache_control)
+        if match:
+            return int(match.group(1))
+    return DEFAULT_MAX_AGE_SECONDS
+
+
+class GoogleCertsCache:
+    """
+    🔑 Кэш сертификатов Google для локальной проверки id_token.
+
+    - ключи живут столько, сколько разрешает Cache-Control
+    - незадолго до истечения обновляются в фоне, запрос не ждёт
+    - скачивание идёт через асинхронный httpx и не блокирует event loop
+    """
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL) -> None:
+        self.url = url
+        self._certs: dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task[None] | None = None
+
+    def _is_fresh(self, kid: str | None, now: float) -> bool:
+        return bool(self._certs) and now < self._expires_at and (not kid or kid in self._certs)
+
+    async def get_certs(self, kid: str | None = None) -> dict[str, str]:
+        now = time.monotonic()
+        if not self._is_fresh(kid, now):
+            # Ключей нет, они протухли или Google уже ротировал ключ — ждём загрузку
+            await self._refresh_for(kid)
+        elif now >= self._expires_at - REFRESH_MARGIN_SECONDS:
+            self._schedule_refresh()
+        return self._certs
+
+    async def _refresh_for(self, kid: str | None) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            # Пока ждали блокировку, ключи мог обновить другой запрос
+            if self._is_fresh(kid, now):
+                return
+            # Ключи ещё действуют, а kid незнакомый — недавно уже ходили, не повторяем
+            if (
+                self._certs
+                and now < self._expires_at
+                and now - self._fetched_at < MIN_FORCED_REFRESH_SECONDS
+            ):
+                return
+            await self._fetch()
+
+    async def refresh(self) -> None:
+        """Фоновое обновление незадолго до истечения ключей."""
+        async with self._lock:
+            # Пока ждали блокировку, ключи мог обновить другой запрос
+            if time.monotonic() < self._expires_at - REFRESH_MARGIN_SECONDS:
+                return
+            await self._fetch()
+
+    async def _fetch(self) -> None:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.get(self.url)
+            _ = response.raise_for_status()
+
+        certs = response.json()
+        if not isinstance(certs, dict):
+            raise ValueError("Unexpected Google certs response")
+
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + parse_max_age(response.headers.get("cache-control"))
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            # Старые ключи ещё действуют — попробуем на следующем запросе
+            logger.warning("Failed to refresh Google certs", exc_info=True)
+
+    async def close(self) -> None:
+        if self._refresh_task is not None:
+            _ = self._refresh_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresh_task
+            self._refresh_task = None
+
+
+google_certs = GoogleCertsCache()
+
+
+async def verify_google_id_token(id_token_str: str) -> dict[str, Any]:
+    """
+    Проверяет подпись и поля Google id_token локально по закэшированным ключам.
+    Бросает ValueError, если токен невалиден или просрочен.
+    """
+    try:
+        kid = jwt.get_unverified_header(id_token_str).get("kid")
+    except jwt.InvalidTokenError as e:
+        raise ValueError("Malformed Google ID token") from e
+
+    # google-auth грузим только при первом входе через Google
+    from google.auth import jwt as google_jwt
+
+    certs = await google_certs.get_certs(kid)
+    id_info = google_jwt.decode(id_token_str, certs=certs, audience=config.GOOGLE_CLIENT_ID)
+
+    if id_info.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError("Wrong issuer for Google ID token")
+
+    return id_info
@@ -1,17 +1,17 @@
 from fastapi import HTTPException, status
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
 
 from src.auth.dependencies import validate_google_names
 from src.auth.exceptions import (
     raise_conflict_error,
     raise_invalid_token_error,
 )
+from src.auth.google_certs import verify_google_id_token
 from src.auth.jwt import (
     create_access_token,
     create_refresh_token,
     save_refresh_token_to_db,
 )
+from src.auth.user_cache import invalidate_user
 from src.models import User
 from src.schemas.base import TokenResponse
 
@@ -19,18 +19,15 @@ from src.schemas.base import TokenResponse
 async def handle_google_login(id_token_str: str) -> TokenResponse:
     """
     🔐 Обрабатывает логин через Google:
-    - проверяет подлинность id_token
+    - проверяет подлинность id_token локально по закэшированным ключам Google
     - извлекает email и Google ID
     - находит или создаёт пользователя
     - возвращает access и refresh токены
     """
 
     try:
-        # ✅ Проверяем подлинность токена (через Google-сервер)
-        id_info = id_token.verify_oauth2_token(
-            id_token_str,
-            google_requests.Request(),
-        )
+        # ✅ Проверяем подлинность токена (ключи Google берутся из кэша)
+        id_info = await verify_google_id_token(id_token_str)
 
         email = id_info.get("email")
         google_sub = id_info.get("sub")
@@ -40,12 +37,17 @@ async def handle_google_login(id_token_str: str) -> TokenResponse:
                 "Invalid Google token: missing required fields (email or sub)."
             )
 
-        # 🔍 Ищем по google_id
-        user = await User.find_one({"google_id": google_sub})
+        # 🔍 Ищем по google_id или email одним запросом
+        candidates = await User.find(
+            {"$or": [{"google_id": google_sub}, {"email": email}]}
+        ).limit(2).to_list()
+
+        # Совпадение по google_id важнее совпадения по email
+        user = next((u for u in candidates if u.google_id == google_sub), None)
 
         if not user:
-            # 🔁 Пробуем найти по email
-            user = await User.find_one({"email": email})
+            # 🔁 Пользователь с таким email
+            user = candidates[0] if candidates else None
 
             if user:
                 # ⚠️ Email уже используется обычным юзером
@@ -55,8 +57,8 @@ async def handle_google_login(id_token_str: str) -> TokenResponse:
                     )
                 else:
                     # 🔧 Обновляем google_id, если не было
-                    user.google_id = google_sub
-                    _ = await user.save()
+                    _ = await user.set({User.google_id: google_sub})
+                    await invalidate_user(user.id)
             else:
                 # 🆕 Новый пользователь
                 given_name = id_info.get("given_name")
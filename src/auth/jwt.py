@@ -1,4 +1,6 @@
+import hashlib
 import secrets
+import time
 from datetime import (  # Работа с текущим временем и вычислением срока действия токена
     UTC,
     datetime,
@@ -7,11 +9,21 @@ from datetime import (  # Работа с текущим временем и в
 from typing import Any  # Removed Union import as it's no longer needed
 
 import jwt
-from beanie import PydanticObjectId
+from beanie import PydanticObjectId, UpdateResponse
+from beanie.operators import Set
 from fastapi import HTTPException, status
 
 from src.config import config
 from src.models import RefreshToken
+from src.utils.metrics import register_metrics
+from src.utils.ttl_cache import TTLCache
+
+# 🧠 Уже проверенные access токены: sha256(токен) -> payload, живут до своего exp
+_verified_access_tokens: TTLCache[bytes, dict[str, Any]] = TTLCache(
+    maxsize=config.ACCESS_TOKEN_CACHE_SIZE,
+    ttl=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+register_metrics("access_token_cache", _verified_access_tokens.stats)
 
 
 def create_access_token(data: dict[str, Any]) -> str:
@@ -44,10 +56,20 @@ def verify_access_token(token: str) -> dict[str, Any]:
     Возвращает:
     - Словарь (payload), если токен валидный
     - Ошибка, если токен подделан или истёк
+
+    Клиент переиспользует один токен до его истечения, поэтому успешно
+    проверенный payload кэшируется по хешу токена до его exp.
     """
+    digest = hashlib.sha256(token.encode()).digest()
+
+    # ⚡ Токен уже проверяли — подпись повторно не считаем
+    cached = _verified_access_tokens.get(digest)
+    if cached is not None:
+        return dict(cached)
+
     try:
         # 🔐 Пытаемся расшифровать токен с помощью секретного ключа
-        return jwt.decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+        payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
     except jwt.InvalidTokenError:
         # ❌ Если токен невалидный или истёк - возвращаем 401 Unauthorized
         # from None - скрываем оригинальный traceback, так как он не нужен клиенту
@@ -55,6 +77,15 @@ def verify_access_token(token: str) -> dict[str, Any]:
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token"
         ) from None
 
+    # Кэшируем только токены с exp, и не дольше, чем они живут
+    exp = payload.get("exp")
+    if isinstance(exp, int | float):
+        ttl = exp - time.time()
+        if ttl > 0:
+            _verified_access_tokens.set(digest, dict(payload), ttl=ttl)
+
+    return payload
+
 
 def create_refresh_token() -> tuple[str, datetime, datetime]:
     """
@@ -66,32 +97,59 @@ def create_refresh_token() -> tuple[str, datetime, datetime]:
     return token, created_at, expires_at
 
 
-async def verify_refresh_token(token: str) -> RefreshToken:
+def hash_refresh_token(token: str) -> str:
     """
-    Проверяет, существует ли переданный refresh токен в базе,
-    и не истёк ли его срок действия.
-    Возвращает Beanie-документ, если токен валиден.
+    SHA-256 от refresh токена. В базе хранится только хеш,
+    поэтому утечка коллекции не даёт рабочих токенов.
     """
+    return hashlib.sha256(token.encode()).hexdigest()
 
-    # 🔎 Ищем токен в MongoDB по значению токена
-    token_doc = await RefreshToken.find_one(RefreshToken.token == token)
 
-    # ❌ Если токен не найден — выбрасываем ошибку 401
-    if not token_doc:
+async def rotate_refresh_token(token: str) -> tuple[PydanticObjectId, str]:
+    """
+    Атомарно меняет refresh токен на новый одним find_one_and_update.
+    Просроченный токен не найдётся (его удалит TTL-индекс).
+    Возвращает ID пользователя и новый токен.
+    """
+    new_token, created_at, expires_at = create_refresh_token()
+
+    token_doc = await RefreshToken.find_one(
+        RefreshToken.token_hash == hash_refresh_token(token),
+        RefreshToken.expires_at > created_at,
+    ).update(
+        Set(
+            {
+                RefreshToken.token_hash: hash_refresh_token(new_token),
+                RefreshToken.created_at: created_at,
+                RefreshToken.expires_at: expires_at,
+            }
+        ),
+        response_type=UpdateResponse.NEW_DOCUMENT,
+    )
+
+    # ❌ Токен не найден, уже использован или истёк
+    if not isinstance(token_doc, RefreshToken):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token"
         )
 
-    # ⏳ Если токен просрочен
-    if token_doc.expires_at.replace(tzinfo=UTC) < datetime.now(UTC):
-        _ = await token_doc.delete()  # 💀 Удаляем просроченный токен из базы
+    return token_doc.user_id, new_token
+
+
+async def revoke_refresh_token(token: str) -> None:
+    """
+    Удаляет refresh токен одним delete_one по хешу.
+    """
+    result = await RefreshToken.find_one(
+        RefreshToken.token_hash == hash_refresh_token(token),
+        RefreshToken.expires_at > datetime.now(UTC),
+    ).delete()
+
+    if not result or not result.deleted_count:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token expired"
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token"
         )
 
-    # ✅ Всё в порядке — возвращаем найденный документ
-    return token_doc
-
 
 async def save_refresh_token_to_db(
     user_id: str, token: str, created_at: datetime, expires_at: datetime
@@ -101,7 +159,7 @@ async def save_refresh_token_to_db(
     """
     refresh_token_doc = RefreshToken(
         user_id=PydanticObjectId(user_id),  # Convert string ID to PydanticObjectId
-        token=token,  # Уникальный токен, безопасно сгенерированный
+        token_hash=hash_refresh_token(token),  # Храним только хеш токена
         created_at=created_at,  # Время создания токена
         expires_at=expires_at,  # Время, когда токен истекает
     )
@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import logging
+from collections import Counter
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from beanie import PydanticObjectId
+
+from src.config import config
+from src.models import User
+from src.utils.metrics import register_metrics
+from src.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# ────────────── 📡 Бэкенды инвалидации ──────────────
+
+InvalidateCallback = Callable[[str], None]
+ResetCallback = Callable[[], None]
+
+
+class InvalidationBackend(Protocol):
+    """
+    📡 Канал, через который воркеры сообщают друг другу об изменении пользователя
+    """
+
+    async def start(self, on_invalidate: InvalidateCallback, on_reset: ResetCallback) -> None:
+        """on_reset — сообщения могли потеряться (переподключение), кэш надо сбросить целиком."""
+        ...
+
+    async def publish(self, user_id: str) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class InMemoryInvalidationBackend:
+    """
+    🧠 Инвалидация в пределах одного процесса (один воркер, локальная разработка)
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: list[InvalidateCallback] = []
+
+    async def start(self, on_invalidate: InvalidateCallback, on_reset: ResetCallback) -> None:
+        self._subscribers.append(on_invalidate)
+
+    async def publish(self, user_id: str) -> None:
+        for callback in self._subscribers:
+            callback(user_id)
+
+    async def close(self) -> None:
+        self._subscribers.clear()
+
+
+RECONNECT_MIN_DELAY = 0.5  # Секунд до первой попытки переподключиться к Redis
+RECONNECT_MAX_DELAY = 30.0
+
+
+class RedisInvalidationBackend:
+    """
+    🔴 Инвалидация между воркерами через Redis pub/sub.
+    Клиент можно передать снаружи (например, fakeredis в тестах).
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        channel: str = "user-cache-invalidation",
+        client: Any = None,
+    ) -> None:
+        if client is None:
+            if not url:
+                raise RuntimeError("REDIS_URL is required for the redis user cache backend")
+            # 📦 redis — опциональная зависимость, импортируем только когда она нужна
+            from redis.asyncio import Redis
+
+            client = Redis.from_url(url, decode_responses=True)
+
+        self._client = client
+        self._channel = channel
+        self._pubsub: Any = None
+        self._listener: asyncio.Task[None] | None = None
+
+    async def start(self, on_invalidate: InvalidateCallback, on_reset: ResetCallback) -> None:
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen(on_invalidate, on_reset))
+
+    async def _subscribe(self) -> None:
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self._channel)
+
+    async def _unsubscribe(self) -> None:
+        if self._pubsub is None:
+            return
+        with contextlib.suppress(Exception):
+            await self._pubsub.unsubscribe(self._channel)
+        with contextlib.suppress(Exception):
+            await self._pubsub.aclose()
+        self._pubsub = None
+
+    async def _listen(self, on_invalidate: InvalidateCallback, on_reset: ResetCallback) -> None:
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    # 🔌 Пока нас не было, инвалидации могли пройти мимо
+                    on_reset()
+                    delay = RECONNECT_MIN_DELAY
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = message["data"]
+                    on_invalidate(data.decode() if isinstance(data, bytes) else str(data))
+                # listen() закончился без ошибки — соединение закрыто, переподключаемся
+                raise ConnectionError("Redis pub/sub connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning(
+                    "User cache invalidation channel failed, reconnecting in %.1fs",
+                    delay,
+                    exc_info=True,
+                )
+                await self._unsubscribe()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def publish(self, user_id: str) -> None:
+        _ = await self._client.publish(self._channel, user_id)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            _ = self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+        await self._unsubscribe()
+        await self._client.aclose()
+
+
+def build_invalidation_backend() -> InvalidationBackend:
+    """Создаёт бэкенд инвалидации по настройке USER_CACHE_BACKEND."""
+    if config.USER_CACHE_BACKEND == "redis":
+        return RedisInvalidationBackend(url=config.REDIS_URL)
+    return InMemoryInvalidationBackend()
+
+
+# ────────────── 👤 Кэш пользователей ──────────────
+
+
+class UserCache:
+    """
+    👤 LRU/TTL-кэш документов User для get_current_user.
+
+    Хранит копии документов и отдаёт копии, чтобы обработчики
+    не могли изменить закэшированный объект.
+
+    Промах читает пользователя из MongoDB; если за время чтения пришла
+    инвалидация этого пользователя, прочитанный документ мог уже устареть —
+    его отдаём, но в кэш не кладём.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache: TTLCache[str, User] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._backend: InvalidationBackend = InMemoryInvalidationBackend()
+        # Поколение пользователя растёт с каждой инвалидацией; храним только
+        # для тех, кого сейчас читаем из MongoDB
+        self._loading: Counter[str] = Counter()
+        self._generations: dict[str, int] = {}
+
+    async def start(self, backend: InvalidationBackend) -> None:
+        self._backend = backend
+        await backend.start(self.discard, self.reset)
+
+    async def close(self) -> None:
+        await self._backend.close()
+        self._cache.clear()
+
+    async def get_user(self, user_id: str) -> User | None:
+        """Отдаёт пользователя из кэша, при промахе — из MongoDB."""
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return cached.model_copy(deep=True)
+
+        self._loading[user_id] += 1
+        generation = self._generations.setdefault(user_id, 0)
+        try:
+            user = await User.get(PydanticObjectId(user_id))
+        finally:
+            self._loading[user_id] -= 1
+            stale = self._generations[user_id] != generation
+            if not self._loading[user_id]:
+                del self._loading[user_id]
+                del self._generations[user_id]
+
+        if user is not None and not stale:
+            self._cache.set(user_id, user.model_copy(deep=True))
+        return user
+
+    def discard(self, user_id: str) -> None:
+        """Удаляет пользователя только из локального кэша."""
+        self._cache.pop(user_id)
+        if user_id in self._generations:
+            self._generations[user_id] += 1
+
+    def reset(self) -> None:
+        """Сбрасывает локальный кэш целиком (в том числе идущие сейчас чтения)."""
+        self._cache.clear()
+        for user_id in self._generations:
+            self._generations[user_id] += 1
+
+    async def invalidate(self, user_id: PydanticObjectId | str) -> None:
+        """Удаляет пользователя из кэша во всех воркерах."""
+        key = str(user_id)
+        self.discard(key)
+        await self._backend.publish(key)
+
+    def stats(self) -> dict[str, Any]:
+        return self._cache.stats()
+
+
+user_cache = UserCache(
+    maxsize=config.USER_CACHE_MAX_SIZE,
+    ttl=config.USER_CACHE_TTL_SECONDS,
+)
+register_metrics("user_cache", user_cache.stats)
+
+
+async def invalidate_user(user_id: PydanticObjectId | str | None) -> None:
+    """Вызывается после любой записи в документ пользователя."""
+    if user_id is not None:
+        await user_cache.invalidate(user_id)
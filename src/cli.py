@@ -0,0 +1,169 @@
+"""
+🛠️ Служебные команды (запуск: python -m src.cli <команда>)
+
+- precompute-ai-tips — ночной пересчёт советов AI для пользователей с новыми тратами
+- manage-indexes — сверка индексов моделей с базой и создание недостающих
+- migrate — миграции данных пачками с чекпоинтами (можно прервать и продолжить)
+- resume-category-jobs — довести каскады по категориям, брошенные упавшим воркером
+"""
+
+import argparse
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+from src.config import config
+from src.database import DOCUMENT_MODELS, init_db
+from src.integrations.openai import get_openai_client
+from src.utils.ai_tips_batch import precompute_ai_tips
+from src.utils.categories import default_categories
+from src.utils.category_jobs import resume_category_jobs
+from src.utils.indexes import create_missing_indexes, diff_indexes
+from src.utils.migrations import MIGRATIONS, MigrationLockedError, run_migration
+
+
+async def run_precompute_ai_tips(args: argparse.Namespace) -> None:
+    try:
+        # Повторы делает сам батч (с учётом лимита RPS), поэтому у клиента они выключены
+        client = get_openai_client().with_options(max_retries=0)
+    except RuntimeError as e:
+        raise SystemExit(str(e)) from e
+
+    mongo_client = await init_db()
+    since = datetime.now(UTC) - timedelta(hours=args.since_hours)
+
+    try:
+        stats = await precompute_ai_tips(
+            client,
+            since,
+            concurrency=args.concurrency,
+            rps=args.rps,
+            max_retries=args.max_retries,
+        )
+    finally:
+        await client.close()
+        mongo_client.close()
+
+    print("✅ AI tips:", dict(stats))
+
+
+async def run_manage_indexes(args: argparse.Namespace) -> None:
+    mongo_client = await init_db(skip_indexes=True)
+
+    try:
+        await sync_indexes(dry_run=args.dry_run)
+    finally:
+        mongo_client.close()
+
+
+async def sync_indexes(*, dry_run: bool) -> None:
+    for model in DOCUMENT_MODELS:
+        diff = await diff_indexes(model)
+        for index in diff.missing:
+            print(f"➕ {diff.collection}: {index.name}")
+        for index in diff.conflicting:
+            print(f"⚠️ {diff.collection}: {index.name} — есть индекс с теми же полями, но другими опциями")
+        for index in diff.extra:
+            print(f"ℹ️ {diff.collection}: {index.name} — не объявлен в модели (не удаляем)")
+
+        if not dry_run:
+            for name in await create_missing_indexes(diff, model):
+                print(f"✅ {diff.collection}: создан {name}")
+
+
+async def run_migrate(args: argparse.Namespace) -> None:
+    if args.list:
+        for name, item in MIGRATIONS.items():
+            print(f"{name} — {item.model.Settings.name}")
+        return
+
+    unknown = [name for name in args.names if name not in MIGRATIONS]
+    if unknown:
+        raise SystemExit(f"Неизвестные миграции: {', '.join(unknown)}")
+
+    mongo_client = await init_db()
+    # Миграции category_id сопоставляют имена и с дефолтными категориями
+    await default_categories.load()
+
+    try:
+        for name in args.names or list(MIGRATIONS):
+            try:
+                state = await run_migration(
+                    MIGRATIONS[name],
+                    batch_size=args.batch_size,
+                    ops_per_second=args.ops_per_second,
+                    restart=args.restart,
+                )
+            except MigrationLockedError:
+                print(f"⏳ {name}: уже выполняется другим процессом")
+                continue
+            print(
+                f"✅ {name}: {state.status} — просмотрено {state.processed}, "
+                f"изменено {state.modified}, пропущено {state.skipped}"
+            )
+    finally:
+        mongo_client.close()
+
+
+async def run_resume_category_jobs(_args: argparse.Namespace) -> None:
+    mongo_client = await init_db()
+
+    try:
+        resumed = await resume_category_jobs()
+    finally:
+        mongo_client.close()
+
+    print(f"✅ Каскады по категориям: продолжено {resumed}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    tips = commands.add_parser(
+        "precompute-ai-tips", help="Пересчитать советы AI для пользователей с новыми тратами"
+    )
+    _ = tips.add_argument(
+        "--since-hours", type=int, default=config.AI_TIPS_BATCH_LOOKBACK_HOURS
+    )
+    _ = tips.add_argument("--concurrency", type=int, default=config.AI_TIPS_BATCH_CONCURRENCY)
+    _ = tips.add_argument("--rps", type=float, default=config.AI_TIPS_BATCH_RPS)
+    _ = tips.add_argument("--max-retries", type=int, default=config.AI_TIPS_BATCH_MAX_RETRIES)
+    tips.set_defaults(handler=run_precompute_ai_tips)
+
+    indexes = commands.add_parser(
+        "manage-indexes", help="Создать индексы из Settings.indexes, которых нет в базе"
+    )
+    _ = indexes.add_argument(
+        "--dry-run", action="store_true", help="Только показать разницу, ничего не создавать"
+    )
+    indexes.set_defaults(handler=run_manage_indexes)
+
+    migrate = commands.add_parser(
+        "migrate", help="Выполнить миграции данных (по умолчанию — все по порядку)"
+    )
+    _ = migrate.add_argument("names", nargs="*", help="Имена миграций (см. --list)")
+    _ = migrate.add_argument("--list", action="store_true", help="Показать доступные миграции")
+    _ = migrate.add_argument("--batch-size", type=int, default=config.MIGRATIONS_BATCH_SIZE)
+    _ = migrate.add_argument(
+        "--ops-per-second", type=float, default=config.MIGRATIONS_OPS_PER_SECOND
+    )
+    _ = migrate.add_argument(
+        "--restart", action="store_true", help="Начать заново, даже если миграция уже выполнена"
+    )
+    migrate.set_defaults(handler=run_migrate)
+
+    category_jobs = commands.add_parser(
+        "resume-category-jobs", help="Довести брошенные каскады по категориям"
+    )
+    category_jobs.set_defaults(handler=run_resume_category_jobs)
+
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import Final
+from typing import Final, Literal
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -7,14 +7,47 @@ _ = load_dotenv()
 
 
 class Config(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
+    # Пустое значение (KEY= в .env) — как не заданное: берётся значение по умолчанию
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True, env_ignore_empty=True)
 
     MONGODB_URI: str
+    # true — воркеры не создают индексы на старте (см. python -m src.cli manage-indexes)
+    MONGODB_SKIP_INDEXES: bool = False
+    # Пул соединений Motor (на один воркер)
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int | None = None  # Сколько ждать свободное соединение
+    MONGODB_COMPRESSORS: str | None = None  # Например "zstd,snappy" (pip install .[mongo-compression])
+    MONGODB_READ_PREFERENCE: Literal[
+        "primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"
+    ] = "primary"
     SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    ACCESS_TOKEN_CACHE_SIZE: int = 10_000  # Сколько проверенных access токенов держать в памяти
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # Кэш пользователей для get_current_user
+    USER_CACHE_MAX_SIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    USER_CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    REDIS_URL: str | None = None
+
+    # Пароли: стоимость bcrypt и размер пула потоков для хеширования
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # Каскады по категориям: сколько транзакций обновлять за один запрос
+    CATEGORY_CASCADE_BATCH_SIZE: int = 1000
+
+    # Миграции данных (python -m src.cli migrate): размер пачки и лимит документов в секунду
+    MIGRATIONS_BATCH_SIZE: int = 500
+    MIGRATIONS_OPS_PER_SECOND: float = 1000.0
+
+    # GET /metrics: без токена эндпоинт не подключается, с ним — только с
+    # заголовком Authorization: Bearer <METRICS_TOKEN>
+    METRICS_TOKEN: str | None = None
+
     # Google OAuth
     GOOGLE_CLIENT_ID: str | None = None
     GOOGLE_CLIENT_SECRET: str | None = None
@@ -24,6 +57,16 @@ class Config(BaseSettings):
     OPENAI_MODEL: str = "gpt-4-turbo"
     OPENAI_TEMPERATURE: float = 0.7
     OPENAI_MAX_TOKENS: int = 300
+    OPENAI_BASE_URL: str | None = None  # Например, локальный фейковый сервер в тестах
+    AI_TIPS_CACHE_TTL_SECONDS: float = 6 * 60 * 60
+    AI_TIPS_CACHE_MAX_SIZE: int = 10_000
+    AI_TIPS_DEADLINE_SECONDS: float = 3.0  # Дольше не ждём OpenAI — отвечаем советами по правилам
+    AI_TIPS_RULES_TIMEOUT_SECONDS: float = 1.0  # Сколько ещё ждать правила после дедлайна OpenAI
+    # Ночной батч советов: параллельность, лимит запросов в секунду к OpenAI, повторы
+    AI_TIPS_BATCH_CONCURRENCY: int = 8
+    AI_TIPS_BATCH_RPS: float = 5.0
+    AI_TIPS_BATCH_MAX_RETRIES: int = 5
+    AI_TIPS_BATCH_LOOKBACK_HOURS: int = 24
 
     # Plaid
     PLAID_CLIENT_ID: str
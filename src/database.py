@@ -1,35 +1,71 @@
-from beanie import init_beanie
+from typing import Any
+
+from beanie import Document, init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from src.config import config
 from src.models import (
+    AITips,
     BankAccount,
     BankConnection,
     BankTransaction,
     Budget,
     Category,
+    CategoryJob,
+    DailyTotal,
+    MigrationState,
     PaymentMethod,
     RefreshToken,
     Transaction,
     User,
 )
+from src.utils.mongo_pool_metrics import pool_metrics
+
+
+DOCUMENT_MODELS: list[type[Document]] = [
+    User,
+    RefreshToken,
+    Category,
+    CategoryJob,
+    Budget,
+    PaymentMethod,
+    Transaction,
+    BankConnection,
+    BankAccount,
+    BankTransaction,
+    AITips,
+    MigrationState,
+    DailyTotal,
+]
+
+
+def create_client() -> AsyncIOMotorClient[dict[str, Any]]:
+    """Клиент Motor с настройками пула из конфига и слушателем метрик пула."""
+    options: dict[str, Any] = {
+        "maxPoolSize": config.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": config.MONGODB_MIN_POOL_SIZE,
+        "readPreference": config.MONGODB_READ_PREFERENCE,
+        "event_listeners": [pool_metrics],
+    }
+    if config.MONGODB_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = config.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+    if config.MONGODB_COMPRESSORS:
+        options["compressors"] = config.MONGODB_COMPRESSORS
+
+    return AsyncIOMotorClient(config.MONGODB_URI, **options)
+
 
+async def init_db(*, skip_indexes: bool | None = None) -> AsyncIOMotorClient[dict[str, Any]]:
+    """
+    Подключает Beanie к базе и возвращает клиент — его закрывает владелец (lifespan, CLI).
+    При MONGODB_SKIP_INDEXES=true индексы на старте не трогаются —
+    их создаёт отдельная команда `python -m src.cli manage-indexes`.
+    """
+    if skip_indexes is None:
+        skip_indexes = config.MONGODB_SKIP_INDEXES
 
-async def init_db() -> None:
-    client = AsyncIOMotorClient(config.MONGODB_URI)
+    client = create_client()
     db = client.get_default_database()
-    await init_beanie(
-        database=db,
-        document_models=[
-            User,
-            RefreshToken,
-            Category,
-            Budget,
-            PaymentMethod,
-            Transaction,
-            BankConnection,
-            BankAccount,
-            BankTransaction,
-        ],
-    )
+    await init_beanie(database=db, document_models=DOCUMENT_MODELS, skip_indexes=skip_indexes)
     print("✅ MongoDB успешно подключена к базе:", db.name)
+    return client
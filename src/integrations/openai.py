@@ -0,0 +1,38 @@
+from functools import cache
+from typing import TYPE_CHECKING, Annotated
+
+from fastapi import Depends, HTTPException, status
+
+from src.config import config
+from src.utils.error_messages import OPENAI_KEY_MISSING
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+@cache
+def get_openai_client() -> "AsyncOpenAI":
+    """
+    Клиент OpenAI создаётся при первом обращении: SDK импортируется долго,
+    а нужен только эндпоинтам /ai и батчу советов.
+    Бросает RuntimeError, если OPENAI_API_KEY не задан.
+    """
+    if not config.OPENAI_API_KEY:
+        raise RuntimeError(OPENAI_KEY_MISSING)
+
+    from openai import AsyncOpenAI
+
+    # Пустой OPENAI_BASE_URL — адрес OpenAI по умолчанию, а не "" у SDK
+    return AsyncOpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL or None)
+
+
+def openai_client_dependency() -> "AsyncOpenAI":
+    """Зависимость FastAPI: без ключа — 503 вместо падения всего приложения."""
+    try:
+        return get_openai_client()
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e)) from e
+
+
+# Зависимость FastAPI для роутеров
+OpenAIClient = Annotated["AsyncOpenAI", Depends(openai_client_dependency)]
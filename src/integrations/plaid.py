@@ -1,19 +1,36 @@
-from plaid.api.plaid_api import PlaidApi
-from plaid.api_client import ApiClient
-from plaid.configuration import Configuration
+from functools import cache
+from typing import TYPE_CHECKING, Annotated
+
+from fastapi import Depends
 
 from src.config import config
 
-# Настройка конфигурации
-configuration = Configuration(
-    host="https://sandbox.plaid.com"
-    if config.PLAID_ENV == "sandbox"
-    else "https://development.plaid.com",
-    api_key={
-        "clientId": config.PLAID_CLIENT_ID,
-        "secret": config.PLAID_SECRET,
-    },
-)
-
-api_client: ApiClient = ApiClient(configuration)
-plaid_client: PlaidApi = PlaidApi(api_client)
+if TYPE_CHECKING:
+    from plaid.api.plaid_api import PlaidApi
+
+
+@cache
+def get_plaid_client() -> "PlaidApi":
+    """
+    Клиент Plaid создаётся при первом обращении: модуль plaid_api тяжёлый
+    (импортирует все модели API), поэтому не грузим его при старте воркера.
+    """
+    from plaid.api.plaid_api import PlaidApi
+    from plaid.api_client import ApiClient
+    from plaid.configuration import Configuration
+
+    # Настройка конфигурации
+    configuration = Configuration(
+        host="https://sandbox.plaid.com"
+        if config.PLAID_ENV == "sandbox"
+        else "https://development.plaid.com",
+        api_key={
+            "clientId": config.PLAID_CLIENT_ID,
+            "secret": config.PLAID_SECRET,
+        },
+    )
+    return PlaidApi(ApiClient(configuration))
+
+
+# Зависимость FastAPI для роутеров
+PlaidClient = Annotated["PlaidApi", Depends(get_plaid_client)]
@@ -1,19 +1,26 @@
-from datetime import UTC, date, datetime  # Импортируем UTC и datetime для работы с временем
+from datetime import UTC, date, datetime, time  # Импортируем UTC и datetime для работы с временем
 from decimal import Decimal  # Добавляем импорт Decimal
 from enum import StrEnum
 from typing import Any, ClassVar, Literal, override
 
 from beanie import (  # Document — модель для MongoDB, PydanticObjectId — ID-шка
     Document,
+    Insert,
     PydanticObjectId,
+    Replace,
+    Save,
+    before_event,
 )
 from pydantic import (  # EmailStr — проверка email, Field — для задания default значений
     EmailStr,
     Field,
     field_validator,
 )
+from pymongo import ASCENDING, IndexModel
 
+from src.utils.money import to_cents
 from src.utils.mongo_types import convert_decimal128
+from src.utils.normalization import normalize_name
 
 
 class User(Document):
@@ -30,6 +37,12 @@ class User(Document):
     )  # 🕓 Автоматическое время регистрации
 
     balance: Decimal = Field(default=Decimal("0.00"))
+    timezone: str = "UTC"  # 🗓️ IANA-пояс пользователя: по нему считаются дни, недели и месяцы
+    daily_totals_timezone: str | None = None  # В каком поясе построены daily_totals (None — нет)
+    # Пересчёт daily_totals: номер последнего, его аренда и «были записи во время пересчёта»
+    daily_totals_generation: int = 0
+    daily_totals_rebuild_until: datetime | None = None
+    daily_totals_dirty: bool = False
 
     @field_validator("balance", mode="before")
     @classmethod
@@ -64,10 +77,13 @@ class Transaction(Document):
 
     user_id: PydanticObjectId  # ID пользователя
     amount: Decimal  # Сумма транзакции
+    amount_cents: int | None = None  # Та же сумма в центах (см. src/utils/money.py)
     source: Literal["manual", "plaid"] = "manual"
     type: TransactionType  # Тип: expense или income
-    category: str | None = None  # Категория (например, "Еда", "Зарплата")
-    payment_method: str | None = None  # Способ оплаты (для расходов)
+    category: str | None = None  # Название категории (денормализовано для отображения)
+    category_id: PydanticObjectId | None = None  # Ссылка на категорию
+    payment_method: str | None = None  # Название способа оплаты (денормализовано)
+    payment_method_id: PydanticObjectId | None = None  # Ссылка на PaymentMethod
     date: datetime = Field(default_factory=lambda: datetime.now(UTC))  # Дата транзакции
     description: str | None = None  # Описание транзакции
 
@@ -76,6 +92,10 @@ class Transaction(Document):
     def validate_amount(cls, v: Any) -> Decimal:
         return convert_decimal128(v)
 
+    @before_event(Insert, Replace, Save)
+    def set_amount_cents(self) -> None:
+        self.amount_cents = to_cents(self.amount)
+
     @field_validator("date", mode="before")
     @classmethod
     def validate_date(cls, v: datetime | None) -> datetime:
@@ -95,6 +115,10 @@ class Transaction(Document):
             data["id"] = str(data["id"])
         if "user_id" in data:
             data["user_id"] = str(data["user_id"])
+        if data.get("category_id") is not None:
+            data["category_id"] = str(data["category_id"])
+        if data.get("payment_method_id") is not None:
+            data["payment_method_id"] = str(data["payment_method_id"])
         return data
 
     class Settings:
@@ -107,28 +131,40 @@ class Transaction(Document):
             "user_id",  # Для быстрого получения всех транзакций пользователя
             ("user_id", "date"),  # Для временных отчетов и сортировки по дате
             ("user_id", "category"),  # Для группировки по категориям
+            ("user_id", "category_id"),  # Для каскадов при переименовании/удалении категорий
             ("user_id", "type"),  # Для фильтрации по типу (расход/доход)
             ("user_id", "amount"),  # Для сортировки по сумме
             # Составной индекс для сложной аналитики: транзакции по категориям за период
             ("user_id", "category", "date"),
             # Составной индекс для фильтрации по типу и дате
             ("user_id", "type", "date"),
+            # Аналитика и каскады по способу оплаты
+            ("user_id", "payment_method_id", "date"),
+            # Список транзакций: сортировка (date, _id) и skip/limit прямо по индексу
+            ("user_id", "date", "_id"),
+            ("user_id", "type", "date", "_id"),
         ]
 
 
 # 🔐 Модель для хранения refresh токенов в MongoDB
 class RefreshToken(Document):
     user_id: PydanticObjectId
-    token: str
+    token_hash: str  # SHA-256 от токена — сам токен в базе не храним
     created_at: datetime
     expires_at: datetime
 
     class Settings:
         name = "refresh_tokens"
-        indexes: ClassVar[list[str | tuple[str, ...]]] = [
-            "token",
-            "user_id",
-            ("user_id", "expires_at"),
+        indexes: ClassVar[list[str | IndexModel]] = [
+            # Поиск токена по хешу — ровно один документ
+            IndexModel(
+                [("token_hash", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"token_hash": {"$type": "string"}},
+            ),
+            # TTL: MongoDB сама удаляет просроченные токены
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+            "user_id",  # Для выхода со всех устройств
         ]
         json_encoders: ClassVar[dict[type, Any]] = {
             PydanticObjectId: str,
@@ -150,6 +186,11 @@ class Category(Document):
     )  # Цвет категории (опционально)
     user_id: PydanticObjectId | None = None  # Если None — дефолтная, иначе кастомная
     is_default: bool = False  # Используется для глобальных категорий
+    name_normalized: str | None = None  # Имя для поиска дублей (см. normalize_name)
+
+    @before_event(Insert, Replace, Save)
+    def set_name_normalized(self) -> None:
+        self.name_normalized = normalize_name(self.name)
 
     @override
     def model_dump(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
@@ -160,15 +201,64 @@ class Category(Document):
 
     class Settings:
         name = "categories"
-        indexes: ClassVar[list[str | tuple[str, str]]] = [
+        indexes: ClassVar[list[str | IndexModel]] = [
             "user_id",
-            ("name", "user_id"),
+            # Уникальное имя кастомной категории в пределах пользователя:
+            # дубли отсекает сам индекс, без гонки read-then-write
+            IndexModel(
+                [("user_id", ASCENDING), ("name_normalized", ASCENDING)],
+                unique=True,
+                partialFilterExpression={
+                    "user_id": {"$type": "objectId"},
+                    "name_normalized": {"$type": "string"},
+                },
+            ),
         ]
         json_encoders: ClassVar[dict[type, Any]] = {
             PydanticObjectId: str,
         }
 
 
+class CategoryJobKind(StrEnum):
+    RENAME = "rename"
+    DELETE = "delete"
+    MERGE = "merge"
+
+
+class CategoryJobStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class CategoryJob(Document):
+    """
+    🔁 Фоновая задача: перенос транзакций пользователя на другую категорию
+    (переименование, удаление или слияние категорий) пачками
+    """
+
+    user_id: PydanticObjectId
+    kind: CategoryJobKind
+    source_category_ids: list[PydanticObjectId]  # Откуда переносим
+    source_names: list[str]  # Старые имена — для транзакций без category_id
+    target_category_id: PydanticObjectId | None = None  # Куда (None — "Uncategorized")
+    target_name: str
+    status: CategoryJobStatus = CategoryJobStatus.PENDING
+    processed: int = 0  # Сколько транзакций уже обновлено
+    error: str | None = None
+    lease_until: datetime | None = None  # До какого момента задачу держит воркер
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "category_jobs"
+        indexes: ClassVar[list[str | tuple[str, ...]]] = [
+            ("user_id", "created_at"),
+            "status",
+        ]
+
+
 class PaymentMethod(Document):
     """
     💳 Кастомный платёжный метод пользователя
@@ -182,6 +272,11 @@ class PaymentMethod(Document):
     last4: str | None = Field(default=None, min_length=4, max_length=4)  # Последние 4 цифры
     icon: str | None = None  # 🎨 Эмодзи или иконка: 🏦 💳
     user_id: PydanticObjectId  # Привязка к пользователю
+    name_normalized: str | None = None  # Имя для поиска дублей (см. normalize_name)
+
+    @before_event(Insert, Replace, Save)
+    def set_name_normalized(self) -> None:
+        self.name_normalized = normalize_name(self.name)
 
     @override
     def model_dump(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
@@ -192,10 +287,16 @@ class PaymentMethod(Document):
 
     class Settings:
         name = "payment_methods"
-        indexes: ClassVar[list[str | tuple[str, ...]]] = [
+        indexes: ClassVar[list[str | tuple[str, ...] | IndexModel]] = [
             "user_id",
             ("user_id", "card_type"),
             ("user_id", "bank"),
+            # Уникальное имя метода в пределах пользователя
+            IndexModel(
+                [("user_id", ASCENDING), ("name_normalized", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"name_normalized": {"$type": "string"}},
+            ),
         ]
         json_encoders: ClassVar[dict[type, Any]] = {
             PydanticObjectId: str,
@@ -300,15 +401,33 @@ class BankTransaction(Document):
     transaction_id: str  # от Plaid
     source: Literal["manual", "plaid"] = "plaid"  # для BankTransaction
     name: str
-    amount: float
-    date: date
+    amount: float  # Plaid: расходы положительные, доходы отрицательные
+    amount_cents: int | None = None  # Та же сумма в центах, со знаком Plaid
+    date: datetime  # Момент транзакции в UTC (для дат Plaid без времени — начало дня)
+    has_time: bool = False  # Plaid дал точное время; иначе date — календарный день без пояса
+    authorized_date: datetime | None = None  # Дата авторизации от Plaid, тоже в UTC
     category: list[str] | None = None
     payment_method: str | None = None
+    payment_method_id: PydanticObjectId | None = None  # Метод пользователя, сопоставленный при импорте
     payment_channel: str | None = None
     iso_currency_code: str | None = None
     pending: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
+    @before_event(Insert, Replace, Save)
+    def set_amount_cents(self) -> None:
+        self.amount_cents = to_cents(self.amount)
+
+    @field_validator("date", "authorized_date", mode="before")
+    @classmethod
+    def validate_date(cls, v: date | datetime | None) -> datetime | None:
+        # Plaid часто отдаёт только дату — храним её как полночь UTC
+        if isinstance(v, date) and not isinstance(v, datetime):
+            return datetime.combine(v, time.min, tzinfo=UTC)
+        if isinstance(v, datetime) and v.tzinfo is None:
+            return v.replace(tzinfo=UTC)
+        return v
+
     @override
     def model_dump(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
         data = super().model_dump(*args, **kwargs)
@@ -316,6 +435,8 @@ class BankTransaction(Document):
             data["user_id"] = str(data["user_id"])
         if "bank_account_id" in data:
             data["bank_account_id"] = str(data["bank_account_id"])
+        if data.get("payment_method_id") is not None:
+            data["payment_method_id"] = str(data["payment_method_id"])
         return data
 
     class Settings:
@@ -323,5 +444,95 @@ class BankTransaction(Document):
         json_encoders: ClassVar[dict[type, Any]] = {
             PydanticObjectId: str,
             datetime: str,
-            date: str,
         }
+        indexes: ClassVar[list[str | tuple[str, ...]]] = [
+            # Аналитика за период (окна по дате)
+            ("user_id", "date"),
+            # Транзакции счёта за период
+            ("bank_account_id", "date"),
+            # Аналитика и каскады по способу оплаты
+            ("user_id", "payment_method_id", "date"),
+            # Список транзакций: сортировка (date, _id) и skip/limit прямо по индексу
+            ("user_id", "date", "_id"),
+        ]
+
+
+class AITips(Document):
+    """
+    🤖 Готовые советы AI за месяц: их считает ночной батч
+    (python -m src.cli precompute-ai-tips) или живой запрос к /ai/tips.
+    """
+
+    user_id: PydanticObjectId
+    month: str  # "YYYY-MM" — за какой месяц посчитаны траты
+    fingerprint: str  # spending_fingerprint входных данных промпта
+    model: str  # Модель OpenAI, которая дала ответ
+    tips: list[str]
+    generated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "ai_tips"
+        indexes: ClassVar[list[str | IndexModel]] = [
+            IndexModel([("user_id", ASCENDING)], unique=True),
+        ]
+
+
+class DailyTotal(Document):
+    """
+    📈 Префиксные суммы по дням (ручные + Plaid транзакции):
+    amount_cents — сумма за день, cumulative_cents — с начала истории
+    по этот день включительно. Итог за любой период [from, to] —
+    два чтения и вычитание (см. src/utils/daily_totals.py).
+    """
+
+    user_id: PydanticObjectId
+    type: TransactionType
+    category: str | None = None  # None — все категории этого типа
+    day: datetime  # Локальный день пользователя (его дата как полночь UTC)
+    amount_cents: int = 0
+    cumulative_cents: int = 0
+
+    class Settings:
+        name = "daily_totals"
+        indexes: ClassVar[list[str | IndexModel]] = [
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("type", ASCENDING),
+                    ("category", ASCENDING),
+                    ("day", ASCENDING),
+                ],
+                unique=True,
+            ),
+        ]
+
+
+class MigrationStatus(StrEnum):
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class MigrationState(Document):
+    """
+    🧳 Прогресс миграции данных (python -m src.cli migrate):
+    на каком _id остановились — после падения продолжаем с того же места
+    """
+
+    name: str  # Имя миграции из реестра src/utils/migrations.py
+    status: MigrationStatus = MigrationStatus.RUNNING
+    last_id: PydanticObjectId | None = None  # Последний обработанный _id
+    processed: int = 0  # Сколько документов просмотрено
+    modified: int = 0  # Сколько документов изменено
+    skipped: int = 0  # Записи, отклонённые базой (например, дубль имени) — оставлены как есть
+    lease_until: datetime | None = None  # Пока не истекла — миграцию выполняет другой процесс
+    error: str | None = None
+    started_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    finished_at: datetime | None = None
+
+    class Settings:
+        name = "migrations"
+        indexes: ClassVar[list[str | IndexModel]] = [
+            IndexModel([("name", ASCENDING)], unique=True),
+        ]
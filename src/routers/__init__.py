@@ -5,6 +5,7 @@ from src.routers import (
     auth,
     budget,
     categories,
+    metrics,
     payment_methods,
     transactions,
 )
@@ -16,6 +17,7 @@ __all__ = [
     "auth",
     "budget",
     "categories",
+    "metrics",
     "payment_methods",
     "transactions",
 ]
@@ -1,16 +1,20 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from passlib.context import CryptContext
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 
 from src.auth.dependencies import get_current_user
+from src.auth.passwords import hash_password, verify_password
+from src.auth.user_cache import invalidate_user
 from src.models import User
-from src.schemas.base import PasswordUpdateRequest, PasswordUpdateResponse
+from src.schemas.base import (
+    PasswordUpdateRequest,
+    PasswordUpdateResponse,
+    TimezoneUpdateRequest,
+)
+from src.utils.daily_totals import rebuild_daily_totals
 
 router = APIRouter(prefix="/account", tags=["Account"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 @router.get("/me")
 async def get_me(
@@ -24,6 +28,7 @@ async def get_me(
         "email": current_user.email,
         "first_name": current_user.first_name,
         "last_name": current_user.last_name,
+        "timezone": current_user.timezone,
     }
 
 
@@ -35,6 +40,7 @@ async def delete_account(
     ❌ Удалить аккаунт пользователя
     """
     _ = await current_user.delete()
+    await invalidate_user(current_user.id)
     return {"message": "Account deleted successfully"}
 
 
@@ -54,20 +60,44 @@ async def update_password(
         )
 
     # 🔐 Проверка текущего пароля
-    if not pwd_context.verify(data.old_password, user.hashed_password):
+    is_valid, _new_hash = await verify_password(data.old_password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Old password is incorrect",
         )
 
     # 🔐 Хешируем и сохраняем новый пароль
-    user.hashed_password = pwd_context.hash(data.new_password)
-    _ = await user.save()
+    _ = await user.set({User.hashed_password: await hash_password(data.new_password)})
+    await invalidate_user(user.id)
 
     # ✅ Возвращаем подтверждение
     return PasswordUpdateResponse()
 
 
+@router.put("/timezone")
+async def update_timezone(
+    data: TimezoneUpdateRequest,
+    user: Annotated[User, Depends(get_current_user)],
+    background_tasks: BackgroundTasks,
+) -> dict[str, str]:
+    """
+    🗓️ Сменить часовой пояс: по нему аналитика считает дни, недели, месяцы и годы
+    """
+    if data.timezone == user.timezone:
+        return {"timezone": user.timezone}
+
+    _ = await user.set({User.timezone: data.timezone})
+    await invalidate_user(user.id)
+
+    # Суммы по дням хранятся по локальным дням — пересчитываем их в новом поясе
+    # (до конца пересчёта аналитика считает по транзакциям)
+    if user.id is not None:
+        background_tasks.add_task(rebuild_daily_totals, user.id)
+
+    return {"timezone": data.timezone}
+
+
 @router.get("/balance")
 async def get_balance(
     current_user: Annotated[User, Depends(get_current_user)],
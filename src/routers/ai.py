@@ -1,98 +1,201 @@
-import os
-from collections import defaultdict
-from datetime import UTC, datetime
+import asyncio
+import logging
+from collections.abc import AsyncIterator
 from decimal import Decimal
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from openai import AsyncOpenAI
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
 from src.auth.dependencies import get_current_user
-from src.models import Transaction, TransactionType, User
-from src.utils.analytics_helper import round_decimal
-from src.utils.error_messages import OPENAI_ERROR_MESSAGE, OPENAI_KEY_MISSING
+from src.config import config
+from src.integrations.openai import OpenAIClient
+from src.models import User
+from src.utils.ai_tips import (
+    build_messages,
+    build_user_prompt,
+    get_month_spending,
+    get_or_generate_tips,
+    get_stored_tips,
+    month_key,
+    parse_tips,
+    request_tips,
+    save_tips,
+    spending_fingerprint,
+    sse_event,
+    tips_cache,
+    tips_cache_key,
+)
+from src.utils.ai_tips_rules import build_rule_tips, rule_tips
+from src.utils.error_messages import OPENAI_ERROR_MESSAGE
 
 # ────────────── 📍 Роутер AI ──────────────
 router = APIRouter(prefix="/ai", tags=["AI"])
 
-# ────────────── 🔐 Инициализация OpenAI ──────────────
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError(OPENAI_KEY_MISSING)
+logger = logging.getLogger(__name__)
 
-openai_client = AsyncOpenAI(api_key=openai_api_key)
+# Какой движок ответил на /ai/tips
+ENGINE_OPENAI = "openai"
+ENGINE_RULES = "rules"
+
+# ────────────── 📊 Траты за месяц ──────────────
+async def load_month_spending(user: User) -> tuple[dict[str, Decimal], Decimal]:
+    """Суммы расходов по категориям за текущий месяц и их итог (404, если трат нет)."""
+    if user.id is None:
+        raise HTTPException(status_code=400, detail="User ID is missing")
+
+    by_category, total = await get_month_spending(user.id)
+    if not by_category:
+        raise HTTPException(status_code=404, detail="No expenses found to analyze")
+
+    return by_category, total
 
 
 # ────────────── 🤖 AI Endpoint для советов ──────────────
 @router.get("/tips")
 async def get_ai_tips(
     current_user: Annotated[User, Depends(get_current_user)],
+    openai_client: OpenAIClient,
+    refresh: bool = False,
 ) -> dict[str, str | list[str]]:
     """
     🤖 Возвращает советы по тратам, основанные на аналитике расходов пользователя.
-    Использует GPT для генерации персонализированных рекомендаций.
+    Обычно это агрегация трат за месяц и одно чтение из ai_tips (советы считает
+    ночной батч). Если сохранённые советы посчитаны по другим тратам, их нет
+    или передан refresh=true — генерирует их через GPT; ответ кэшируется,
+    пока траты за месяц не изменятся.
+    Если GPT не ответил за AI_TIPS_DEADLINE_SECONDS или вернул ошибку —
+    отдаёт советы локальных правил. Поле engine: "openai" или "rules".
     """
-    now = datetime.now(UTC)
-    start_of_month = datetime(now.year, now.month, 1, tzinfo=UTC)
-
-    # Теперь получим расходы пользователя
-    all_expenses = await Transaction.find(
-        Transaction.user_id == current_user.id, Transaction.type == TransactionType.EXPENSE
-    ).to_list()
-
-    # Фильтруем расходы за текущий месяц
-    expenses = []
-    for exp in all_expenses:
-        # Убедимся что дата расхода имеет часовой пояс UTC
-        exp_date = exp.date.replace(tzinfo=UTC) if exp.date.tzinfo is None else exp.date
-        if exp_date >= start_of_month:
-            expenses.append(exp)
-
-    if not expenses:
-        raise HTTPException(status_code=404, detail="No expenses found to analyze")
+    if current_user.id is None:
+        raise HTTPException(status_code=400, detail="User ID is missing")
+    user_id = current_user.id
+    month = month_key()
 
-    # 📊 Группируем по категориям
-    by_category: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
-    total: Decimal = Decimal("0")
+    by_category, total = await load_month_spending(current_user)
+    fingerprint = spending_fingerprint(by_category, total)
 
-    for exp in expenses:
-        amount: Decimal = exp.amount
-        if exp.category:
-            by_category[exp.category] += amount
-            total += amount
-
-    assert isinstance(total, Decimal)  # Ensure total is Decimal
+    # 📦 Сохранённые советы годятся, только если траты с тех пор не менялись
+    if not refresh:
+        stored = await get_stored_tips(user_id, month, fingerprint)
+        if stored is not None:
+            return {"engine": ENGINE_OPENAI, "model": stored.model, "tips": stored.tips}
 
     # ✍️ Составляем текст для GPT
-    analysis_text = "\n".join(
-        [f"- {cat}: {round_decimal(amount)} CAD" for cat, amount in by_category.items()]
-    )
-
-    system_prompt = (
-        "Ты дерзкий и умный финансовый коуч. Пиши строго по делу, кратко. "
-        "Советы — полезные, конкретные. Без воды и повторов."
-    )
-
-    user_prompt = (
-        f"Расходы за месяц: {round_decimal(total)} CAD.\n"
-        f"Категории:\n{analysis_text}\n\n"
-        f"Дай 3 совета, как улучшить мои траты."
-    )
-
-    # 🚀 Отправляем запрос в OpenAI
+    user_prompt = build_user_prompt(by_category, total)
+
+    async def generate() -> list[str]:
+        # 🚀 Отправляем запрос в OpenAI и сохраняем ответ для следующих чтений
+        tips = await request_tips(openai_client, user_prompt)
+        await save_tips(user_id, month, fingerprint, tips)
+        return tips
+
+    # 🧠 Кэш по отпечатку трат: попадание — без OpenAI и без правил
+    cache_key = tips_cache_key(user_id, fingerprint)
+    cached = tips_cache.get(cache_key)
+    if cached is not None:
+        return {"engine": ENGINE_OPENAI, "model": config.OPENAI_MODEL, "tips": cached}
+
+    # 📏 Параллельно готовим ответ по правилам — он нужен, если OpenAI не успеет
+    rules_task = asyncio.create_task(build_rule_tips(user_id, by_category, total))
+
+    async def wait_rule_tips() -> list[str]:
+        # Правилам нужны бюджеты и траты прошлого месяца из MongoDB; если и они
+        # не успели — советы только по тратам текущего месяца, без запросов
+        try:
+            return await asyncio.wait_for(rules_task, timeout=config.AI_TIPS_RULES_TIMEOUT_SECONDS)
+        except Exception:
+            logger.warning("AI rule tips fallback to static for user %s", user_id, exc_info=True)
+            return rule_tips(by_category, total, budgets={}, previous={})
+
+    # 🛫 Склейка одинаковых параллельных запросов.
+    # По дедлайну перестаём ждать, но сам запрос к OpenAI продолжается в фоне
+    # (single-flight его не отменяет) и попадёт в кэш и ai_tips для следующих запросов.
     try:
-        response = await openai_client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4-turbo"),
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+        tips, _from_cache = await asyncio.wait_for(
+            get_or_generate_tips(cache_key, generate), timeout=config.AI_TIPS_DEADLINE_SECONDS
         )
-
     except Exception as e:
-        raise HTTPException(status_code=500, detail=OPENAI_ERROR_MESSAGE.format(str(e))) from e
+        # ⏱️ Дедлайн или ошибка OpenAI — отвечаем советами по правилам
+        logger.warning("AI tips fallback to rules for user %s: %r", user_id, e)
+        return {"engine": ENGINE_RULES, "model": ENGINE_RULES, "tips": await wait_rule_tips()}
+
+    _ = rules_task.cancel()
 
     # 📤 Возвращаем список советов
-    answer = response.choices[0].message.content
-    model_used = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
-    return {"model": model_used, "tips": answer.strip().split("\n") if answer else ["Нет совета"]}
+    return {"engine": ENGINE_OPENAI, "model": config.OPENAI_MODEL, "tips": tips}
+
+
+# ────────────── 📡 Потоковые советы (SSE) ──────────────
+@router.get("/tips/stream")
+async def stream_ai_tips(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    openai_client: OpenAIClient,
+) -> StreamingResponse:
+    """
+    📡 Те же советы, но в формате Server-Sent Events:
+    - event: token — очередной кусок текста от модели
+    - event: done — готовый список советов (он же попадает в кэш)
+    - event: error — OpenAI вернул ошибку
+    Если клиент отключился, запрос к OpenAI прерывается.
+    """
+    by_category, total = await load_month_spending(current_user)
+    user_prompt = build_user_prompt(by_category, total)
+    fingerprint = spending_fingerprint(by_category, total)
+    cache_key = tips_cache_key(current_user.id, fingerprint)
+
+    async def events() -> AsyncIterator[str]:
+        cached = tips_cache.get(cache_key)
+        if cached is not None:
+            yield sse_event("done", {"model": config.OPENAI_MODEL, "tips": cached, "cached": True})
+            return
+
+        try:
+            stream = await openai_client.chat.completions.create(
+                model=config.OPENAI_MODEL,
+                messages=build_messages(user_prompt),
+                temperature=config.OPENAI_TEMPERATURE,
+                max_tokens=config.OPENAI_MAX_TOKENS,
+                stream=True,
+            )
+        except Exception as e:
+            yield sse_event("error", {"detail": OPENAI_ERROR_MESSAGE.format(str(e))})
+            return
+
+        parts: list[str] = []
+        finished = False
+        try:
+            async for chunk in stream:
+                if await request.is_disconnected():
+                    # 🔌 Клиент ушёл — дальше не генерируем
+                    return
+
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta.content:
+                    parts.append(choice.delta.content)
+                    yield sse_event("token", {"text": choice.delta.content})
+                if choice.finish_reason is not None:
+                    finished = True
+        except Exception as e:
+            yield sse_event("error", {"detail": OPENAI_ERROR_MESSAGE.format(str(e))})
+            return
+        finally:
+            # Закрываем HTTP-поток к OpenAI (в том числе при отмене генератора)
+            await stream.close()
+
+        tips = parse_tips("".join(parts))
+        if finished:
+            # В кэш — только полностью полученный ответ
+            tips_cache.set(cache_key, tips)
+            if current_user.id is not None:
+                await save_tips(current_user.id, month_key(), fingerprint, tips)
+        yield sse_event("done", {"model": config.OPENAI_MODEL, "tips": tips, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
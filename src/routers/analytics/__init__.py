@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from src.routers.analytics.query import router as query_router
 from src.routers.analytics.transactions import router as transactions_router
 
 # Создаем основной роутер для аналитики
@@ -7,3 +8,6 @@ router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
 # Подключаем роутер для транзакций
 router.include_router(transactions_router)
+
+# Конструктор запросов (/analytics/query)
+router.include_router(query_router)
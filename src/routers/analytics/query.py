@@ -0,0 +1,29 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from src.auth.dependencies import get_current_user
+from src.models import User
+from src.schemas.analytics_schemas import AnalyticsQuery, AnalyticsQueryResponse
+from src.utils.analytics_query import run_analytics_query
+
+router = APIRouter(tags=["Analytics Query"])
+
+
+@router.post("/query")
+async def query_analytics(
+    query: AnalyticsQuery,
+    current_user: Annotated[User, Depends(get_current_user)],
+) -> AnalyticsQueryResponse:
+    """
+    🧮 Произвольный аналитический запрос по ручным и Plaid транзакциям:
+    - dimensions: category, payment_method, source, type и одно из day / week / month / year
+    - measures: sum, count, avg, min, max (по сумме транзакции)
+    - filters: период [start, end), type, source, categories, payment_methods
+    Считается одной агрегацией в MongoDB, а когда хватает сумм по дням — по daily_totals.
+    Дни, недели, месяцы и годы — в часовом поясе пользователя.
+    """
+    if current_user.id is None:
+        raise HTTPException(status_code=400, detail="User ID is missing")
+
+    return await run_analytics_query(current_user, query)
@@ -1,7 +1,8 @@
+import asyncio
 from collections import defaultdict
-from datetime import UTC, date, datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
-from typing import Annotated, Any, Literal, cast
+from typing import Annotated, Literal, cast
 
 from fastapi import APIRouter, Depends, HTTPException, status
 
@@ -9,6 +10,8 @@ from src.auth.dependencies import get_current_user
 from src.config import TIME_FRAMES
 from src.models import Budget, TransactionType, User
 from src.schemas.analytics_schemas import (
+    AnalyticsQuery,
+    AnalyticsQueryFilters,
     BudgetCategoryStat,
     BudgetOverview,
     CategoryStat,
@@ -19,16 +22,34 @@ from src.schemas.analytics_schemas import (
     PaymentStat,
     PeriodStat,
     PieChartResponse,
+    RangeTotals,
     SummaryResponse,
     TotalAmount,
 )
 from src.utils.analytics_helper import (
     calculate_percent,
-    get_all_transactions_for_user,
+    get_category_totals,
+    get_payment_method_totals,
+    get_period_totals,
+    get_transactions_in_window,
     round_decimal,
-    sum_amounts,
-    to_decimal,
 )
+from src.utils.analytics_query import run_analytics_query
+from src.utils.calendar import (
+    Period,
+    day_start,
+    get_zone,
+    local_now,
+    period_start,
+    period_start_day,
+    previous_month_start_day,
+)
+from src.utils.daily_totals import (
+    get_range_cents,
+    get_range_cents_by_category,
+    sum_range_cents,
+)
+from src.utils.money import from_cents, sum_cents, to_cents
 
 router = APIRouter(prefix="/transactions", tags=["Transaction Analytics"])
 
@@ -40,38 +61,35 @@ async def get_summary(
 ) -> SummaryResponse:
     """
     📊 Общая аналитика всех транзакций (ручных и банковских):
-    - Суммы за неделю / месяц / год
+    - Суммы за неделю / месяц / год (в часовом поясе пользователя)
     - Топ 5 категорий
     - Процент от бюджета
     """
-    now = datetime.now(UTC)
-    start_of_week = datetime(now.year, now.month, now.day - now.weekday(), tzinfo=UTC)
-    start_of_month = datetime(now.year, now.month, 1, tzinfo=UTC)
-    start_of_year = datetime(now.year, 1, 1, tzinfo=UTC)
-
-    # ✅ Загружаем все транзакции (объединённые)
     if current_user.id is None:
         raise HTTPException(status_code=400, detail="User ID is missing")
-    all_transactions: list[dict[str, Any]] = await get_all_transactions_for_user(current_user.id)
 
-    # 🔍 Фильтрация по типу
-    if transaction_type:
-        all_transactions = [t for t in all_transactions if t["type"] == transaction_type]
+    # 🗓️ Первые дни текущих недели / месяца / года по календарю пользователя
+    zone = get_zone(current_user.timezone)
+    today = local_now(zone).date()
+    starts: dict[Period, date] = {
+        period: period_start_day(period, today) for period in ("week", "month", "year")
+    }
 
-    # 🗓️ Разделение по времени
-    week_txns = [t for t in all_transactions if t["date"] >= start_of_week]
-    month_txns = [t for t in all_transactions if t["date"] >= start_of_month]
-    year_txns = [t for t in all_transactions if t["date"] >= start_of_year]
+    # 💵 Суммы по периодам: раскладывает MongoDB (по локальным дням транзакций)
+    period_cents = await get_period_totals(
+        current_user.id, current_user.timezone, zone, starts, transaction_type
+    )
+
+    def period_total(kind: TransactionType, period: Period) -> Decimal:
+        return from_cents(period_cents.get((kind, period), 0))
 
-    # 💵 Подсчёт сумм расходов
-    week_spent = sum_amounts([t for t in week_txns if t["type"] == TransactionType.EXPENSE])
-    month_spent = sum_amounts([t for t in month_txns if t["type"] == TransactionType.EXPENSE])
-    year_spent = sum_amounts([t for t in year_txns if t["type"] == TransactionType.EXPENSE])
+    week_spent = period_total(TransactionType.EXPENSE, "week")
+    month_spent = period_total(TransactionType.EXPENSE, "month")
+    year_spent = period_total(TransactionType.EXPENSE, "year")
 
-    # 💵 Подсчёт сумм доходов
-    week_earned = sum_amounts([t for t in week_txns if t["type"] == TransactionType.INCOME])
-    month_earned = sum_amounts([t for t in month_txns if t["type"] == TransactionType.INCOME])
-    year_earned = sum_amounts([t for t in year_txns if t["type"] == TransactionType.INCOME])
+    week_earned = period_total(TransactionType.INCOME, "week")
+    month_earned = period_total(TransactionType.INCOME, "month")
+    year_earned = period_total(TransactionType.INCOME, "year")
 
     # 💵 Подсчёт чистой суммы (доходы - расходы)
     week_net = week_earned - week_spent
@@ -97,22 +115,16 @@ async def get_summary(
         ),
     }
 
-    # 🏷️ Категории
-    categories: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
-    for t in all_transactions:
-        if t["category"]:
-            categories[t["category"]] += Decimal(str(cast("float", t["amount"])))
+    # 🏷️ Категории за всю историю — одной агрегацией в MongoDB
+    categories = await get_category_totals(current_user.id, transaction_type)
 
-    total_amount = sum(categories.values())
+    total_amount = sum(categories.values(), start=Decimal("0"))
     top_categories = sorted(categories.items(), key=lambda x: x[1], reverse=True)[:5]
 
-    # 💳 Способы оплаты (только для ручных)
-    payment_methods: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
-    for t in all_transactions:
-        if t["source"] == "manual" and t.get("payment_method"):
-            payment_methods[t["payment_method"]] += Decimal(str(cast("float", t["amount"])))
+    # 💳 Способы оплаты (ручные + Plaid) — одной агрегацией в MongoDB
+    payment_methods = await get_payment_method_totals(current_user.id, transaction_type)
 
-    total_payments = sum(payment_methods.values())
+    total_payments = sum((amount for _, amount in payment_methods), start=Decimal("0"))
 
     return SummaryResponse(
         total_spent=TotalAmount(
@@ -135,7 +147,7 @@ async def get_summary(
             CategoryStat(
                 category=cat,
                 amount=round_decimal(amount),
-                percent=calculate_percent(amount, Decimal(str(total_amount)))
+                percent=calculate_percent(amount, total_amount)
                 if total_amount > Decimal("0")
                 else Decimal("0"),
             )
@@ -149,7 +161,7 @@ async def get_summary(
                 if total_payments > Decimal("0")
                 else Decimal("0"),
             )
-            for method, amount in payment_methods.items()
+            for method, amount in payment_methods
         ],
     )
 
@@ -165,19 +177,13 @@ async def get_pie_chart(
     if current_user.id is None:
         raise HTTPException(status_code=400, detail="User ID is missing")
 
-    now = datetime.now(UTC)
-    start_of_month = datetime(now.year, now.month, 1, tzinfo=UTC)
+    zone = get_zone(current_user.timezone)
+    start_of_month = period_start("month", zone)
 
-    # Получаем все транзакции
-    all_transactions = await get_all_transactions_for_user(current_user.id)
-
-    # Фильтрация по дате и типу
-    filtered = [
-        t
-        for t in all_transactions
-        if t["date"] >= start_of_month
-        and (transaction_type is None or t["type"] == transaction_type)
-    ]
+    # Транзакции текущего месяца нужного типа (запрос по индексу с диапазоном дат)
+    filtered = await get_transactions_in_window(
+        current_user.id, start=start_of_month, transaction_type=transaction_type, zone=zone
+    )
 
     if not filtered:
         raise HTTPException(
@@ -186,12 +192,13 @@ async def get_pie_chart(
         )
 
     # Группировка по категориям
-    categories: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
+    category_cents: dict[str, int] = defaultdict(int)
     for t in filtered:
         if t["category"]:
-            categories[t["category"]] += to_decimal(t["amount"])
+            category_cents[t["category"]] += t["amount_cents"]
 
-    total = sum_amounts(filtered)
+    total = from_cents(sum_cents(filtered))
+    categories = {cat: from_cents(cents) for cat, cents in category_cents.items()}
 
     return PieChartResponse(
         data=[
@@ -219,37 +226,35 @@ async def get_line_chart(
     if current_user.id is None:
         raise HTTPException(status_code=400, detail="User ID is missing")
 
-    now = datetime.now(UTC)
+    zone = get_zone(current_user.timezone)
+    today = local_now(zone).date()
     days = TIME_FRAMES[timeframe]
-    start_date = now - timedelta(days=days)
-
-    # Загружаем все транзакции
-    all_transactions = await get_all_transactions_for_user(current_user.id)
-
-    # Фильтрация по дате и типу
-    filtered = [
-        t
-        for t in all_transactions
-        if t["date"] >= start_date and (transaction_type is None or t["type"] == transaction_type)
-    ]
+    start_day = today - timedelta(days=days)
+
+    # Суммы по локальным дням считает MongoDB ($dateTrunc или daily_totals)
+    result = await run_analytics_query(
+        current_user,
+        AnalyticsQuery(
+            dimensions=["day"],
+            filters=AnalyticsQueryFilters(
+                start=day_start(start_day, zone), type=transaction_type
+            ),
+        ),
+    )
+    by_date: dict[date, Decimal] = {
+        cast("datetime", row.keys["day"]).date(): row.sum or Decimal("0")
+        for row in result.rows
+        if row.sum
+    }
 
-    if not filtered:
+    if not by_date:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No transactions found for the last {days} days",
         )
 
-    # Группировка по дате
-    by_date: dict[date, Decimal] = defaultdict(lambda: Decimal("0"))
-    for t in filtered:
-        tx_date = t["date"].date()
-        by_date[tx_date] += to_decimal(t["amount"])
-
     # Заполнение пропущенных дней
-    all_dates = [
-        start_date.date() + timedelta(days=i)
-        for i in range((now.date() - start_date.date()).days + 1)
-    ]
+    all_dates = [start_day + timedelta(days=i) for i in range((today - start_day).days + 1)]
 
     return LineChartResponse(
         timeframe=timeframe,
@@ -274,33 +279,22 @@ async def compare_months(
     if current_user.id is None:
         raise HTTPException(status_code=400, detail="User ID is missing")
 
-    now = datetime.now(UTC)
-    start_of_month = datetime(now.year, now.month, 1, tzinfo=UTC)
-
-    # Определяем начало предыдущего месяца
-    if now.month == 1:
-        start_of_prev_month = datetime(now.year - 1, 12, 1, tzinfo=UTC)
-    else:
-        start_of_prev_month = datetime(now.year, now.month - 1, 1, tzinfo=UTC)
-
-    end_of_prev_month = start_of_month - timedelta(seconds=1)
-
-    # Все транзакции
-    all_transactions = await get_all_transactions_for_user(current_user.id)
-
-    # Фильтрация по типу
-    if transaction_type:
-        all_transactions = [t for t in all_transactions if t["type"] == transaction_type]
-
-    # Группировка по месяцам
-    current_txns = [t for t in all_transactions if t["date"] >= start_of_month]
-    prev_txns = [
-        t for t in all_transactions if start_of_prev_month <= t["date"] <= end_of_prev_month
-    ]
-
-    # Суммы
-    current_total = sum((to_decimal(t["amount"]) for t in current_txns), start=Decimal("0"))
-    prev_total = sum((to_decimal(t["amount"]) for t in prev_txns), start=Decimal("0"))
+    # Текущий и прошлый месяц — по календарю пользователя
+    today = local_now(get_zone(current_user.timezone)).date()
+    start_of_month = period_start_day("month", today)
+    start_of_prev_month = previous_month_start_day(today)
+
+    # Суммы из префиксных сумм по дням: по два чтения на тип транзакции
+    # (пока суммы не построены — одной агрегацией по транзакциям)
+    types = [transaction_type] if transaction_type else list(TransactionType)
+    current_cents, prev_cents = await asyncio.gather(
+        sum_range_cents(current_user, types, start_of_month),
+        sum_range_cents(
+            current_user, types, start_of_prev_month, start_of_month - timedelta(days=1)
+        ),
+    )
+    current_total = from_cents(current_cents)
+    prev_total = from_cents(prev_cents)
 
     return MonthComparison(
         previous_month_total=round_decimal(prev_total),
@@ -321,14 +315,13 @@ async def get_budget_analysis(
     if current_user.id is None:
         raise HTTPException(status_code=400, detail="User ID is missing")
 
-    now = datetime.now(UTC)
-    start_of_month = datetime(now.year, now.month, 1, tzinfo=UTC)
+    zone = get_zone(current_user.timezone)
+    start_of_month = period_start("month", zone)
 
-    # Загружаем все транзакции (ручные + plaid)
-    all_txns = await get_all_transactions_for_user(current_user.id)
-
-    # Фильтруем только расходы текущего месяца
-    expenses = [t for t in all_txns if t["type"] == "expense" and t["date"] >= start_of_month]
+    # Расходы текущего месяца (ручные + plaid)
+    expenses = await get_transactions_in_window(
+        current_user.id, start=start_of_month, transaction_type=TransactionType.EXPENSE, zone=zone
+    )
 
     # Загружаем бюджеты
     budgets = await Budget.find(Budget.user_id == current_user.id).to_list()
@@ -336,20 +329,21 @@ async def get_budget_analysis(
         raise HTTPException(status_code=404, detail="No budgets found")
 
     # Группировка расходов по категориям
-    expenses_by_category: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
+    expenses_by_category: dict[str, int] = defaultdict(int)
     for t in expenses:
         if t["category"]:
-            expenses_by_category[t["category"]] += to_decimal(t["amount"])
+            expenses_by_category[t["category"]] += t["amount_cents"]
 
     # Ответ
     stats: list[BudgetCategoryStat] = []
-    total_budget = Decimal("0")
-    total_spent = Decimal("0")
+    total_budget_cents = 0
+    total_spent_cents = 0
 
     for budget in budgets:
-        spent = expenses_by_category.get(budget.category, Decimal("0"))
-        total_budget += budget.limit
-        total_spent += spent
+        spent_cents = expenses_by_category.get(budget.category, 0)
+        total_budget_cents += to_cents(budget.limit)
+        total_spent_cents += spent_cents
+        spent = from_cents(spent_cents)
         percent = calculate_percent(spent, budget.limit) if budget.limit > 0 else Decimal("0")
 
         stats.append(
@@ -361,6 +355,9 @@ async def get_budget_analysis(
             )
         )
 
+    total_budget = from_cents(total_budget_cents)
+    total_spent = from_cents(total_spent_cents)
+
     return BudgetOverview(
         total_budget=round_decimal(total_budget),
         total_spent=round_decimal(total_spent),
@@ -380,40 +377,29 @@ async def compare_types(
     if current_user.id is None:
         raise HTTPException(status_code=400, detail="User ID is missing")
 
-    now = datetime.now(UTC)
     days = TIME_FRAMES[timeframe]
-    start_date = now - timedelta(days=days)
-
-    # Получаем все транзакции
-    all_txns = await get_all_transactions_for_user(current_user.id)
-
-    # Фильтруем по дате
-    filtered = [t for t in all_txns if t["date"] >= start_date]
+    start_day = local_now(get_zone(current_user.timezone)).date() - timedelta(days=days)
+
+    # Итоги и категории за период — из префиксных сумм по дням
+    # (пока суммы не построены — из транзакций)
+    income_total, expense_total, income_cents, expense_cents = await asyncio.gather(
+        get_range_cents(current_user, TransactionType.INCOME, start_day),
+        get_range_cents(current_user, TransactionType.EXPENSE, start_day),
+        get_range_cents_by_category(current_user, TransactionType.INCOME, start_day),
+        get_range_cents_by_category(current_user, TransactionType.EXPENSE, start_day),
+    )
 
-    if not filtered:
+    if not (income_total or expense_total or income_cents or expense_cents):
         raise HTTPException(
             status_code=404,
             detail=f"No transactions found for the last {days} days",
         )
 
-    # Разделяем на расходы и доходы
-    expenses = [t for t in filtered if t["type"] == "expense"]
-    incomes = [t for t in filtered if t["type"] == "income"]
-
-    total_incomes = sum((to_decimal(t["amount"]) for t in incomes), start=Decimal("0"))
-    total_expenses = sum((to_decimal(t["amount"]) for t in expenses), start=Decimal("0"))
-
-    # Группировка по категориям
-    expense_categories: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
-    income_categories: dict[str, Decimal] = defaultdict(lambda: Decimal("0"))
-
-    for t in expenses:
-        if t["category"]:
-            expense_categories[t["category"]] += to_decimal(t["amount"])
+    total_incomes = from_cents(income_total)
+    total_expenses = from_cents(expense_total)
 
-    for t in incomes:
-        if t["category"]:
-            income_categories[t["category"]] += to_decimal(t["amount"])
+    expense_categories = {cat: from_cents(cents) for cat, cents in expense_cents.items()}
+    income_categories = {cat: from_cents(cents) for cat, cents in income_cents.items()}
 
     # Ответ
     return IncomeExpenseComparison(
@@ -440,3 +426,38 @@ async def compare_types(
             for cat, amount in expense_categories.items()
         ],
     )
+
+
+@router.get("/range")
+async def get_range_totals(
+    current_user: Annotated[User, Depends(get_current_user)],
+    start: date,
+    end: date,
+    category: str | None = None,
+) -> RangeTotals:
+    """
+    📆 Доходы и расходы за произвольный период [start, end] (дни в поясе пользователя,
+    включительно).
+    Каждый итог — два чтения из префиксных сумм по дням, без сканирования транзакций
+    (пока суммы не построены — одна агрегация по транзакциям).
+    """
+    if current_user.id is None:
+        raise HTTPException(status_code=400, detail="User ID is missing")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be earlier than start")
+
+    income_cents, expense_cents = await asyncio.gather(
+        get_range_cents(current_user, TransactionType.INCOME, start, end, category),
+        get_range_cents(current_user, TransactionType.EXPENSE, start, end, category),
+    )
+    total_income = from_cents(income_cents)
+    total_expense = from_cents(expense_cents)
+
+    return RangeTotals(
+        start=start,
+        end=end,
+        category=category,
+        total_income=round_decimal(total_income),
+        total_expense=round_decimal(total_expense),
+        difference=round_decimal(total_income - total_expense),
+    )
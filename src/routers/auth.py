@@ -4,9 +4,6 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 
-# Импорт для хеширования паролей
-from passlib.context import CryptContext
-
 from src.auth.dependencies import get_current_user
 from src.auth.google_oauth import TokenResponse, handle_google_login
 
@@ -14,10 +11,15 @@ from src.auth.google_oauth import TokenResponse, handle_google_login
 from src.auth.jwt import (
     create_access_token,  # если ты уже реализовал
     create_refresh_token,
+    revoke_refresh_token,
+    rotate_refresh_token,
     save_refresh_token_to_db,
-    verify_refresh_token,
 )
 
+# Хеширование и проверка паролей в отдельном пуле (не блокируют event loop)
+from src.auth.passwords import hash_password, verify_password
+from src.auth.user_cache import invalidate_user
+
 # Импорт Beanie модели пользователя (работа с MongoDB)
 from src.models import RefreshToken, User
 
@@ -27,15 +29,6 @@ from src.schemas.base import GoogleLoginPayload, UserCreate, UserLogin, UserPubl
 # Создаём роутер для группы маршрутов "/auth"
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-# Создаём объект для хеширования и проверки паролей с помощью bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-# Хешируем пароль при регистрации
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
 # Эндпоинт регистрации пользователя
 @router.post("/register")  # Возвращает публичные данные пользователя
 async def register(
@@ -51,7 +44,7 @@ async def register(
         )
 
     # Хешируем пароль перед сохранением
-    hashed = hash_password(user_in.password)
+    hashed = await hash_password(user_in.password)
 
     # Создаём нового пользователя и сохраняем в базу
     user = User(
@@ -85,12 +78,24 @@ async def register(
 @router.post("/login")
 async def login(user_in: UserLogin) -> dict[str, str]:
     user = await User.find_one(User.email == user_in.email)
-    if not user or not pwd_context.verify(user_in.password, user.hashed_password):
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+        )
+
+    is_valid, new_hash = await verify_password(user_in.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
 
+    # 🔁 Хеш со старыми параметрами bcrypt — тихо пересчитываем
+    if new_hash:
+        _ = await user.set({User.hashed_password: new_hash})
+        await invalidate_user(user.id)
+
     access_token = create_access_token({"sub": str(user.id)})
     refresh_token, created_at, expires_at = create_refresh_token()
 
@@ -130,10 +135,8 @@ async def google_login(payload: GoogleLoginPayload) -> TokenResponse:
 async def refresh_tokens(request: Request) -> dict[str, str]:
     """
     🔄 Обновление токенов:
-    1. Проверяем refresh token
-    2. Удаляем старый refresh token
-    3. Создаем новый refresh token
-    4. Создаем новый access token
+    1. Атомарно меняем старый refresh token на новый (один запрос в MongoDB)
+    2. Создаем новый access token
     """
     data = await request.json()
     incoming_token = data.get("refresh_token")
@@ -141,25 +144,11 @@ async def refresh_tokens(request: Request) -> dict[str, str]:
     if not incoming_token:
         raise HTTPException(status_code=400, detail="Refresh token required")
 
-    # Проверяем токен
-    token_doc = await verify_refresh_token(incoming_token)
-
-    # Удаляем старый refresh токен
-    _ = await token_doc.delete()
-
-    # Генерируем новый refresh токен
-    new_refresh_token, created_at, expires_at = create_refresh_token()
-
-    # Сохраняем новый refresh токен
-    await save_refresh_token_to_db(
-        user_id=str(token_doc.user_id),
-        token=new_refresh_token,
-        created_at=created_at,
-        expires_at=expires_at,
-    )
+    # Проверяем и ротируем токен
+    user_id, new_refresh_token = await rotate_refresh_token(incoming_token)
 
     # Создаём новый access token
-    new_access_token = create_access_token({"sub": str(token_doc.user_id)})
+    new_access_token = create_access_token({"sub": str(user_id)})
 
     return {
         "access_token": new_access_token,
@@ -187,11 +176,8 @@ async def logout(request: Request) -> dict[str, str]:
     if not incoming_token:
         raise HTTPException(status_code=400, detail="Refresh token required")
 
-    # Проверяем токен
-    token_doc = await verify_refresh_token(incoming_token)
-
     # Удаляем только этот конкретный токен
-    _ = await token_doc.delete()
+    await revoke_refresh_token(incoming_token)
 
     return {"detail": "Successfully logged out"}
 
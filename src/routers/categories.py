@@ -1,12 +1,20 @@
-import re
 from typing import Annotated
 
 from beanie import PydanticObjectId
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from pymongo.errors import DuplicateKeyError
 
 from src.auth.dependencies import get_current_user
-from src.models import Category, Transaction, User
-from src.schemas.category_schemas import CategoryCreate, CategoryPublic, CategoryUpdate
+from src.models import Category, CategoryJob, CategoryJobKind, User
+from src.schemas.category_schemas import (
+    CategoryCreate,
+    CategoryJobPublic,
+    CategoryMerge,
+    CategoryPublic,
+    CategoryUpdate,
+)
+from src.utils.categories import default_categories, get_user_category
+from src.utils.category_jobs import UNCATEGORIZED, create_category_job, run_category_job
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
@@ -18,13 +26,15 @@ async def get_categories(
     """
     🔍 Получить все категории (глобальные + кастомные юзера)
     """
-    categories = await Category.find(
-        {"$or": [{"user_id": current_user.id}, {"user_id": None}]}
-    ).to_list()
+    # Дефолтные категории берём из кэша процесса, из базы — только кастомные
+    custom = await Category.find(Category.user_id == current_user.id).to_list()
 
-    return [CategoryPublic.model_validate(cat.model_dump()) for cat in categories]
+    return [
+        *default_categories.items,
+        *(CategoryPublic.model_validate(cat.model_dump()) for cat in custom),
+    ]
     # ✅ .model_validate() — современная альтернатива model_dump
-    # Возвращаем список кастомных и дефолтных категорий
+    # Возвращаем список дефолтных и кастомных категорий
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -37,17 +47,6 @@ async def create_category(
     # 🧼 Убираем пробелы вокруг имени
     clean_name = category_in.name.strip()
 
-    # ⛔ Проверка на дублирование (без учёта регистра и с учётом пробелов)
-    existing = await Category.find_one(
-        {
-            "user_id": current_user.id,
-            "name": {"$regex": f"^{re.escape(clean_name)}$", "$options": "i"},
-        }
-    )
-
-    if existing:
-        raise HTTPException(status_code=400, detail="Category with this name already exists.")
-
     # ✅ Создание новой категории
     category = Category(
         name=clean_name,
@@ -56,17 +55,84 @@ async def create_category(
         color=category_in.color,
         is_default=False,
     )
-    _ = await category.insert()
+
+    # ⛔ Дубли (без учёта регистра и пробелов) отсекает уникальный индекс
+    # (user_id, name_normalized)
+    try:
+        _ = await category.insert()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400, detail="Category with this name already exists."
+        ) from None
 
     return CategoryPublic.model_validate(category.model_dump())
 
 
+@router.post("/merge", status_code=status.HTTP_202_ACCEPTED)
+async def merge_categories(
+    merge_in: CategoryMerge,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[User, Depends(get_current_user)],
+) -> CategoryJobPublic:
+    """
+    🔀 Слить свои кастомные категории в одну (кастомную или дефолтную).
+    Транзакции переносятся в фоне, прогресс — в /categories/jobs/{job_id}
+    """
+    if not current_user.id:
+        raise HTTPException(status_code=400, detail="User ID is required")
+
+    target = await get_user_category(current_user.id, merge_in.target_id)
+    if not target:
+        raise HTTPException(status_code=404, detail="Target category not found")
+
+    source_ids = [cid for cid in dict.fromkeys(merge_in.source_ids) if cid != target.id]
+    sources = await Category.find(
+        {"_id": {"$in": source_ids}}, Category.user_id == current_user.id
+    ).to_list()
+    if not sources or len(sources) != len(source_ids):
+        raise HTTPException(status_code=404, detail="Source category not found")
+
+    job = await create_category_job(
+        user_id=current_user.id,
+        kind=CategoryJobKind.MERGE,
+        source_category_ids=source_ids,
+        source_names=[cat.name for cat in sources],
+        target_category_id=target.id,
+        target_name=target.name,
+    )
+
+    # 🗑 Исходные категории удаляем сразу — транзакции догонит фоновая задача
+    _ = await Category.find({"_id": {"$in": source_ids}}).delete()
+
+    background_tasks.add_task(run_category_job, job.id)
+    return CategoryJobPublic.model_validate(job.model_dump())
+
+
+@router.get("/jobs/{job_id}")
+async def get_category_job(
+    job_id: PydanticObjectId,
+    current_user: Annotated[User, Depends(get_current_user)],
+) -> CategoryJobPublic:
+    """
+    ⏳ Прогресс фоновой задачи по категориям (переименование, удаление, слияние)
+    """
+    job = await CategoryJob.get(job_id)
+
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    return CategoryJobPublic.model_validate(job.model_dump())
+
+
 @router.delete("/{category_id}")
 async def delete_category(
-    category_id: PydanticObjectId, current_user: Annotated[User, Depends(get_current_user)]
+    category_id: PydanticObjectId,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[User, Depends(get_current_user)],
 ) -> dict[str, str]:
     """
     ❌ Удалить свою кастомную категорию и заменить её в транзакциях на 'Uncategorized'
+    (транзакции обновляются в фоне пачками)
     """
     category = await Category.get(category_id)
 
@@ -78,25 +144,33 @@ async def delete_category(
             status_code=403, detail="You are not authorized to delete this category"
         )
 
-    # 👇 Обновляем все транзакции, где использовалась эта категория
-    _ = await Transaction.find(
-        Transaction.user_id == current_user.id, Transaction.category == category.name
-    ).update_many({"$set": {"category": "Uncategorized"}})
+    # 👇 Транзакции с этой категорией перенесёт фоновая задача
+    job = await create_category_job(
+        user_id=PydanticObjectId(current_user.id),
+        kind=CategoryJobKind.DELETE,
+        source_category_ids=[category_id],
+        source_names=[category.name],
+        target_category_id=None,
+        target_name=UNCATEGORIZED,
+    )
 
-    # �� Удаляем категорию
+    # 🗑 Удаляем категорию
     _ = await category.delete()
 
-    return {"detail": "Category deleted successfully"}
+    background_tasks.add_task(run_category_job, job.id)
+    return {"detail": "Category deleted successfully", "job_id": str(job.id)}
 
 
 @router.put("/{category_id}")
 async def update_category(
     category_id: PydanticObjectId,
     category_in: CategoryUpdate,
+    background_tasks: BackgroundTasks,
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> CategoryPublic:
     """
     ✏️ Обновление категории по ID
+    (при переименовании имя в транзакциях обновляется в фоне)
     """
     # Получаем категорию по ID
     category = await Category.get(category_id)
@@ -107,15 +181,34 @@ async def update_category(
     if category.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this category")
 
+    old_name = category.name
+
     # Обновляем переданные поля
     if category_in.name is not None:
-        category.name = category_in.name
+        category.name = category_in.name.strip()
     if category_in.color is not None:
         category.color = category_in.color
     if category_in.icon is not None:
         category.icon = category_in.icon
 
-    _ = await category.save()
+    try:
+        _ = await category.save()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400, detail="Category with this name already exists."
+        ) from None
+
+    # 🔁 Имя изменилось — обновляем денормализованное имя в транзакциях
+    if category.name != old_name and current_user.id:
+        job = await create_category_job(
+            user_id=current_user.id,
+            kind=CategoryJobKind.RENAME,
+            source_category_ids=[category_id],
+            source_names=[old_name],
+            target_category_id=category_id,
+            target_name=category.name,
+        )
+        background_tasks.add_task(run_category_job, job.id)
 
     return CategoryPublic.model_validate(category.model_dump())
 
@@ -0,0 +1,43 @@
+import secrets
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from src.config import config
+from src.utils.metrics import collect_metrics
+
+bearer = HTTPBearer(auto_error=False)
+
+
+def require_metrics_token(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(bearer)],
+) -> None:
+    """🔒 Метрики — только для мониторинга с METRICS_TOKEN, не для пользователей API."""
+    token = config.METRICS_TOKEN
+    if (
+        not token
+        or credentials is None
+        or not secrets.compare_digest(credentials.credentials.encode(), token.encode())
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+    dependencies=[Depends(require_metrics_token)],
+    include_in_schema=False,
+)
+
+
+@router.get("/")
+async def get_metrics() -> dict[str, dict[str, Any]]:
+    """
+    📈 Внутренние метрики воркера (кэши, пулы, очереди)
+    """
+    return collect_metrics()
@@ -1,11 +1,11 @@
-import re
-from typing import Annotated
+from typing import Annotated, Any
 
 from beanie import PydanticObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
+from pymongo.errors import DuplicateKeyError
 
 from src.auth.dependencies import get_current_user
-from src.models import PaymentMethod, Transaction, User
+from src.models import BankTransaction, PaymentMethod, Transaction, User
 from src.schemas.payment_method_schemas import (
     PaymentMethodCreate,
     PaymentMethodPublic,
@@ -15,6 +15,19 @@ from src.schemas.payment_method_schemas import (
 router = APIRouter(prefix="/payment-methods", tags=["Payment Methods"])
 
 
+def _payment_method_filter(
+    user_id: PydanticObjectId | None, method_id: PydanticObjectId, name: str
+) -> dict[str, Any]:
+    """Транзакции пользователя с этим методом: по ID или (старые записи) по имени."""
+    return {
+        "user_id": user_id,
+        "$or": [
+            {"payment_method_id": method_id},
+            {"payment_method_id": None, "payment_method": name},
+        ],
+    }
+
+
 @router.get("/")
 async def get_user_payment_methods(
     current_user: Annotated[User, Depends(get_current_user)],
@@ -42,19 +55,6 @@ async def create_payment_method(
     # 🧼 Очистим имя от пробелов
     clean_name = method_in.name.strip()
 
-    # ⛔ Проверка на дубликаты
-    existing = await PaymentMethod.find_one(
-        {
-            "user_id": current_user.id,
-            "name": {"$regex": f"^{re.escape(clean_name)}$", "$options": "i"},
-        }
-    )
-
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="Payment method with this name already exists."
-        )
-
     # ✅ Сохраняем очищенное имя
     method = PaymentMethod(
         name=clean_name,
@@ -64,7 +64,14 @@ async def create_payment_method(
         icon=method_in.icon,
         user_id=PydanticObjectId(current_user.id),
     )
-    _ = await method.insert()
+
+    # ⛔ Дубли (без учёта регистра и пробелов) отсекает уникальный индекс
+    try:
+        _ = await method.insert()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400, detail="Payment method with this name already exists."
+        ) from None
 
     return PaymentMethodPublic.model_validate(method.model_dump())
 
@@ -83,9 +90,15 @@ async def delete_payment_method(
         raise HTTPException(status_code=403, detail="Forbidden")
 
     # 🔁 Обновляем транзакции, использующие этот метод
+    # (индекс (user_id, payment_method_id, date); старые записи без ID — по имени)
+    undefined = {"$set": {"payment_method": "Undefined", "payment_method_id": None}}
     _ = await Transaction.find(
-        Transaction.user_id == current_user.id, Transaction.payment_method == method.name
-    ).update_many({"$set": {"payment_method": "Undefined"}})
+        _payment_method_filter(current_user.id, method_id, method.name)
+    ).update_many(undefined)
+    _ = await BankTransaction.find(
+        BankTransaction.user_id == current_user.id,
+        BankTransaction.payment_method_id == method_id,
+    ).update_many(undefined)
 
     # 🗑 Удаляем метод
     _ = await method.delete()
@@ -111,9 +124,11 @@ async def update_payment_method(
     if method.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this method")
 
+    old_name = method.name
+
     # Обновляем поля
     if method_in.name is not None:
-        method.name = method_in.name
+        method.name = method_in.name.strip()
     if method_in.bank is not None:
         method.bank = method_in.bank
     if method_in.card_type is not None:
@@ -121,7 +136,23 @@ async def update_payment_method(
     if method_in.icon is not None:
         method.icon = method_in.icon
 
-    _ = await method.save()
+    try:
+        _ = await method.save()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400, detail="Payment method with this name already exists."
+        ) from None
+
+    # 🔁 Переименование — обновляем денормализованное имя в транзакциях
+    if method.name != old_name and method.id:
+        renamed = {"$set": {"payment_method": method.name, "payment_method_id": method.id}}
+        _ = await Transaction.find(
+            _payment_method_filter(current_user.id, method.id, old_name)
+        ).update_many(renamed)
+        _ = await BankTransaction.find(
+            BankTransaction.user_id == current_user.id,
+            BankTransaction.payment_method_id == method.id,
+        ).update_many(renamed)
 
     return PaymentMethodPublic.model_validate(method.model_dump())
 
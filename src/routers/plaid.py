@@ -1,6 +1,3 @@
-# Import regular expression module for pattern matching
-import re
-
 # Import time-related modules for date and time operations
 from datetime import UTC, date, datetime, timedelta
 
@@ -35,15 +32,24 @@ from src.auth.exceptions import (
     raise_plaid_api_error,
 )
 
-# Import Plaid client configuration
-from src.integrations.plaid import plaid_client
+# Import Plaid client dependency
+from src.integrations.plaid import PlaidClient
 
 # Import database models
-from src.models import BankAccount, BankConnection, BankTransaction, Category, User
+from src.models import BankAccount, BankConnection, BankTransaction, User
 
 # Import Plaid related schemas
 from src.schemas.plaid import ExchangeTokenRequest
 
+# Import category lookup by normalized name
+from src.utils.categories import get_or_create_category
+
+# Import daily totals rebuild (prefix sums for range analytics)
+from src.utils.daily_totals import rebuild_daily_totals
+
+# Import mapping of Plaid payment channels onto user's payment methods
+from src.utils.payment_methods import PlaidPaymentMethodResolver
+
 # Import utility function for balance recalculation
 from src.utils.recalculate_user_balance import recalculate_user_balance
 
@@ -59,6 +65,8 @@ router = APIRouter(prefix="/plaid", tags=["Plaid"])
 async def create_link_token(
     # Get the current authenticated user
     current_user: Annotated[User, Depends(get_current_user)],
+    # Get the Plaid API client (created on first use)
+    plaid_client: PlaidClient,
 ) -> dict[str, str]:
     try:
         # Create a request to generate a Plaid link token
@@ -92,6 +100,8 @@ async def exchange_public_token(
     data: ExchangeTokenRequest,
     # Get the current authenticated user
     current_user: Annotated[User, Depends(get_current_user)],
+    # Get the Plaid API client (created on first use)
+    plaid_client: PlaidClient,
 ) -> dict[str, Any]:
     """
     Exchange public token for access token and item ID after bank connection
@@ -165,6 +175,8 @@ async def exchange_public_token(
 async def get_and_save_bank_accounts(
     # Get the current authenticated user
     current_user: Annotated[User, Depends(get_current_user)],
+    # Get the Plaid API client (created on first use)
+    plaid_client: PlaidClient,
 ) -> list[dict[str, Any]]:
     # Get all bank connections for the user
     connections = await BankConnection.find(BankConnection.user_id == current_user.id).to_list()
@@ -233,6 +245,8 @@ async def get_and_save_bank_accounts(
 async def sync_and_get_transactions(
     # Get the current authenticated user
     current_user: Annotated[User, Depends(get_current_user)],
+    # Get the Plaid API client (created on first use)
+    plaid_client: PlaidClient,
     # Optional account type filter
     account_type: Annotated[str | None, Query] = None,
 ) -> list[dict[str, Any]]:
@@ -249,6 +263,9 @@ async def sync_and_get_transactions(
     # List to store transactions to return
     transactions_to_return: list[dict[str, Any]] = []
 
+    # Maps payment channels onto the user's payment methods (cached per sync)
+    payment_methods = PlaidPaymentMethodResolver(cast("PydanticObjectId", current_user.id))
+
     # Process each account
     for account in accounts:
         # Get associated bank connection
@@ -287,33 +304,17 @@ async def sync_and_get_transactions(
                 plaid_category = txn.category[0] if txn.category else "Uncategorized"
                 plaid_category_str = cast("str", plaid_category)
 
-                # Find or create category
-                category = await Category.find_one(
-                    {
-                        "user_id": current_user.id,
-                        "name": {"$regex": f"^{re.escape(plaid_category_str)}$", "$options": "i"},
-                    }
+                # Find or create category (exact lookup on the normalized-name index)
+                category = await get_or_create_category(
+                    user_id=cast("PydanticObjectId", current_user.id),
+                    name=plaid_category_str,
+                    icon="📦",
+                    color="#9CA3AF",
                 )
 
-                if not category:
-                    # Create new category if it doesn't exist
-                    category = Category(
-                        name=cast("str", plaid_category).strip(),
-                        user_id=current_user.id,
-                        icon="📦",
-                        color="#9CA3AF",
-                        is_default=False,
-                    )
-                    _ = await category.insert()
-
-                # Map payment channels to payment methods
-                channel_map = {
-                    "online": "Plaid - Online",
-                    "in store": "Plaid - Card",
-                    "other": "Plaid - Other",
-                }
-                payment_method = channel_map.get(
-                    cast("str", txn.payment_channel), "Plaid - Unknown"
+                # Map payment channel onto one of the user's payment methods
+                payment_method = await payment_methods.resolve(
+                    account, cast("str | None", txn.payment_channel)
                 )
 
                 # Create new transaction record
@@ -323,10 +324,15 @@ async def sync_and_get_transactions(
                     transaction_id=cast("str", txn.transaction_id),
                     name=cast("str", txn.name),
                     amount=cast("float", txn.amount),
-                    date=cast("date", txn.date),
+                    # Exact time when the bank provides it, otherwise the posting date (UTC midnight)
+                    date=cast("datetime | None", txn.datetime) or cast("date", txn.date),
+                    has_time=txn.datetime is not None,
+                    authorized_date=cast("datetime | None", txn.authorized_datetime)
+                    or cast("date | None", txn.authorized_date),
                     category=[category.name],
                     payment_channel=cast("str | None", txn.payment_channel),
-                    payment_method=payment_method,
+                    payment_method=payment_method.name,
+                    payment_method_id=payment_method.id,
                     iso_currency_code=cast("str | None", txn.iso_currency_code),
                     pending=cast("bool", txn.pending),
                     source="plaid",
@@ -345,9 +351,10 @@ async def sync_and_get_transactions(
             print(f"❌ Invalid data from Plaid: {e}")
             continue
 
-    # Recalculate user balance if user ID exists
+    # Recalculate user balance and daily totals if user ID exists
     if current_user.id:
         await recalculate_user_balance(current_user.id)
+        await rebuild_daily_totals(current_user.id)
 
     # Return sorted transactions
     return sorted(transactions_to_return, key=lambda x: x["date"], reverse=True)
@@ -382,9 +389,10 @@ async def delete_bank_connection(
     # Delete the connection
     _ = await connection.delete()
 
-    # Recalculate user balance
+    # Recalculate user balance and daily totals
     if current_user.id:
         await recalculate_user_balance(current_user.id)
+        await rebuild_daily_totals(current_user.id)
 
     # Return success message
     return {"message": "Bank connection and related data deleted"}
@@ -394,6 +402,8 @@ async def delete_bank_connection(
 async def sync_latest_transactions(
     # Get the current authenticated user
     current_user: Annotated[User, Depends(get_current_user)],
+    # Get the Plaid API client (created on first use)
+    plaid_client: PlaidClient,
 ) -> dict[str, Any]:
     """
     Sync latest transactions from Plaid (without duplicates)
@@ -406,6 +416,9 @@ async def sync_latest_transactions(
     # Counter for imported transactions
     imported = 0
 
+    # Maps payment channels onto the user's payment methods (cached per sync)
+    payment_methods = PlaidPaymentMethodResolver(cast("PydanticObjectId", current_user.id))
+
     # Process each account
     for account in accounts:
         # Get associated bank connection
@@ -444,6 +457,11 @@ async def sync_latest_transactions(
                 if not account.id:
                     raise_missing_field_error("Account ID")
 
+                # Map payment channel onto one of the user's payment methods
+                payment_method = await payment_methods.resolve(
+                    account, cast("str | None", txn.payment_channel)
+                )
+
                 # Create new transaction record
                 transaction = BankTransaction(
                     user_id=current_user.id,
@@ -451,9 +469,15 @@ async def sync_latest_transactions(
                     transaction_id=cast("str", txn.transaction_id),
                     name=cast("str", txn.name),
                     amount=cast("float", txn.amount),
-                    date=cast("date", txn.date),
+                    # Exact time when the bank provides it, otherwise the posting date (UTC midnight)
+                    date=cast("datetime | None", txn.datetime) or cast("date", txn.date),
+                    has_time=txn.datetime is not None,
+                    authorized_date=cast("datetime | None", txn.authorized_datetime)
+                    or cast("date | None", txn.authorized_date),
                     category=cast("list[str] | None", txn.category),
                     payment_channel=cast("str | None", txn.payment_channel),
+                    payment_method=payment_method.name,
+                    payment_method_id=payment_method.id,
                     iso_currency_code=cast("str | None", txn.iso_currency_code),
                     pending=cast("bool", txn.pending),
                 )
@@ -467,9 +491,10 @@ async def sync_latest_transactions(
             print(f"❌ Plaid API error: {e}")
             continue
 
-    # Recalculate user balance
+    # Recalculate user balance and daily totals
     if current_user.id:
         await recalculate_user_balance(current_user.id)
+        await rebuild_daily_totals(current_user.id)
 
     # Return success response with import count
     return {"status": "success", "imported": imported}
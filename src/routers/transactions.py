@@ -7,6 +7,12 @@ from src.auth.dependencies import get_current_user
 from src.models import Transaction, TransactionType, User
 from src.schemas.base import PaginatedTransactionsResponse, TransactionCreate, TransactionPublic
 from src.utils.analytics_helper import get_paginated_transactions_for_user
+from src.utils.calendar import get_zone
+from src.utils.categories import resolve_category
+from src.utils.daily_totals import record_transaction
+from src.utils.payment_methods import resolve_payment_method
+from src.utils.recalculate_user_balance import apply_balance_delta, signed_amount
+from src.utils.responses import MongoORJSONResponse
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
 
@@ -22,26 +28,46 @@ async def create_transaction(
     if not current_user.id:
         raise HTTPException(status_code=400, detail="User ID is required")
 
+    # Привязываем транзакцию к категории по ID (имя храним для отображения)
+    resolved = await resolve_category(
+        current_user.id, transaction_in.category_id, transaction_in.category
+    )
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    category_id, category_name = resolved
+
+    # Так же привязываем способ оплаты по ID
+    resolved_method = await resolve_payment_method(
+        current_user.id, transaction_in.payment_method_id, transaction_in.payment_method
+    )
+    if resolved_method is None:
+        raise HTTPException(status_code=404, detail="Payment method not found")
+    payment_method_id, payment_method_name = resolved_method
+
     # Создаём объект транзакции
     transaction = Transaction(
-        **transaction_in.model_dump(), user_id=PydanticObjectId(current_user.id)
+        **transaction_in.model_dump(
+            exclude={"category", "category_id", "payment_method", "payment_method_id"}
+        ),
+        category=category_name,
+        category_id=category_id,
+        payment_method=payment_method_name,
+        payment_method_id=payment_method_id,
+        user_id=PydanticObjectId(current_user.id),
     )
 
     _ = await transaction.insert()  # Сохраняем в MongoDB
 
-    # Обновляем баланс пользователя
-    if transaction.type == TransactionType.EXPENSE:
-        current_user.balance -= transaction.amount
-    else:  # income
-        current_user.balance += transaction.amount
-
-    _ = await current_user.save()
+    # Обновляем баланс пользователя и суммы по дням
+    await apply_balance_delta(current_user, signed_amount(transaction.type, transaction.amount))
+    await record_transaction(transaction, get_zone(current_user.timezone))
 
     return TransactionPublic(**transaction.model_dump())
 
 
 @router.get(
     "/all",
+    response_model=PaginatedTransactionsResponse,
 )
 async def get_all_transactions(
     current_user: Annotated[User, Depends(get_current_user)],
@@ -49,11 +75,13 @@ async def get_all_transactions(
     transaction_type: Annotated[TransactionType | None, Query] = None,
     limit: Annotated[int, Query] = 20,
     offset: Annotated[int, Query] = 0,
-) -> PaginatedTransactionsResponse:
+) -> MongoORJSONResponse:
     """
     🔄 Получить все транзакции (ручные и банковские) с пагинацией и фильтрами:
     - по source (manual / plaid)
     - по типу транзакции (income / expense)
+    Страница собирается агрегацией в MongoDB и сразу сериализуется orjson —
+    без Beanie-документов и повторной валидации (схема остаётся в OpenAPI).
     """
     if not current_user.id:
         raise HTTPException(status_code=400, detail="User ID is missing")
@@ -65,7 +93,7 @@ async def get_all_transactions(
         limit=limit,
         offset=offset,
     )
-    return PaginatedTransactionsResponse(**result)
+    return MongoORJSONResponse(result)
 
 
 @router.get("/{transaction_id}")
@@ -104,31 +132,46 @@ async def update_transaction(
     if transaction.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this transaction")
 
-    # Обновляем баланс пользователя
-    if transaction.type == TransactionType.EXPENSE:
-        current_user.balance += transaction.amount  # Возвращаем старую сумму
-    else:  # income
-        current_user.balance -= transaction.amount  # Возвращаем старую сумму
+    resolved = await resolve_category(
+        transaction.user_id, transaction_in.category_id, transaction_in.category
+    )
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    category_id, category_name = resolved
 
-    # Применяем новую сумму
-    if transaction_in.type == TransactionType.EXPENSE:
-        current_user.balance -= transaction_in.amount
-    else:  # income
-        current_user.balance += transaction_in.amount
+    resolved_method = await resolve_payment_method(
+        transaction.user_id, transaction_in.payment_method_id, transaction_in.payment_method
+    )
+    if resolved_method is None:
+        raise HTTPException(status_code=404, detail="Payment method not found")
+    payment_method_id, payment_method_name = resolved_method
+
+    # Обновляем баланс пользователя: возвращаем старую сумму и применяем новую
+    await apply_balance_delta(
+        current_user,
+        signed_amount(transaction_in.type, transaction_in.amount)
+        - signed_amount(transaction.type, transaction.amount),
+    )
 
-    _ = await current_user.save()
+    # Старая версия транзакции уйдёт из сумм по дням после сохранения
+    previous = transaction.model_copy()
 
     # Обновляем поля транзакции
     transaction.type = transaction_in.type
     transaction.amount = transaction_in.amount
-    transaction.category = transaction_in.category
-    transaction.payment_method = transaction_in.payment_method
+    transaction.category = category_name
+    transaction.category_id = category_id
+    transaction.payment_method = payment_method_name
+    transaction.payment_method_id = payment_method_id
     transaction.description = transaction_in.description
 
     if transaction_in.date:
         transaction.date = transaction_in.date
 
     _ = await transaction.save()
+    # Суммы по дням — только после записи в MongoDB (см. daily_totals)
+    await record_transaction(previous, get_zone(current_user.timezone), sign=-1)
+    await record_transaction(transaction, get_zone(current_user.timezone))
 
     return TransactionPublic(**transaction.model_dump())
 
@@ -149,15 +192,11 @@ async def delete_transaction(
     if transaction.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this transaction")
 
-    # Обновляем баланс пользователя
-    if transaction.type == TransactionType.EXPENSE:
-        current_user.balance += transaction.amount  # Возвращаем сумму расхода
-    else:  # income
-        current_user.balance -= transaction.amount  # Возвращаем сумму дохода
-
-    _ = await current_user.save()
+    # Обновляем баланс пользователя (возвращаем сумму транзакции)
+    await apply_balance_delta(current_user, -signed_amount(transaction.type, transaction.amount))
 
-    # Удаляем транзакцию
+    # Удаляем транзакцию, затем убираем её из сумм по дням
     _ = await transaction.delete()
+    await record_transaction(transaction, get_zone(current_user.timezone), sign=-1)
 
     return {"message": "Transaction deleted successfully"}
@@ -1,8 +1,10 @@
-from datetime import date
+from datetime import UTC, date, datetime
 from decimal import Decimal
 from typing import Literal
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from src.models import TransactionType
 
 # ────────────── 📦 Типы ──────────────
 
@@ -151,3 +153,89 @@ class IncomeExpenseComparison(DecimalModel):
     expense_percent: Decimal  # Процент расходов от общей суммы
     top_income_categories: list[CategoryStat]  # Топ категории доходов
     top_expense_categories: list[CategoryStat]  # Топ категории расходов
+
+
+# ────────────── 📆 Произвольный период ──────────────
+
+
+class RangeTotals(DecimalModel):
+    """
+    📆 Доходы и расходы за период [start, end] (дни в поясе пользователя, включительно)
+    """
+
+    start: date
+    end: date
+    category: str | None  # None — все категории
+    total_income: Decimal
+    total_expense: Decimal
+    difference: Decimal
+
+
+# ────────────── 🧮 Конструктор запросов (/analytics/query) ──────────────
+
+QueryDimension = Literal[
+    "category", "payment_method", "source", "type", "day", "week", "month", "year"
+]
+QueryMeasure = Literal["sum", "count", "avg", "min", "max"]
+TIME_BUCKETS: tuple[QueryDimension, ...] = ("day", "week", "month", "year")
+
+
+class AnalyticsQueryFilters(BaseModel):
+    """
+    🔎 Фильтры запроса: период [start, end) и значения измерений
+    """
+
+    start: datetime | None = None
+    end: datetime | None = None
+    type: TransactionType | None = None
+    source: Literal["manual", "plaid"] | None = None
+    categories: list[str] | None = None
+    payment_methods: list[str] | None = None
+
+    @field_validator("start", "end")
+    @classmethod
+    def validate_utc(cls, v: datetime | None) -> datetime | None:
+        # Даты без часового пояса считаем UTC
+        return v.replace(tzinfo=UTC) if v is not None and v.tzinfo is None else v
+
+
+class AnalyticsQuery(BaseModel):
+    """
+    🧮 Запрос к аналитике: группировка по измерениям и набор мер по сумме транзакций
+    """
+
+    dimensions: list[QueryDimension] = Field(default_factory=list)
+    measures: list[QueryMeasure] = Field(default_factory=lambda: ["sum"], min_length=1)
+    filters: AnalyticsQueryFilters = Field(default_factory=AnalyticsQueryFilters)
+    limit: int = Field(default=1000, ge=1, le=10_000)
+
+    @field_validator("dimensions")
+    @classmethod
+    def validate_dimensions(cls, v: list[QueryDimension]) -> list[QueryDimension]:
+        if len(set(v)) != len(v):
+            raise ValueError("Dimensions must not repeat")
+        if sum(d in TIME_BUCKETS for d in v) > 1:
+            raise ValueError("Only one time bucket (day, week, month, year) is allowed")
+        return v
+
+
+class AnalyticsQueryRow(DecimalModel):
+    """
+    📄 Строка результата: значения измерений и посчитанные меры
+    """
+
+    keys: dict[str, str | datetime | None]
+    sum: Decimal | None = None
+    count: int | None = None
+    avg: Decimal | None = None
+    min: Decimal | None = None
+    max: Decimal | None = None
+
+
+class AnalyticsQueryResponse(DecimalModel):
+    """
+    🧮 Ответ /analytics/query
+    """
+
+    served_from: Literal["transactions", "daily_totals"]  # Откуда посчитано
+    rows: list[AnalyticsQueryRow]
@@ -4,9 +4,10 @@ from datetime import datetime
 from decimal import Decimal  # Добавляем импорт Decimal
 
 from beanie import PydanticObjectId
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 
 from src.models import TransactionType
+from src.utils.calendar import is_valid_timezone
 
 
 class BaseModelWithConfig(BaseModel):
@@ -95,7 +96,9 @@ class TransactionCreate(BaseModelWithDecimalAsFloat):
     amount: Decimal
     type: TransactionType  # Используем enum вместо строки
     category: str | None = None
+    category_id: PydanticObjectId | None = None  # Если передан — имя берётся из категории
     payment_method: str | None = None
+    payment_method_id: PydanticObjectId | None = None  # Если передан — имя берётся из метода
     source: str | None = None  # Для доходов
     date: datetime | None = None
     description: str | None = None
@@ -107,7 +110,9 @@ class TransactionPublic(BaseModelWithDecimalAsFloat):
     amount: Decimal
     type: TransactionType  # Используем enum вместо строки
     category: str | None = None
+    category_id: PydanticObjectId | None = None
     payment_method: str | None = None
+    payment_method_id: PydanticObjectId | None = None
     source: str | None = None
     date: datetime | None = None
     description: str | None = None
@@ -146,3 +151,15 @@ class PasswordUpdateRequest(BaseModel):
 # Модель для ответа на обновление пароля
 class PasswordUpdateResponse(BaseModel):
     detail: str = "Password updated successfully."
+
+
+# Модель для смены часового пояса пользователя
+class TimezoneUpdateRequest(BaseModel):
+    timezone: str = Field(..., examples=["America/Toronto"])  # IANA-имя пояса
+
+    @field_validator("timezone")
+    @classmethod
+    def validate_timezone(cls, v: str) -> str:
+        if not is_valid_timezone(v):
+            raise ValueError("Unknown time zone")
+        return v
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from beanie import PydanticObjectId
 from pydantic import BaseModel, Field
 
@@ -31,3 +33,19 @@ class CategoryUpdate(BaseModel):
         description="HEX color code (e.g. #FF5733)",
     )
     icon: str | None = None
+
+
+class CategoryMerge(BaseModel):
+    source_ids: list[PydanticObjectId] = Field(..., min_length=1)  # Категории, которые сливаем
+    target_id: PydanticObjectId  # Категория, в которую сливаем
+
+
+class CategoryJobPublic(BaseModel):
+    id: PydanticObjectId
+    kind: str
+    status: str
+    processed: int
+    target_name: str
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,121 @@
+from datetime import UTC, datetime
+from typing import Any, ClassVar
+
+from pydantic import BaseModel, field_validator
+
+from src.models import TransactionType
+from src.utils.money import AMOUNT_CENTS_EXPR
+
+# ---------- 🔎 Projection-модели Beanie ----------
+# MongoDB возвращает только перечисленные в Settings.projection поля,
+# а Pydantic валидирует только их (а не весь документ с его валидаторами).
+
+# Категории Plaid — массив строк; склеиваем через ", " как в списке транзакций
+PLAID_CATEGORY_NAME: dict[str, Any] = {
+    "$reduce": {
+        "input": {"$ifNull": ["$category", []]},
+        "initialValue": None,
+        "in": {
+            "$cond": [
+                {"$eq": ["$$value", None]},
+                "$$this",
+                {"$concat": ["$$value", ", ", "$$this"]},
+            ]
+        },
+    }
+}
+
+# Тип Plaid-транзакции по знаку суммы: доходы в Plaid — отрицательные
+PLAID_TRANSACTION_TYPE: dict[str, Any] = {
+    "$cond": [{"$lt": ["$amount", 0]}, TransactionType.INCOME.value, TransactionType.EXPENSE.value]
+}
+
+
+def plaid_timezone(timezone: str) -> dict[str, Any]:
+    """Пояс для даты Plaid: даты без времени (has_time не True) — уже локальные дни."""
+    return {"$cond": [{"$eq": ["$has_time", True]}, timezone, "UTC"]}
+
+
+def local_day_expr(timezone: str | dict[str, Any]) -> dict[str, Any]:
+    """Локальный день $date в поясе timezone — его дата как полночь UTC (как в daily_totals)."""
+    return {
+        "$dateFromString": {
+            "dateString": {
+                "$dateToString": {"date": "$date", "format": "%Y-%m-%d", "timezone": timezone}
+            },
+            "format": "%Y-%m-%d",
+        }
+    }
+
+
+class AnalyticsRow(BaseModel):
+    """Поля транзакции, которые нужны аналитике (сумма — в центах)."""
+
+    amount_cents: int
+    type: TransactionType
+    category: str | None = None
+    payment_method: str | None = None
+    date: datetime
+    source: str
+
+    @field_validator("date", mode="before")
+    @classmethod
+    def validate_date(cls, v: datetime) -> datetime:
+        # MongoDB отдаёт наивные даты в UTC
+        return v.replace(tzinfo=UTC) if v.tzinfo is None else v
+
+
+class TransactionAnalyticsRow(AnalyticsRow):
+    """Ручная транзакция для аналитики."""
+
+    class Settings:
+        projection: ClassVar[dict[str, Any]] = {
+            "_id": 0,
+            "amount_cents": AMOUNT_CENTS_EXPR,
+            "type": 1,
+            "category": 1,
+            "payment_method": 1,
+            "date": 1,
+            "source": {"$literal": "manual"},
+        }
+
+
+class BankTransactionAnalyticsRow(AnalyticsRow):
+    """
+    Plaid-транзакция для аналитики: тип и категория вычисляются в MongoDB,
+    сумма — по модулю (тип уже говорит, доход это или расход).
+    """
+
+    class Settings:
+        projection: ClassVar[dict[str, Any]] = {
+            "_id": 0,
+            "amount_cents": {"$abs": AMOUNT_CENTS_EXPR},
+            "type": PLAID_TRANSACTION_TYPE,
+            "category": PLAID_CATEGORY_NAME,
+            "payment_method": 1,
+            "date": 1,
+            "source": {"$literal": "plaid"},
+        }
+
+
+class TransactionBalanceRow(BaseModel):
+    """Ручная транзакция для пересчёта баланса."""
+
+    amount_cents: int
+    type: TransactionType
+
+    class Settings:
+        projection: ClassVar[dict[str, Any]] = {
+            "_id": 0,
+            "amount_cents": AMOUNT_CENTS_EXPR,
+            "type": 1,
+        }
+
+
+class BankTransactionBalanceRow(BaseModel):
+    """Plaid-транзакция для пересчёта баланса (центы со знаком Plaid)."""
+
+    amount_cents: int
+
+    class Settings:
+        projection: ClassVar[dict[str, Any]] = {"_id": 0, "amount_cents": AMOUNT_CENTS_EXPR}
@@ -0,0 +1,171 @@
+import hashlib
+import json
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any
+
+from beanie import PydanticObjectId
+from beanie.operators import Set
+
+from src.config import config
+from src.models import AITips, TransactionType
+from src.utils.analytics_helper import get_category_totals, round_decimal
+from src.utils.metrics import register_metrics
+from src.utils.single_flight import SingleFlight
+from src.utils.ttl_cache import TTLCache
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+NO_TIPS_ANSWER = "Нет совета"
+
+SYSTEM_PROMPT = (
+    "Ты дерзкий и умный финансовый коуч. Пиши строго по делу, кратко. "
+    "Советы — полезные, конкретные. Без воды и повторов."
+)
+
+
+async def get_month_spending(
+    user_id: PydanticObjectId, moment: datetime | None = None
+) -> tuple[dict[str, Decimal], Decimal]:
+    """📊 Расходы (ручные + Plaid) по категориям за месяц и их итог."""
+    now = moment or datetime.now(UTC)
+    start_of_month = datetime(now.year, now.month, 1, tzinfo=UTC)
+    by_category = await get_category_totals(user_id, TransactionType.EXPENSE, start=start_of_month)
+    return by_category, sum(by_category.values(), start=Decimal("0"))
+
+
+def build_user_prompt(by_category: dict[str, Decimal], total: Decimal) -> str:
+    """✍️ Составляет текст для GPT из сумм по категориям."""
+    analysis_text = "\n".join(
+        [f"- {cat}: {round_decimal(amount)} CAD" for cat, amount in by_category.items()]
+    )
+    return (
+        f"Расходы за месяц: {round_decimal(total)} CAD.\n"
+        f"Категории:\n{analysis_text}\n\n"
+        f"Дай 3 совета, как улучшить мои траты."
+    )
+
+
+def build_messages(user_prompt: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def parse_tips(answer: str | None) -> list[str]:
+    """Разбивает ответ модели на список советов."""
+    return answer.strip().split("\n") if answer else [NO_TIPS_ANSWER]
+
+
+async def request_tips(client: "AsyncOpenAI", user_prompt: str) -> list[str]:
+    """🚀 Один запрос к OpenAI за советами (без кэша)."""
+    response = await client.chat.completions.create(
+        model=config.OPENAI_MODEL,
+        messages=build_messages(user_prompt),
+        temperature=config.OPENAI_TEMPERATURE,
+        max_tokens=config.OPENAI_MAX_TOKENS,
+    )
+    return parse_tips(response.choices[0].message.content)
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Одно событие Server-Sent Events с JSON в data."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def spending_fingerprint(by_category: dict[str, Decimal], total: Decimal) -> str:
+    """
+    🧾 Хеш входных данных промпта: пока траты за месяц не изменились,
+    ответ модели можно переиспользовать.
+    """
+    payload = {
+        "model": config.OPENAI_MODEL,
+        "total": str(round_decimal(total)),
+        "categories": sorted((cat, str(round_decimal(amount))) for cat, amount in by_category.items()),
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode()).hexdigest()
+
+
+# ────────────── 🧠 Кэш советов + single-flight ──────────────
+
+tips_cache: TTLCache[str, list[str]] = TTLCache(
+    maxsize=config.AI_TIPS_CACHE_MAX_SIZE,
+    ttl=config.AI_TIPS_CACHE_TTL_SECONDS,
+)
+tips_flight: SingleFlight[list[str]] = SingleFlight()
+
+register_metrics("ai_tips_cache", lambda: tips_cache.stats() | tips_flight.stats())
+
+
+def tips_cache_key(user_id: Any, fingerprint: str) -> str:
+    return f"{user_id}:{fingerprint}"
+
+
+async def get_or_generate_tips(
+    cache_key: str, generate: Callable[[], Awaitable[list[str]]]
+) -> tuple[list[str], bool]:
+    """
+    Отдаёт советы из кэша, иначе вызывает generate (одновременные
+    одинаковые запросы склеиваются в один вызов OpenAI).
+    Возвращает (советы, взяты ли они из кэша).
+    """
+    cached = tips_cache.get(cache_key)
+    if cached is not None:
+        return cached, True
+
+    async def generate_and_cache() -> list[str]:
+        tips = await generate()
+        tips_cache.set(cache_key, tips)
+        return tips
+
+    return await tips_flight.do(cache_key, generate_and_cache), False
+
+
+# ────────────── 💾 Сохранённые советы (коллекция ai_tips) ──────────────
+
+
+def month_key(moment: datetime | None = None) -> str:
+    """Месяц, за который считаются советы: "YYYY-MM" (UTC)."""
+    return (moment or datetime.now(UTC)).strftime("%Y-%m")
+
+
+async def get_stored_tips(
+    user_id: PydanticObjectId, month: str, fingerprint: str
+) -> AITips | None:
+    """
+    Советы пользователя за месяц — одно чтение по уникальному индексу user_id.
+    None, если с тех пор траты изменились (другой отпечаток).
+    """
+    stored = await AITips.find_one(AITips.user_id == user_id)
+    if stored is None or stored.month != month or stored.fingerprint != fingerprint:
+        return None
+    return stored
+
+
+async def save_tips(
+    user_id: PydanticObjectId, month: str, fingerprint: str, tips: list[str]
+) -> None:
+    """Сохраняет (перезаписывает) советы пользователя."""
+    now = datetime.now(UTC)
+    _ = await AITips.find_one(AITips.user_id == user_id).upsert(
+        Set(
+            {
+                AITips.month: month,
+                AITips.fingerprint: fingerprint,
+                AITips.model: config.OPENAI_MODEL,
+                AITips.tips: tips,
+                AITips.generated_at: now,
+            }
+        ),
+        on_insert=AITips(
+            user_id=user_id,
+            month=month,
+            fingerprint=fingerprint,
+            model=config.OPENAI_MODEL,
+            tips=tips,
+            generated_at=now,
+        ),
+    )
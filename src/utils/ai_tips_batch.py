@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from datetime import datetime
+
+import openai
+from beanie import PydanticObjectId
+from bson import ObjectId
+
+from src.config import config
+from src.models import BankTransaction, Transaction, TransactionType
+from src.utils.ai_tips import (
+    build_user_prompt,
+    get_month_spending,
+    get_stored_tips,
+    month_key,
+    request_tips,
+    save_tips,
+    spending_fingerprint,
+)
+
+# Ошибки OpenAI, после которых имеет смысл повторить запрос
+# (APITimeoutError — наследник APIConnectionError)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+MAX_BACKOFF_SECONDS = 30.0
+# Сколько пользователей обрабатываем за один gather (задачи создаются пачками)
+BATCH_CHUNK_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """⏱️ Не больше rate запросов в секунду: запросы выстраиваются с равным интервалом."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def find_candidate_users(since: datetime) -> list[PydanticObjectId]:
+    """
+    Пользователи, у которых появились траты после since.
+    Время создания берём из _id, поэтому хватает индекса по _id.
+    """
+    new_since = {"_id": {"$gte": ObjectId.from_datetime(since)}}
+    manual = await Transaction.get_motor_collection().distinct(
+        "user_id", {**new_since, "type": TransactionType.EXPENSE.value}
+    )
+    plaid = await BankTransaction.get_motor_collection().distinct(
+        "user_id", {**new_since, "amount": {"$gte": 0}}
+    )
+    return [PydanticObjectId(user_id) for user_id in {*manual, *plaid}]
+
+
+async def request_tips_with_retries(
+    client: openai.AsyncOpenAI, user_prompt: str, limiter: RateLimiter, max_retries: int
+) -> list[str]:
+    """Запрос к OpenAI с лимитом RPS и экспоненциальной паузой между повторами."""
+    attempt = 0
+    while True:
+        await limiter.wait()
+        try:
+            return await request_tips(client, user_prompt)
+        except RETRYABLE_ERRORS:
+            if attempt >= max_retries:
+                raise
+            backoff = min(2**attempt, MAX_BACKOFF_SECONDS)
+            await asyncio.sleep(backoff + random.uniform(0, 1))
+            attempt += 1
+
+
+async def precompute_ai_tips(
+    client: openai.AsyncOpenAI,
+    since: datetime,
+    concurrency: int = config.AI_TIPS_BATCH_CONCURRENCY,
+    rps: float = config.AI_TIPS_BATCH_RPS,
+    max_retries: int = config.AI_TIPS_BATCH_MAX_RETRIES,
+) -> Counter[str]:
+    """
+    🌙 Пересчитывает советы для пользователей с новыми тратами после since.
+
+    Для каждого пользователя строится тот же промпт, что и в /ai/tips
+    (агрегаты за текущий месяц). Если отпечаток трат не изменился с прошлого
+    расчёта — запрос к OpenAI не делается. Результат — в коллекцию ai_tips.
+    Пользователи обрабатываются пачками по BATCH_CHUNK_SIZE, одновременно —
+    не больше concurrency. Возвращает счётчики: candidates, generated,
+    unchanged, empty, failed.
+    """
+    stats: Counter[str] = Counter()
+    month = month_key()
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rps)
+
+    user_ids = await find_candidate_users(since)
+    stats["candidates"] = len(user_ids)
+
+    async def process(user_id: PydanticObjectId) -> None:
+        async with semaphore:
+            by_category, total = await get_month_spending(user_id)
+            if not by_category:
+                # Новые траты были, но не за текущий месяц
+                stats["empty"] += 1
+                return
+
+            fingerprint = spending_fingerprint(by_category, total)
+            if await get_stored_tips(user_id, month, fingerprint) is not None:
+                stats["unchanged"] += 1
+                return
+
+            try:
+                tips = await request_tips_with_retries(
+                    client, build_user_prompt(by_category, total), limiter, max_retries
+                )
+            except openai.OpenAIError:
+                logger.warning("AI tips failed for user %s", user_id, exc_info=True)
+                stats["failed"] += 1
+                return
+
+            await save_tips(user_id, month, fingerprint, tips)
+            stats["generated"] += 1
+
+    # Ошибка одного пользователя (MongoDB, баг в промпте) не останавливает батч
+    for start in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+        chunk = user_ids[start : start + BATCH_CHUNK_SIZE]
+        results = await asyncio.gather(
+            *(process(user_id) for user_id in chunk), return_exceptions=True
+        )
+        for user_id, result in zip(chunk, results, strict=True):
+            if isinstance(result, Exception):
+                logger.error("AI tips failed for user %s", user_id, exc_info=result)
+                stats["failed"] += 1
+            elif isinstance(result, BaseException):
+                raise result
+    return stats
@@ -0,0 +1,146 @@
+from datetime import UTC, datetime
+from decimal import Decimal
+
+from beanie import PydanticObjectId
+
+from src.models import Budget, TransactionType
+from src.utils.ai_tips import NO_TIPS_ANSWER
+from src.utils.analytics_helper import calculate_percent, get_category_totals, round_decimal
+from src.utils.normalization import normalize_name
+
+# Необязательные траты — на них проще всего сэкономить
+DISCRETIONARY_CATEGORIES = frozenset(
+    normalize_name(name)
+    for name in (
+        "Entertainment",
+        "Shopping",
+        "Restaurants",
+        "Food and Drink",
+        "Coffee",
+        "Travel",
+        "Recreation",
+        "Subscriptions",
+        "Hobbies",
+    )
+)
+
+MAX_TIPS = 3
+BUDGET_WARNING_PERCENT = Decimal("90")
+# Рост к прошлому месяцу: не меньше чем в 1.3 раза и не меньше чем на 50 CAD
+SPIKE_RATIO = Decimal("1.3")
+SPIKE_MIN_DELTA = Decimal("50")
+DISCRETIONARY_CUT = Decimal("0.2")
+
+
+def previous_month_window(moment: datetime) -> tuple[datetime, datetime]:
+    """
+    Тот же отрезок прошлого месяца: с 1-го числа и столько же дней,
+    сколько прошло в текущем (чтобы сравнивать сопоставимые суммы).
+    """
+    start_of_month = datetime(moment.year, moment.month, 1, tzinfo=UTC)
+    if moment.month == 1:
+        previous_start = datetime(moment.year - 1, 12, 1, tzinfo=UTC)
+    else:
+        previous_start = datetime(moment.year, moment.month - 1, 1, tzinfo=UTC)
+    previous_end = min(previous_start + (moment - start_of_month), start_of_month)
+    return previous_start, previous_end
+
+
+def rule_tips(
+    by_category: dict[str, Decimal],
+    total: Decimal,
+    budgets: dict[str, Decimal],
+    previous: dict[str, Decimal],
+) -> list[str]:
+    """
+    📏 Советы без модели — по тем же суммам, что уходят в промпт GPT:
+    1. превышенные (или почти исчерпанные) бюджеты
+    2. резкий рост категории к тому же периоду прошлого месяца
+    3. самая крупная необязательная трата
+    """
+    tips: list[str] = []
+    spent_by_name = {normalize_name(cat): (cat, amount) for cat, amount in by_category.items()}
+
+    # 🚨 Бюджеты (сначала самые большие превышения)
+    budget_rows: list[tuple[Decimal, str]] = []
+    for name, limit in budgets.items():
+        category, spent = spent_by_name.get(normalize_name(name), (name, Decimal("0")))
+        if limit <= 0 or spent <= 0:
+            continue
+        percent = calculate_percent(spent, limit)
+        if spent > limit:
+            budget_rows.append(
+                (
+                    percent,
+                    f"🚨 {category}: потрачено {round_decimal(spent)} CAD при лимите "
+                    f"{round_decimal(limit)} CAD — перерасход {round_decimal(spent - limit)} CAD. "
+                    f"До конца месяца лучше не тратить в этой категории.",
+                )
+            )
+        elif percent >= BUDGET_WARNING_PERCENT:
+            budget_rows.append(
+                (
+                    percent,
+                    f"⚠️ {category}: израсходовано {percent}% бюджета "
+                    f"({round_decimal(spent)} из {round_decimal(limit)} CAD). Притормози.",
+                )
+            )
+    tips.extend(text for _, text in sorted(budget_rows, reverse=True))
+
+    # 📈 Рост к прошлому месяцу (сначала самый большой прирост в деньгах)
+    previous_by_name = {normalize_name(cat): amount for cat, amount in previous.items()}
+    spikes: list[tuple[Decimal, str]] = []
+    for category, amount in by_category.items():
+        before = previous_by_name.get(normalize_name(category), Decimal("0"))
+        delta = amount - before
+        if before > 0 and amount >= before * SPIKE_RATIO and delta >= SPIKE_MIN_DELTA:
+            growth = calculate_percent(delta, before)
+            spikes.append(
+                (
+                    delta,
+                    f"📈 {category}: {round_decimal(amount)} CAD против {round_decimal(before)} CAD "
+                    f"за тот же период прошлого месяца (+{growth}%). Проверь, что изменилось.",
+                )
+            )
+    tips.extend(text for _, text in sorted(spikes, reverse=True))
+
+    # 🎯 Самая крупная необязательная трата (или просто самая крупная категория)
+    if by_category:
+        discretionary = {
+            cat: amount
+            for cat, amount in by_category.items()
+            if normalize_name(cat) in DISCRETIONARY_CATEGORIES
+        }
+        candidates = discretionary or by_category
+        category = max(candidates, key=lambda cat: candidates[cat])
+        amount = candidates[category]
+        tips.append(
+            f"🎯 Больше всего уходит на {category}: {round_decimal(amount)} CAD "
+            f"({calculate_percent(amount, total)}% расходов). Срежь на 20% — сэкономишь "
+            f"{round_decimal(amount * DISCRETIONARY_CUT)} CAD в месяц."
+        )
+
+    return tips[:MAX_TIPS] or [NO_TIPS_ANSWER]
+
+
+async def build_rule_tips(
+    user_id: PydanticObjectId,
+    by_category: dict[str, Decimal],
+    total: Decimal,
+    moment: datetime | None = None,
+) -> list[str]:
+    """Загружает бюджеты и траты прошлого месяца и считает советы по правилам."""
+    now = moment or datetime.now(UTC)
+    previous_start, previous_end = previous_month_window(now)
+
+    budgets = await Budget.find(Budget.user_id == user_id).to_list()
+    previous = await get_category_totals(
+        user_id, TransactionType.EXPENSE, start=previous_start, end=previous_end
+    )
+
+    return rule_tips(
+        by_category,
+        total,
+        budgets={budget.category: budget.limit for budget in budgets},
+        previous=previous,
+    )
@@ -1,11 +1,22 @@
-from datetime import UTC, date, datetime
+import asyncio
+from collections import defaultdict
+from datetime import UTC, date, datetime, tzinfo
 from decimal import ROUND_HALF_UP, Decimal
 from typing import Any, Literal
 
 from beanie import PydanticObjectId
 
-from src.models import BankTransaction, Transaction, TransactionType
-from src.schemas.base import TransactionPublic
+from src.models import BankTransaction, PaymentMethod, Transaction, TransactionType
+from src.schemas.projections import (
+    PLAID_CATEGORY_NAME,
+    PLAID_TRANSACTION_TYPE,
+    BankTransactionAnalyticsRow,
+    TransactionAnalyticsRow,
+    local_day_expr,
+    plaid_timezone,
+)
+from src.utils.calendar import Period, day_label, day_start, first_day_from
+from src.utils.money import AMOUNT_CENTS_EXPR, from_cents
 
 
 def round_decimal(value: Decimal) -> Decimal:
@@ -24,15 +35,54 @@ def to_decimal(value: Any) -> Decimal:
     return Decimal(str(value))
 
 
-def sum_amounts(transactions: list[dict[str, Any]]) -> Decimal:
-    return sum((to_decimal(t["amount"]) for t in transactions), start=Decimal("0"))
+# ────────────── 📄 Список транзакций (ручные + Plaid) в формате TransactionPublic ──────────────
+# Документы приводятся к полям TransactionPublic прямо в MongoDB ($project),
+# поэтому ответ можно отдать в JSON без Beanie-документов и повторной валидации Pydantic.
+# amount — float, как и в JSON-ответе TransactionPublic (Decimal128 orjson сериализует медленно).
 
+MANUAL_PUBLIC_PROJECTION: dict[str, Any] = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "user_id": {"$toString": "$user_id"},
+    "amount": {"$toDouble": "$amount"},
+    "type": "$type",
+    "category": {"$ifNull": ["$category", None]},
+    "category_id": {"$toString": "$category_id"},
+    "payment_method": {"$ifNull": ["$payment_method", None]},
+    "payment_method_id": {"$toString": "$payment_method_id"},
+    "source": {"$literal": "manual"},
+    "date": "$date",
+    "description": {"$ifNull": ["$description", None]},
+    "sort_id": "$_id",
+}
 
-def to_datetime(d: date | datetime) -> datetime:
-    """Конвертирует date в datetime если нужно"""
-    if isinstance(d, date) and not isinstance(d, datetime):
-        return datetime.combine(d, datetime.min.time(), tzinfo=UTC)
-    return d
+PLAID_PUBLIC_PROJECTION: dict[str, Any] = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "user_id": {"$toString": "$user_id"},
+    "amount": {"$toDouble": "$amount"},
+    "type": PLAID_TRANSACTION_TYPE,
+    "category": PLAID_CATEGORY_NAME,
+    "category_id": {"$literal": None},
+    "payment_method": {"$ifNull": ["$payment_method", None]},
+    "payment_method_id": {"$toString": "$payment_method_id"},
+    "source": {"$literal": "plaid"},
+    "date": "$date",
+    "description": "$name",
+    "sort_id": "$_id",
+}
+
+
+def _page_stages(
+    match: dict[str, Any], projection: dict[str, Any], offset: int, limit: int
+) -> list[dict[str, Any]]:
+    return [
+        {"$match": match},
+        {"$sort": {"date": -1, "_id": -1}},
+        {"$skip": offset},
+        {"$limit": limit},
+        {"$project": projection},
+    ]
 
 
 async def get_paginated_transactions_for_user(
@@ -42,107 +92,335 @@ async def get_paginated_transactions_for_user(
     limit: int = 20,
     offset: int = 0,
 ) -> dict[str, Any]:
-    manual_data: list[dict[str, Any]] = []
-    plaid_data: list[dict[str, Any]] = []
+    """
+    Страница транзакций пользователя (новые сверху): $sort / $skip / $limit идут
+    по исходным полям до $project, поэтому их обслуживает индекс (user_id, [type,] date, _id),
+    а total — count_documents по тем же фильтрам. Элементы — dict с полями
+    TransactionPublic: id — строки, amount — float, date — datetime из BSON.
+    """
+    manual_match: dict[str, Any] = {"user_id": user_id}
+    if transaction_type is not None:
+        manual_match["type"] = transaction_type.value
+    plaid_match: dict[str, Any] = {"user_id": user_id, **plaid_type_filter(transaction_type)}
+
+    manual_collection = Transaction.get_motor_collection()
+    plaid_collection = BankTransaction.get_motor_collection()
 
     if source_filter == "manual":
-        base_query = Transaction.find(Transaction.user_id == user_id)
-        if transaction_type:
-            base_query = base_query.find(Transaction.type == transaction_type)
-
-        total = await base_query.count()
-        manual = await base_query.sort("-date").skip(offset).limit(limit).to_list()
-        manual_data = [
-            TransactionPublic(**txn.model_dump(exclude_none=True)).model_dump()
-            | {"source": "manual"}
-            for txn in manual
+        collection = manual_collection
+        pipeline = _page_stages(manual_match, MANUAL_PUBLIC_PROJECTION, offset, limit)
+        counts = [manual_collection.count_documents(manual_match)]
+    elif source_filter == "plaid":
+        collection = plaid_collection
+        pipeline = _page_stages(plaid_match, PLAID_PUBLIC_PROJECTION, offset, limit)
+        counts = [plaid_collection.count_documents(plaid_match)]
+    else:
+        # Каждая коллекция отдаёт по индексу не больше offset + limit первых строк,
+        # объединяем уже их
+        collection = manual_collection
+        pipeline = [
+            *_page_stages(manual_match, MANUAL_PUBLIC_PROJECTION, 0, offset + limit),
+            {
+                "$unionWith": {
+                    "coll": BankTransaction.get_collection_name(),
+                    "pipeline": _page_stages(
+                        plaid_match, PLAID_PUBLIC_PROJECTION, 0, offset + limit
+                    ),
+                }
+            },
+            {"$sort": {"date": -1, "sort_id": -1}},
+            {"$skip": offset},
+            {"$limit": limit},
+        ]
+        counts = [
+            manual_collection.count_documents(manual_match),
+            plaid_collection.count_documents(plaid_match),
         ]
 
-        return {
-            "items": manual_data,
-            "total": total,
-            "limit": limit,
-            "offset": offset,
-            "has_next": offset + len(manual_data) < total,
-        }
+    items, *totals = await asyncio.gather(
+        collection.aggregate([*pipeline, {"$project": {"sort_id": 0}}]).to_list(None), *counts
+    )
+    total: int = sum(totals)
+
+    return {
+        "items": items,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_next": offset + len(items) < total,
+    }
+
+
+def plaid_type_filter(transaction_type: TransactionType | None) -> dict[str, Any]:
+    """Фильтр Plaid-транзакций по типу: доходы в Plaid — отрицательные суммы."""
+    if transaction_type == TransactionType.INCOME:
+        return {"amount": {"$lt": 0}}
+    if transaction_type == TransactionType.EXPENSE:
+        return {"amount": {"$gte": 0}}
+    return {}
 
-    if source_filter == "plaid":
-        base_query = BankTransaction.find(BankTransaction.user_id == user_id)
-        plaid_all = await base_query.sort("-date").to_list()
-
-        plaid_data_filtered = [
-            TransactionPublic(
-                id=txn.id if txn.id else PydanticObjectId(),
-                user_id=txn.user_id,
-                amount=Decimal(str(txn.amount)),
-                type=TransactionType.INCOME if txn.amount < 0 else TransactionType.EXPENSE,
-                category=", ".join(txn.category) if txn.category else None,
-                payment_method=txn.payment_method,
-                date=datetime.combine(txn.date, datetime.min.time(), tzinfo=UTC),
-                description=txn.name,
-                source="plaid",
-            ).model_dump()
-            for txn in plaid_all
-            if transaction_type is None
-            or ("income" if txn.amount < 0 else "expense") == transaction_type
+
+def date_range_filter(start: datetime | None, end: datetime | None) -> dict[str, datetime]:
+    date_range: dict[str, datetime] = {}
+    if start is not None:
+        date_range["$gte"] = start
+    if end is not None:
+        date_range["$lt"] = end
+    return date_range
+
+
+def plaid_date_filter(
+    start: datetime | None, end: datetime | None, zone: tzinfo = UTC
+) -> dict[str, Any]:
+    """
+    Фильтр Plaid-транзакций по окну [start, end). Даты без времени — календарные
+    дни (полночь UTC), поэтому для них окно переводим в локальные дни пользователя.
+    """
+    exact = date_range_filter(start, end)
+    if not exact:
+        return {}
+    by_day = date_range_filter(
+        day_label(first_day_from(start, zone)) if start is not None else None,
+        day_label(first_day_from(end, zone)) if end is not None else None,
+    )
+    return {
+        "$or": [
+            {"has_time": True, "date": exact},
+            {"has_time": {"$ne": True}, "date": by_day},
         ]
+    }
 
-        total = len(plaid_data_filtered)
-        paginated = plaid_data_filtered[offset : offset + limit]
 
-        return {
-            "items": paginated,
-            "total": total,
-            "limit": limit,
-            "offset": offset,
-            "has_next": offset + len(paginated) < total,
-        }
+async def get_category_totals(
+    user_id: PydanticObjectId,
+    transaction_type: TransactionType | None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    zone: tzinfo = UTC,
+) -> dict[str, Decimal]:
+    """
+    🏷️ Суммы по категориям за период [start, end) для ручных и Plaid транзакций
+    (без start — за всю историю, без типа — доходы и расходы вместе).
+    Фильтр по дате и $group выполняются в MongoDB (индекс (user_id, type, date)),
+    в Python возвращается только маленькая таблица категория -> сумма.
+    """
+    date_range = date_range_filter(start, end)
 
-    # If no source filter or both sources
-    manual = await Transaction.find(Transaction.user_id == user_id).to_list()
-    plaid = await BankTransaction.find(BankTransaction.user_id == user_id).to_list()
+    manual_match: dict[str, Any] = {"user_id": user_id}
+    plaid_match: dict[str, Any] = {
+        "user_id": user_id,
+        **plaid_type_filter(transaction_type),
+        **plaid_date_filter(start, end, zone),
+    }
+    if transaction_type is not None:
+        manual_match["type"] = transaction_type.value
+    if date_range:
+        manual_match["date"] = date_range
 
-    manual_data = [
-        TransactionPublic(**txn.model_dump(exclude_none=True)).model_dump() | {"source": "manual"}
-        for txn in manual
-        if transaction_type is None or txn.type == transaction_type
+    pipeline: list[dict[str, Any]] = [
+        {"$match": manual_match},
+        {"$project": {"category": 1, "amount_cents": AMOUNT_CENTS_EXPR}},
+        {
+            "$unionWith": {
+                "coll": BankTransaction.get_collection_name(),
+                "pipeline": [
+                    {"$match": plaid_match},
+                    {
+                        "$project": {
+                            "category": PLAID_CATEGORY_NAME,
+                            "amount_cents": {"$abs": AMOUNT_CENTS_EXPR},
+                        }
+                    },
+                ],
+            }
+        },
+        {"$match": {"category": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$category", "amount_cents": {"$sum": "$amount_cents"}}},
     ]
 
-    plaid_data = [
-        TransactionPublic(
-            id=txn.id if txn.id else PydanticObjectId(),
-            user_id=txn.user_id,
-            amount=Decimal(str(txn.amount)),
-            type=TransactionType.INCOME if txn.amount < 0 else TransactionType.EXPENSE,
-            category=", ".join(txn.category) if txn.category else None,
-            payment_method=txn.payment_method,
-            date=datetime.combine(txn.date, datetime.min.time(), tzinfo=UTC),
-            description=txn.name,
-            source="plaid",
-        ).model_dump()
-        for txn in plaid
-        if transaction_type is None
-        or ("income" if txn.amount < 0 else "expense") == transaction_type
+    rows = await Transaction.aggregate(pipeline).to_list()
+    return {row["_id"]: from_cents(row["amount_cents"]) for row in rows}
+
+
+async def get_period_totals(
+    user_id: PydanticObjectId,
+    timezone: str,
+    zone: tzinfo,
+    starts: dict[Period, date],
+    transaction_type: TransactionType | None = None,
+) -> dict[tuple[TransactionType, Period], int]:
+    """
+    📅 Центы по типу транзакции за текущие периоды (неделя / месяц / год).
+    Транзакции раскладывает по периодам MongoDB: сначала локальный день
+    транзакции, затем $dateTrunc по нему; starts — первые дни текущих периодов.
+    """
+    since = day_start(min(starts.values()), zone)
+    manual_match: dict[str, Any] = {"user_id": user_id, "date": {"$gte": since}}
+    if transaction_type is not None:
+        manual_match["type"] = transaction_type.value
+
+    # Локальные дни — даты как полночь UTC, поэтому $dateTrunc без timezone
+    buckets = {
+        period: {
+            "$dateTrunc": {
+                "date": "$day",
+                "unit": period,
+                **({"startOfWeek": "monday"} if period == "week" else {}),
+            }
+        }
+        for period in starts
+    }
+    pipeline: list[dict[str, Any]] = [
+        {"$match": manual_match},
+        {
+            "$project": {
+                "type": 1,
+                "day": local_day_expr(timezone),
+                "amount_cents": AMOUNT_CENTS_EXPR,
+            }
+        },
+        {
+            "$unionWith": {
+                "coll": BankTransaction.get_collection_name(),
+                "pipeline": [
+                    {
+                        "$match": {
+                            "user_id": user_id,
+                            **plaid_type_filter(transaction_type),
+                            **plaid_date_filter(since, None, zone),
+                        }
+                    },
+                    {
+                        "$project": {
+                            "type": PLAID_TRANSACTION_TYPE,
+                            "day": local_day_expr(plaid_timezone(timezone)),
+                            "amount_cents": {"$abs": AMOUNT_CENTS_EXPR},
+                        }
+                    },
+                ],
+            }
+        },
+        {
+            "$group": {
+                "_id": {"type": "$type", **buckets},
+                "amount_cents": {"$sum": "$amount_cents"},
+            }
+        },
     ]
 
-    all_txns = manual_data + plaid_data
-    # Конвертируем все даты в datetime перед сортировкой
-    all_txns.sort(key=lambda x: to_datetime(x["date"]), reverse=True)
-    total = len(all_txns)
-    paginated = all_txns[offset : offset + limit]
+    # Начала периодов MongoDB возвращает наивными датами (полночь UTC)
+    current = {
+        period: day_label(start).replace(tzinfo=None) for period, start in starts.items()
+    }
+    totals: dict[tuple[TransactionType, Period], int] = defaultdict(int)
+    for row in await Transaction.aggregate(pipeline).to_list():
+        key = row["_id"]
+        for period, start in current.items():
+            if key[period] == start:
+                totals[(TransactionType(key["type"]), period)] += row["amount_cents"]
+    return totals
 
-    return {
-        "items": paginated,
-        "total": total,
-        "limit": limit,
-        "offset": offset,
-        "has_next": offset + len(paginated) < total,
+
+async def get_payment_method_totals(
+    user_id: PydanticObjectId,
+    transaction_type: TransactionType | None = None,
+) -> list[tuple[str, Decimal]]:
+    """
+    💳 Суммы по способам оплаты для ручных и банковских транзакций одной агрегацией:
+    $match по (user_id, payment_method_id) в обеих коллекциях, $unionWith,
+    $group по ID метода и $lookup названия. Старые строки без payment_method_id
+    (до миграции) группируются по денормализованному названию — как
+    AMOUNT_CENTS_EXPR подставляет amount вместо amount_cents.
+    """
+    has_method: dict[str, Any] = {
+        "$or": [
+            {"payment_method_id": {"$ne": None}},
+            {"payment_method": {"$nin": [None, ""]}},
+        ]
+    }
+    manual_match: dict[str, Any] = {"user_id": user_id, **has_method}
+    if transaction_type:
+        manual_match["type"] = transaction_type.value
+
+    plaid_match: dict[str, Any] = {
+        "user_id": user_id,
+        **has_method,
+        **plaid_type_filter(transaction_type),
     }
 
+    method_key = {"$ifNull": ["$payment_method_id", "$payment_method"]}
+    pipeline: list[dict[str, Any]] = [
+        {"$match": manual_match},
+        {"$project": {"method": method_key, "amount_cents": AMOUNT_CENTS_EXPR}},
+        {
+            "$unionWith": {
+                "coll": BankTransaction.get_collection_name(),
+                "pipeline": [
+                    {"$match": plaid_match},
+                    {
+                        "$project": {
+                            "method": method_key,
+                            "amount_cents": {"$abs": AMOUNT_CENTS_EXPR},
+                        }
+                    },
+                ],
+            }
+        },
+        {"$group": {"_id": "$method", "amount_cents": {"$sum": "$amount_cents"}}},
+        {
+            "$lookup": {
+                "from": PaymentMethod.get_collection_name(),
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "method",
+            }
+        },
+        # Ключ-строка — это уже название; строки по ID и по названию одного
+        # метода сводим в одну
+        {
+            "$group": {
+                "_id": {"$ifNull": [{"$first": "$method.name"}, "$_id"]},
+                "amount_cents": {"$sum": "$amount_cents"},
+            }
+        },
+    ]
+
+    rows = await Transaction.aggregate(pipeline).to_list()
+    return [
+        (row["_id"], from_cents(row["amount_cents"]))
+        for row in rows
+        if isinstance(row["_id"], str) and row["_id"]
+    ]
 
-async def get_all_transactions_for_user(user_id: PydanticObjectId) -> list[dict[str, Any]]:
+
+async def get_transactions_in_window(
+    user_id: PydanticObjectId,
+    start: datetime,
+    end: datetime | None = None,
+    transaction_type: TransactionType | None = None,
+    zone: tzinfo = UTC,
+) -> list[dict[str, Any]]:
     """
-    Возвращает все транзакции пользователя без пагинации (нужно для аналитики).
+    🗓️ Транзакции пользователя (ручные + Plaid) за окно [start, end) для аналитики.
+    Диапазонные запросы по индексам (user_id, type, date) / (user_id, date),
+    поэтому стоимость зависит от размера окна, а не от возраста аккаунта.
+    Строки — из projection-моделей: суммы в центах, даты — aware в UTC.
     """
-    result = await get_paginated_transactions_for_user(user_id=user_id, limit=10_000_000)
-    return result["items"]
+    manual_filter: dict[str, Any] = {"user_id": user_id, "date": date_range_filter(start, end)}
+    if transaction_type is not None:
+        manual_filter["type"] = transaction_type.value
+    plaid_filter: dict[str, Any] = {
+        "user_id": user_id,
+        **plaid_type_filter(transaction_type),
+        **plaid_date_filter(start, end, zone),
+    }
+
+    manual = await Transaction.find(manual_filter, projection_model=TransactionAnalyticsRow).to_list()
+    plaid = await BankTransaction.find(
+        plaid_filter, projection_model=BankTransactionAnalyticsRow
+    ).to_list()
+
+    rows = [row.model_dump() for row in (*manual, *plaid)]
+    rows.sort(key=lambda row: row["date"], reverse=True)
+    return rows
+
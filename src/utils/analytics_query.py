@@ -0,0 +1,243 @@
+from datetime import datetime, time, tzinfo
+from decimal import Decimal
+from typing import Any
+
+from beanie import PydanticObjectId
+
+from src.models import BankTransaction, DailyTotal, Transaction, User
+from src.schemas.analytics_schemas import (
+    TIME_BUCKETS,
+    AnalyticsQuery,
+    AnalyticsQueryFilters,
+    AnalyticsQueryResponse,
+    AnalyticsQueryRow,
+)
+from src.schemas.projections import (
+    PLAID_CATEGORY_NAME,
+    PLAID_TRANSACTION_TYPE,
+    local_day_expr,
+    plaid_timezone,
+)
+from src.utils.analytics_helper import plaid_date_filter, plaid_type_filter, round_decimal
+from src.utils.calendar import day_label, day_start, get_zone, local_day
+from src.utils.daily_totals import daily_totals_ready
+from src.utils.money import AMOUNT_CENTS_EXPR, from_cents
+
+# ────────────── 🧮 Компиляция запроса в агрегацию ──────────────
+# Запрос /analytics/query превращается в один pipeline:
+# $match по индексам (user_id, [type | category], date) -> $project в общий
+# формат строки с локальным днём транзакции -> $group по измерениям (время —
+# $dateTrunc по локальному дню) -> $sort. Если запрос считается по суммам
+# по дням (daily_totals), берём их. Начала периодов в ответе — в поясе пользователя.
+
+MEASURE_EXPRS: dict[str, dict[str, Any]] = {
+    "sum": {"$sum": "$amount_cents"},
+    "count": {"$sum": 1},
+    "avg": {"$avg": "$amount_cents"},
+    "min": {"$min": "$amount_cents"},
+    "max": {"$max": "$amount_cents"},
+}
+
+
+def _date_range(filters: AnalyticsQueryFilters) -> dict[str, datetime]:
+    date_range: dict[str, datetime] = {}
+    if filters.start is not None:
+        date_range["$gte"] = filters.start
+    if filters.end is not None:
+        date_range["$lt"] = filters.end
+    return date_range
+
+
+def _dimension_expr(dimension: str) -> Any:
+    if dimension in TIME_BUCKETS:
+        # Локальные дни — даты как полночь UTC, поэтому $dateTrunc без timezone
+        trunc: dict[str, Any] = {"date": "$day", "unit": dimension}
+        if dimension == "week":
+            trunc["startOfWeek"] = "monday"
+        return {"$dateTrunc": trunc}
+    return f"${dimension}"
+
+
+def _group_stage(query: AnalyticsQuery, measures: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "$group": {
+            "_id": {d: _dimension_expr(d) for d in query.dimensions},
+            **measures,
+        }
+    }
+
+
+def _name_filters(filters: AnalyticsQueryFilters) -> dict[str, Any]:
+    match: dict[str, Any] = {}
+    if filters.categories:
+        match["category"] = {"$in": filters.categories}
+    if filters.payment_methods:
+        match["payment_method"] = {"$in": filters.payment_methods}
+    return match
+
+
+def build_transactions_pipeline(
+    user_id: PydanticObjectId, query: AnalyticsQuery, timezone: str
+) -> tuple[type[Transaction] | type[BankTransaction], list[dict[str, Any]]]:
+    """Pipeline по ручным и/или Plaid транзакциям и модель, от которой его запускать."""
+    filters = query.filters
+    zone = get_zone(timezone)
+    date_range = _date_range(filters)
+
+    # 🧾 Ручные транзакции: все фильтры — прямо в $match (индексы с user_id и date)
+    manual_match: dict[str, Any] = {"user_id": user_id, **_name_filters(filters)}
+    if date_range:
+        manual_match["date"] = date_range
+    if filters.type is not None:
+        manual_match["type"] = filters.type.value
+    manual: list[dict[str, Any]] = [
+        {"$match": manual_match},
+        {
+            "$project": {
+                "type": 1,
+                "category": 1,
+                "payment_method": 1,
+                "day": local_day_expr(timezone),
+                "source": {"$literal": "manual"},
+                "amount_cents": AMOUNT_CENTS_EXPR,
+            }
+        },
+    ]
+
+    # 🏦 Plaid: тип и категория вычисляются, поэтому фильтр по категории — после $project
+    plaid_match: dict[str, Any] = {
+        "user_id": user_id,
+        **plaid_type_filter(filters.type),
+        **plaid_date_filter(filters.start, filters.end, zone),
+    }
+    plaid: list[dict[str, Any]] = [
+        {"$match": plaid_match},
+        {
+            "$project": {
+                "type": PLAID_TRANSACTION_TYPE,
+                "category": PLAID_CATEGORY_NAME,
+                "payment_method": 1,
+                "day": local_day_expr(plaid_timezone(timezone)),
+                "source": {"$literal": "plaid"},
+                "amount_cents": {"$abs": AMOUNT_CENTS_EXPR},
+            }
+        },
+    ]
+    if filters.categories or filters.payment_methods:
+        plaid.append({"$match": _name_filters(filters)})
+
+    tail: list[dict[str, Any]] = [
+        _group_stage(query, {m: MEASURE_EXPRS[m] for m in query.measures}),
+        {"$sort": {f"_id.{d}": 1 for d in query.dimensions} or {"_id": 1}},
+        {"$limit": query.limit},
+    ]
+
+    if filters.source == "manual":
+        return Transaction, [*manual, *tail]
+    if filters.source == "plaid":
+        return BankTransaction, [*plaid, *tail]
+    return Transaction, [
+        *manual,
+        {"$unionWith": {"coll": BankTransaction.get_collection_name(), "pipeline": plaid}},
+        *tail,
+    ]
+
+
+# ────────────── 📈 Запросы по префиксным суммам ──────────────
+
+
+def _is_day_boundary(moment: datetime | None, zone: tzinfo) -> bool:
+    return moment is None or moment.astimezone(zone).time() == time.min
+
+
+def can_use_daily_totals(query: AnalyticsQuery, user: User) -> bool:
+    """
+    daily_totals хранят только сумму за локальный день по (type, category) —
+    подходят запросы с мерой sum, измерениями type/category/время
+    и границами периода по началу дня в поясе пользователя. И только если
+    суммы уже построены в этом поясе (иначе считаем по транзакциям).
+    """
+    filters = query.filters
+    zone = get_zone(user.timezone)
+    return (
+        daily_totals_ready(user)
+        and set(query.measures) == {"sum"}
+        and set(query.dimensions) <= {"type", "category", *TIME_BUCKETS}
+        and filters.source is None
+        and not filters.payment_methods
+        and _is_day_boundary(filters.start, zone)
+        and _is_day_boundary(filters.end, zone)
+    )
+
+
+def build_daily_totals_pipeline(
+    user_id: PydanticObjectId, query: AnalyticsQuery, zone: tzinfo
+) -> list[dict[str, Any]]:
+    filters = query.filters
+    match: dict[str, Any] = {"user_id": user_id}
+
+    # Строки по категориям нужны, если группируем или фильтруем по ним;
+    # иначе — строки «все категории» (category = None)
+    if filters.categories:
+        match["category"] = {"$in": filters.categories}
+    elif "category" in query.dimensions:
+        match["category"] = {"$ne": None}
+    else:
+        match["category"] = None
+
+    if filters.type is not None:
+        match["type"] = filters.type.value
+    # Границы периода -> ключи локальных дней
+    date_range = {
+        op: day_label(local_day(moment, zone)) for op, moment in _date_range(filters).items()
+    }
+    if date_range:
+        match["day"] = date_range
+
+    return [
+        {"$match": match},
+        _group_stage(query, {"sum": {"$sum": "$amount_cents"}}),
+        {"$sort": {f"_id.{d}": 1 for d in query.dimensions} or {"_id": 1}},
+        {"$limit": query.limit},
+    ]
+
+
+# ────────────── 🚀 Выполнение ──────────────
+
+
+def _to_row(doc: dict[str, Any], zone: tzinfo) -> AnalyticsQueryRow:
+    # Начало периода приходит локальным днём (дата как полночь UTC) -> полночь в поясе
+    keys = {
+        key: day_start(value.date(), zone) if isinstance(value, datetime) else value
+        for key, value in (doc.pop("_id") or {}).items()
+    }
+    values: dict[str, Any] = {}
+    for measure, value in doc.items():
+        if value is None:
+            continue
+        if measure == "count":
+            values[measure] = value
+        elif measure == "avg":
+            values[measure] = round_decimal(Decimal(str(value)).scaleb(-2))
+        else:
+            values[measure] = round_decimal(from_cents(value))
+    return AnalyticsQueryRow(keys=keys, **values)
+
+
+async def run_analytics_query(user: User, query: AnalyticsQuery) -> AnalyticsQueryResponse:
+    if user.id is None:
+        raise ValueError("User ID is missing")
+    zone = get_zone(user.timezone)
+
+    if can_use_daily_totals(query, user):
+        pipeline = build_daily_totals_pipeline(user.id, query, zone)
+        docs = await DailyTotal.aggregate(pipeline).to_list()
+        served_from = "daily_totals"
+    else:
+        model, pipeline = build_transactions_pipeline(user.id, query, user.timezone)
+        docs = await model.aggregate(pipeline).to_list()
+        served_from = "transactions"
+
+    return AnalyticsQueryResponse(
+        served_from=served_from, rows=[_to_row(doc, zone) for doc in docs]
+    )
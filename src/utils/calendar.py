@@ -0,0 +1,84 @@
+from datetime import UTC, date, datetime, time, timedelta, tzinfo
+from functools import cache
+from typing import Literal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# ────────────── 🗓️ Календарь пользователя ──────────────
+# Границы дня / недели / месяца / года считаются в часовом поясе пользователя
+# (User.timezone, IANA-имя вроде "America/Toronto") и переводятся в UTC
+# для запросов к MongoDB. Неделя начинается с понедельника.
+# Plaid-транзакции без времени (has_time не True) — уже календарные дни
+# пользователя: их дату в пояс не переводим.
+
+Period = Literal["day", "week", "month", "year"]
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+@cache
+def get_zone(name: str | None) -> tzinfo:
+    """ZoneInfo по IANA-имени; неизвестное или пустое имя — UTC."""
+    if not name:
+        return UTC
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return UTC
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        _ = ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def local_now(zone: tzinfo, now: datetime | None = None) -> datetime:
+    return (now or datetime.now(UTC)).astimezone(zone)
+
+
+def local_day(moment: datetime, zone: tzinfo) -> date:
+    """Календарный день момента в поясе пользователя (наивные datetime — UTC)."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return moment.astimezone(zone).date()
+
+
+def day_start(day: date, zone: tzinfo) -> datetime:
+    """Полночь дня в поясе пользователя."""
+    return datetime.combine(day, time.min, tzinfo=zone)
+
+
+def day_label(day: date) -> datetime:
+    """Ключ локального дня в MongoDB: дата пользователя как полночь UTC."""
+    return datetime.combine(day, time.min, tzinfo=UTC)
+
+
+def first_day_from(moment: datetime, zone: tzinfo) -> date:
+    """Первый локальный день, который начинается не раньше moment."""
+    day = local_day(moment, zone)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return day if day_start(day, zone) >= moment else day + timedelta(days=1)
+
+
+def period_start_day(period: Period, today: date) -> date:
+    if period == "week":
+        # Через timedelta, а не day - weekday(): иначе ломается на границе месяцев
+        return today - timedelta(days=today.weekday())
+    if period == "month":
+        return today.replace(day=1)
+    if period == "year":
+        return today.replace(month=1, day=1)
+    return today
+
+
+def period_start(period: Period, zone: tzinfo, now: datetime | None = None) -> datetime:
+    """Начало текущего периода в поясе пользователя (aware datetime)."""
+    today = local_now(zone, now).date()
+    return day_start(period_start_day(period, today), zone)
+
+
+def previous_month_start_day(today: date) -> date:
+    return (today.replace(day=1) - timedelta(days=1)).replace(day=1)
@@ -0,0 +1,119 @@
+from types import MappingProxyType
+
+from beanie import PydanticObjectId
+from pymongo.errors import DuplicateKeyError
+
+from src.models import Category
+from src.schemas.category_schemas import CategoryPublic
+from src.utils.normalization import normalize_name
+
+
+class DefaultCategories:
+    """
+    📂 Дефолтные категории (user_id = None), загруженные один раз при старте.
+
+    Они не меняются во время работы приложения, поэтому хранятся
+    в неизменяемых tuple/mapping и не запрашиваются из MongoDB на каждый запрос.
+    """
+
+    def __init__(self) -> None:
+        self.items: tuple[CategoryPublic, ...] = ()
+        self.by_name: MappingProxyType[str, CategoryPublic] = MappingProxyType({})
+        self.by_id: MappingProxyType[PydanticObjectId, CategoryPublic] = MappingProxyType({})
+
+    async def load(self) -> None:
+        categories = await Category.find({"user_id": None}).to_list()
+        self.items = tuple(CategoryPublic.model_validate(cat.model_dump()) for cat in categories)
+        self.by_name = MappingProxyType({normalize_name(cat.name): cat for cat in self.items})
+        self.by_id = MappingProxyType({cat.id: cat for cat in self.items})
+
+    def find(self, name: str) -> CategoryPublic | None:
+        return self.by_name.get(normalize_name(name))
+
+
+default_categories = DefaultCategories()
+
+
+async def get_user_category(
+    user_id: PydanticObjectId, category_id: PydanticObjectId
+) -> CategoryPublic | None:
+    """Дефолтная категория или кастомная категория этого пользователя по ID."""
+    default = default_categories.by_id.get(category_id)
+    if default is not None:
+        return default
+
+    category = await Category.get(category_id)
+    if category is None or category.user_id != user_id:
+        return None
+    return CategoryPublic.model_validate(category.model_dump())
+
+
+async def resolve_category(
+    user_id: PydanticObjectId,
+    category_id: PydanticObjectId | None,
+    name: str | None,
+) -> tuple[PydanticObjectId | None, str | None] | None:
+    """
+    Приводит категорию транзакции к паре (category_id, name).
+    - передан ID — имя берётся из категории (None, если категории нет у пользователя)
+    - передано только имя — ищем ID среди дефолтных и кастомных категорий;
+      неизвестное имя сохраняется как есть, без ID
+    """
+    if category_id is not None:
+        category = await get_user_category(user_id, category_id)
+        if category is None:
+            return None
+        return category.id, category.name
+
+    if not name:
+        return None, name
+
+    default = default_categories.find(name)
+    if default is not None:
+        return default.id, default.name
+
+    custom = await Category.find_one(
+        Category.user_id == user_id, Category.name_normalized == normalize_name(name)
+    )
+    if custom is not None:
+        return custom.id, custom.name
+
+    return None, name
+
+
+async def get_or_create_category(
+    user_id: PydanticObjectId,
+    name: str,
+    icon: str | None = None,
+    color: str | None = None,
+) -> Category:
+    """
+    Находит кастомную категорию пользователя по нормализованному имени
+    или создаёт новую. Параллельную вставку того же имени отсекает уникальный индекс.
+    """
+    name_normalized = normalize_name(name)
+    category = await Category.find_one(
+        Category.user_id == user_id, Category.name_normalized == name_normalized
+    )
+    if category:
+        return category
+
+    category = Category(
+        name=name.strip(),
+        user_id=user_id,
+        icon=icon,
+        color=color,
+        is_default=False,
+    )
+    try:
+        _ = await category.insert()
+    except DuplicateKeyError:
+        # 🏁 Другой запрос успел создать такую же категорию — берём её
+        existing = await Category.find_one(
+            Category.user_id == user_id, Category.name_normalized == name_normalized
+        )
+        if existing is None:
+            raise
+        return existing
+
+    return category
@@ -0,0 +1,220 @@
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from beanie import PydanticObjectId
+from beanie.operators import Inc, Set
+from pymongo import ReturnDocument
+
+from src.config import config
+from src.models import (
+    Budget,
+    Category,
+    CategoryJob,
+    CategoryJobKind,
+    CategoryJobStatus,
+    Transaction,
+)
+from src.utils.daily_totals import rebuild_daily_totals
+
+UNCATEGORIZED = "Uncategorized"
+
+# ────────────── 🔁 Каскады по категориям ──────────────
+# Задачу запускает BackgroundTasks запроса, но воркер может упасть или
+# перезапуститься посреди каскада. Поэтому задача держится арендой (lease):
+# после каждой пачки она продлевается, а задачу с истёкшей арендой
+# (или так и не начатую) подхватывает resume_category_jobs — при старте
+# приложения и командой python -m src.cli resume-category-jobs.
+
+LEASE = timedelta(minutes=5)  # Сколько воркер держит задачу без новых пачек
+
+
+async def create_category_job(
+    user_id: PydanticObjectId,
+    kind: CategoryJobKind,
+    source_category_ids: list[PydanticObjectId],
+    source_names: list[str],
+    target_category_id: PydanticObjectId | None,
+    target_name: str,
+) -> CategoryJob:
+    """Создаёт задачу каскада; запускается через run_category_job в фоне."""
+    job = CategoryJob(
+        user_id=user_id,
+        kind=kind,
+        source_category_ids=source_category_ids,
+        source_names=source_names,
+        target_category_id=target_category_id,
+        target_name=target_name,
+    )
+    _ = await job.insert()
+    return job
+
+
+def _pending_filter(job: CategoryJob, target_name: str, stale_names: set[str]) -> dict[str, Any]:
+    """
+    Транзакции, которые ещё ссылаются на исходные категории.
+    Уже перенесённые под фильтр не попадают, поэтому задачу можно
+    безопасно перезапустить с любого места.
+
+    Переименование трогает только строки со старым именем (stale_names):
+    две задачи подряд по одной категории (A→B, затем B→C) иначе
+    переписывали бы результат друг друга.
+    """
+    if job.kind == CategoryJobKind.RENAME:
+        category_match: dict[str, Any] = {"$in": sorted(stale_names - {target_name})}
+        source_match: list[dict[str, Any]] = [
+            {"category_id": {"$in": job.source_category_ids}, "category": category_match},
+        ]
+    else:
+        source_match = [{"category_id": {"$in": job.source_category_ids}}]
+    if job.source_names:
+        # Старые транзакции без category_id — по имени
+        source_match.append({"category_id": None, "category": {"$in": job.source_names}})
+
+    return {
+        "user_id": job.user_id,
+        "$or": source_match,
+        "$nor": [{"category_id": job.target_category_id, "category": target_name}],
+    }
+
+
+async def _current_target_name(job: CategoryJob) -> str:
+    """Имя целевой категории сейчас: её могли переименовать, пока задача ждала."""
+    if job.target_category_id is None:
+        return job.target_name
+    category = await Category.get(job.target_category_id)
+    return category.name if category is not None else job.target_name
+
+
+def _claimable_filter(now: datetime) -> dict[str, Any]:
+    """Задачи, которые можно забрать: ещё не начатые или брошенные упавшим воркером."""
+    return {
+        "$or": [
+            {"status": CategoryJobStatus.PENDING.value},
+            {
+                "status": CategoryJobStatus.RUNNING.value,
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+            },
+        ]
+    }
+
+
+async def claim_category_job(job_id: PydanticObjectId) -> CategoryJob | None:
+    """Атомарно берёт аренду на задачу; None — задачу уже выполняет кто-то другой."""
+    now = datetime.now(UTC)
+    doc = await CategoryJob.get_motor_collection().find_one_and_update(
+        {"_id": job_id, **_claimable_filter(now)},
+        {
+            "$set": {
+                "status": CategoryJobStatus.RUNNING.value,
+                "lease_until": now + LEASE,
+                "updated_at": now,
+            }
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    return CategoryJob.model_validate(doc) if doc else None
+
+
+async def run_category_job(job_id: PydanticObjectId) -> None:
+    """
+    🔁 Переносит транзакции пачками по CATEGORY_CASCADE_BATCH_SIZE:
+    каждая пачка — отдельный небольшой update_many по списку _id,
+    прогресс и аренда сохраняются в документе задачи.
+    """
+    # Забираем задачу атомарно, чтобы её не выполнили дважды
+    job = await claim_category_job(job_id)
+    if job is not None:
+        await _process_category_job(job)
+
+
+async def _process_category_job(job: CategoryJob) -> None:
+    collection = Transaction.get_motor_collection()
+    batch_size = config.CATEGORY_CASCADE_BATCH_SIZE
+    # Старые имена категории: исходные и те, что задача уже успела записать
+    # (если категорию переименовали ещё раз, пока задача шла)
+    stale_names = set(job.source_names)
+
+    try:
+        while True:
+            # Имя цели читаем перед каждой пачкой — пишем всегда актуальное
+            target_name = await _current_target_name(job)
+            pending = _pending_filter(job, target_name, stale_names)
+            batch = await collection.find(pending, {"_id": 1}).limit(batch_size).to_list(
+                batch_size
+            )
+            if not batch:
+                # Пустой проход засчитываем, только если имя за это время не сменилось
+                if await _current_target_name(job) == target_name:
+                    break
+                continue
+
+            # Фильтр повторяем в update: транзакцию, которую пользователь успел
+            # перенести в другую категорию после find, задача не трогает
+            ids = [doc["_id"] for doc in batch]
+            stale_names.add(target_name)
+            _ = await collection.update_many(
+                {"_id": {"$in": ids}, **pending},
+                {"$set": {"category_id": job.target_category_id, "category": target_name}},
+            )
+            now = datetime.now(UTC)
+            _ = await job.update(
+                Inc({CategoryJob.processed: len(ids)}),
+                Set({CategoryJob.updated_at: now, CategoryJob.lease_until: now + LEASE}),
+            )
+
+        # 🎯 Бюджеты ссылаются на категорию по имени — при переименовании
+        # переносим и их (их мало, поэтому одним запросом) на текущее имя
+        if job.kind == CategoryJobKind.RENAME:
+            stale_budget_names = sorted(stale_names - {target_name})
+            _ = await Budget.find(
+                Budget.user_id == job.user_id, {"category": {"$in": stale_budget_names}}
+            ).update_many(Set({Budget.category: target_name}))
+
+        # 📈 Суммы по дням ведутся по имени категории — пересчитываем
+        await rebuild_daily_totals(job.user_id)
+
+        _ = await job.update(
+            Set(
+                {
+                    CategoryJob.status: CategoryJobStatus.DONE,
+                    CategoryJob.lease_until: None,
+                    CategoryJob.updated_at: datetime.now(UTC),
+                }
+            )
+        )
+    except Exception as e:
+        _ = await job.update(
+            Set(
+                {
+                    CategoryJob.status: CategoryJobStatus.FAILED,
+                    CategoryJob.error: str(e),
+                    CategoryJob.lease_until: None,
+                    CategoryJob.updated_at: datetime.now(UTC),
+                }
+            )
+        )
+        raise
+
+
+async def resume_category_jobs() -> int:
+    """
+    ♻️ Доводит до конца задачи, брошенные упавшим или перезапущенным воркером
+    (и не начатые). Возвращает, сколько задач удалось забрать.
+    """
+    jobs = await CategoryJob.get_motor_collection().find(
+        _claimable_filter(datetime.now(UTC)), {"_id": 1}
+    ).sort("created_at", 1).to_list(None)
+
+    resumed = 0
+    for doc in jobs:
+        # Задачи, которые успел забрать другой воркер, пропускаем
+        job = await claim_category_job(doc["_id"])
+        if job is None:
+            continue
+        resumed += 1
+        try:
+            await _process_category_job(job)
+        except Exception:
+            # Ошибка уже записана в задачу (FAILED) — переходим к следующей
+            continue
+    return resumed
@@ -0,0 +1,493 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import UTC, date, datetime, timedelta, tzinfo
+from typing import Any
+
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from src.auth.user_cache import invalidate_user
+from src.models import BankTransaction, DailyTotal, Transaction, TransactionType, User
+from src.schemas.projections import (
+    PLAID_CATEGORY_NAME,
+    PLAID_TRANSACTION_TYPE,
+    local_day_expr,
+    plaid_timezone,
+)
+from src.utils.calendar import day_label, local_day
+from src.utils.money import AMOUNT_CENTS_EXPR, to_cents
+
+logger = logging.getLogger(__name__)
+
+# ────────────── 📈 Префиксные суммы по дням ──────────────
+# Для каждого ключа (user_id, type, category) храним по строке на день
+# с транзакциями: сумму за день и накопленную сумму по этот день.
+# category=None — строка «все категории» этого типа.
+# Дни — календарные дни в поясе пользователя (User.timezone); ключ дня —
+# его дата как полночь UTC, поэтому сравнивать их можно прямо по датам.
+#
+# Суммами можно пользоваться, только когда они построены в текущем поясе
+# пользователя (User.daily_totals_timezone == User.timezone): до первого
+# rebuild_daily_totals и после смены пояса чтения считаются по транзакциям.
+#
+# Запись транзакции (уже после изменения в MongoDB): $inc накопленной суммы
+# у дней начиная с её даты. Новая строка дня начинается с накопленной суммы
+# предыдущего дня — если за это время кто-то записал в более ранний день,
+# суммы могли разойтись, и через REBUILD_DELAY пересчитываем всё из транзакций.
+#
+# Пересчёт держит аренду (User.daily_totals_rebuild_until) и на это время
+# снимает готовность сумм — чтения идут по транзакциям. Запись во время
+# пересчёта не трогает суммы, а помечает пользователя (daily_totals_dirty):
+# пересчёт увидит пометку и пройдёт ещё раз. Если пересчёт начался, пока
+# запись шла (сменился daily_totals_generation), её $inc мог попасть в уже
+# пересчитанные суммы — снимаем готовность и пересчитываем снова.
+
+REBUILD_DELAY = 5.0  # Секунд: ждём, пока закончатся соседние записи пользователя
+REBUILD_LEASE = timedelta(minutes=10)  # Дольше пересчёт пользователя не длится
+MAX_REBUILD_PASSES = 3  # Сколько раз подряд пересчитывать, если мешают записи
+
+_scheduled_rebuilds: set[PydanticObjectId] = set()
+_rebuild_tasks: set[asyncio.Task[None]] = set()
+
+
+_FIRST_DAY = datetime.min.replace(tzinfo=UTC)
+_LAST_DAY = datetime.max.replace(tzinfo=UTC)
+
+
+def _shift_day(day: datetime, days: int) -> datetime:
+    """day ± days, прижатый к границам дат (окно для start=0001-01-01 не роняет запрос)."""
+    try:
+        return day + timedelta(days=days)
+    except OverflowError:
+        return _FIRST_DAY if days < 0 else _LAST_DAY
+
+
+def daily_totals_ready(user: User) -> bool:
+    """Построены ли суммы по дням в текущем поясе пользователя."""
+    return user.daily_totals_timezone == user.timezone
+
+
+def _keys(category: str | None) -> list[str | None]:
+    # Без категории транзакция попадает только в строку «все категории»
+    return [category, None] if category else [None]
+
+
+async def _apply_key_delta(match: dict[str, Any], day: datetime, delta_cents: int) -> bool:
+    """Одна строка (type, category): возвращает True, если суммы могли разойтись."""
+    collection = DailyTotal.get_motor_collection()
+    before = await _cumulative_until_match(match, day, inclusive=False)
+
+    # Строка дня появляется с накопленной суммой предыдущего дня
+    result = await collection.update_one(
+        {**match, "day": day},
+        {"$inc": {"amount_cents": delta_cents}, "$setOnInsert": {"cumulative_cents": before}},
+        upsert=True,
+    )
+    _ = await collection.update_many(
+        {**match, "day": {"$gte": day}}, {"$inc": {"cumulative_cents": delta_cents}}
+    )
+
+    # Гонка возможна только при создании строки: сверяем, не изменились ли
+    # ранние дни, пока мы читали их сумму
+    if result.upserted_id is None:
+        return False
+    return await _cumulative_until_match(match, day, inclusive=False) != before
+
+
+def _as_utc(value: datetime) -> datetime:
+    # MongoDB отдаёт наивные даты в UTC
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value
+
+
+async def _rebuild_state(user_id: PydanticObjectId) -> dict[str, Any] | None:
+    return await User.get_motor_collection().find_one(
+        {"_id": user_id},
+        {
+            "timezone": 1,
+            "daily_totals_timezone": 1,
+            "daily_totals_generation": 1,
+            "daily_totals_rebuild_until": 1,
+        },
+    )
+
+
+def _is_rebuilding(state: dict[str, Any]) -> bool:
+    until = state.get("daily_totals_rebuild_until")
+    return until is not None and _as_utc(until) > datetime.now(UTC)
+
+
+async def _discard_totals(user_id: PydanticObjectId) -> None:
+    """Суммам больше нельзя верить: чтения — по транзакциям, пересчёт — в фоне."""
+    _ = await User.get_motor_collection().update_one(
+        {"_id": user_id},
+        {"$set": {"daily_totals_timezone": None, "daily_totals_dirty": True}},
+    )
+    await invalidate_user(user_id)
+    schedule_rebuild(user_id)
+
+
+async def apply_daily_delta(
+    user_id: PydanticObjectId,
+    transaction_type: TransactionType,
+    category: str | None,
+    moment: datetime,
+    delta_cents: int,
+    zone: tzinfo,
+) -> None:
+    """Добавляет delta_cents в локальный день moment (для удаления — отрицательная delta)."""
+    if delta_cents == 0:
+        return
+
+    state = await _rebuild_state(user_id)
+    if state is None:
+        return
+    if _is_rebuilding(state):
+        # ⏳ Идёт пересчёт: он пройдёт ещё раз и учтёт эту запись сам
+        _ = await User.get_motor_collection().update_one(
+            {"_id": user_id}, {"$set": {"daily_totals_dirty": True}}
+        )
+        return
+    if state.get("daily_totals_timezone") != state.get("timezone", "UTC"):
+        # Суммы не построены (или построены в старом поясе) — строим в фоне
+        schedule_rebuild(user_id)
+        return
+
+    day = day_label(local_day(moment, zone))
+    drifted = await asyncio.gather(
+        *(
+            _apply_key_delta(
+                {"user_id": user_id, "type": transaction_type.value, "category": key},
+                day,
+                delta_cents,
+            )
+            for key in _keys(category)
+        )
+    )
+
+    after = await _rebuild_state(user_id)
+    restarted = after is None or after.get("daily_totals_generation") != state.get(
+        "daily_totals_generation"
+    )
+    if any(drifted) or restarted:
+        await _discard_totals(user_id)
+
+
+async def record_transaction(transaction: Transaction, zone: tzinfo, *, sign: int = 1) -> None:
+    """Учитывает ручную транзакцию (sign=-1 — убирает её, перед изменением или удалением)."""
+    await apply_daily_delta(
+        transaction.user_id,
+        transaction.type,
+        transaction.category or None,
+        transaction.date,
+        sign * to_cents(transaction.amount),
+        zone,
+    )
+
+
+def schedule_rebuild(user_id: PydanticObjectId) -> None:
+    """Пересчитывает суммы пользователя через REBUILD_DELAY (не чаще одного раза за раз)."""
+    if user_id in _scheduled_rebuilds:
+        return
+    _scheduled_rebuilds.add(user_id)
+
+    async def rebuild() -> None:
+        try:
+            await asyncio.sleep(REBUILD_DELAY)
+            await rebuild_daily_totals(user_id)
+        except Exception:
+            logger.exception("Daily totals rebuild failed for user %s", user_id)
+        finally:
+            _scheduled_rebuilds.discard(user_id)
+
+    task = asyncio.create_task(rebuild())
+    _rebuild_tasks.add(task)
+    task.add_done_callback(_rebuild_tasks.discard)
+
+
+# ────────────── 🔎 Чтение ──────────────
+
+
+async def _cumulative_until_match(
+    match: dict[str, Any], day: datetime, *, inclusive: bool = True
+) -> int:
+    """
+    Накопленная сумма на последний день <= day (< day при inclusive=False;
+    0, если раньше транзакций не было).
+    """
+    row = await DailyTotal.get_motor_collection().find_one(
+        {**match, "day": {"$lte" if inclusive else "$lt": day}},
+        {"cumulative_cents": 1},
+        sort=[("day", -1)],
+    )
+    return row["cumulative_cents"] if row else 0
+
+
+async def _cumulative_until(
+    user_id: PydanticObjectId,
+    transaction_type: TransactionType,
+    category: str | None,
+    day: datetime,
+    *,
+    inclusive: bool = True,
+) -> int:
+    return await _cumulative_until_match(
+        {"user_id": user_id, "type": transaction_type.value, "category": category},
+        day,
+        inclusive=inclusive,
+    )
+
+
+async def _totals_from_transactions(
+    user: User, start: date, end: date | None
+) -> dict[tuple[str, str | None], int]:
+    """
+    Запасной путь, пока суммы не построены: центы за локальные дни [start, end]
+    по (type, category) прямо из транзакций, одной агрегацией.
+    """
+    # Окно по date с запасом в сутки с каждой стороны покрывает любой пояс,
+    # точная граница — по локальному дню после $project
+    date_range: dict[str, datetime] = {"$gte": _shift_day(day_label(start), -1)}
+    day_range: dict[str, datetime] = {"$gte": day_label(start)}
+    if end is not None:
+        date_range["$lt"] = _shift_day(day_label(end), 2)
+        day_range["$lte"] = day_label(end)
+
+    pipeline = [
+        *_local_days_pipeline(user.id, user.timezone, {"date": date_range}),
+        {"$match": {"day": day_range}},
+        {
+            "$group": {
+                "_id": {"type": "$type", "category": "$category"},
+                "amount_cents": {"$sum": "$amount_cents"},
+            }
+        },
+    ]
+    totals: dict[tuple[str, str | None], int] = defaultdict(int)
+    for row in await Transaction.aggregate(pipeline).to_list():
+        key = row["_id"]
+        for category in _keys(key["category"] or None):
+            totals[(key["type"], category)] += row["amount_cents"]
+    return totals
+
+
+async def get_range_cents(
+    user: User,
+    transaction_type: TransactionType,
+    start: date,
+    end: date | None = None,
+    category: str | None = None,
+) -> int:
+    """
+    Сумма за локальные дни [start, end] включительно (end=None — без верхней границы).
+    """
+    if not daily_totals_ready(user):
+        totals = await _totals_from_transactions(user, start, end)
+        return totals.get((transaction_type.value, category), 0)
+
+    end_day = day_label(end) if end is not None else _LAST_DAY
+    total, before = await asyncio.gather(
+        _cumulative_until(user.id, transaction_type, category, end_day),
+        # Всё до start (строго раньше: start=0001-01-01 не сдвигаем за границу дат)
+        _cumulative_until(user.id, transaction_type, category, day_label(start), inclusive=False),
+    )
+    return total - before
+
+
+async def sum_range_cents(
+    user: User,
+    transaction_types: list[TransactionType],
+    start: date,
+    end: date | None = None,
+) -> int:
+    """Сумма за [start, end] по нескольким типам транзакций (все категории)."""
+    if not daily_totals_ready(user):
+        by_key = await _totals_from_transactions(user, start, end)
+        return sum(by_key.get((t.value, None), 0) for t in transaction_types)
+
+    totals = await asyncio.gather(
+        *(get_range_cents(user, t, start, end) for t in transaction_types)
+    )
+    return sum(totals)
+
+
+async def get_range_cents_by_category(
+    user: User,
+    transaction_type: TransactionType,
+    start: date,
+    end: date | None = None,
+) -> dict[str, int]:
+    """Суммы по категориям за [start, end]: одна агрегация по строкам дней."""
+    if not daily_totals_ready(user):
+        totals = await _totals_from_transactions(user, start, end)
+        return {
+            category: cents
+            for (kind, category), cents in totals.items()
+            if kind == transaction_type.value and category is not None and cents
+        }
+
+    day_range: dict[str, datetime] = {"$gte": day_label(start)}
+    if end is not None:
+        day_range["$lte"] = day_label(end)
+    rows = await DailyTotal.aggregate(
+        [
+            {
+                "$match": {
+                    "user_id": user.id,
+                    "type": transaction_type.value,
+                    "category": {"$ne": None},
+                    "day": day_range,
+                }
+            },
+            {"$group": {"_id": "$category", "amount_cents": {"$sum": "$amount_cents"}}},
+        ]
+    ).to_list()
+    return {row["_id"]: row["amount_cents"] for row in rows if row["amount_cents"]}
+
+
+# ────────────── 🔁 Пересчёт ──────────────
+
+
+def _local_days_pipeline(
+    user_id: PydanticObjectId | None, timezone: str, match: dict[str, Any] | None = None
+) -> list[dict[str, Any]]:
+    """Ручные + Plaid транзакции пользователя в виде (type, category, day, amount_cents)."""
+    match = {"user_id": user_id, **(match or {})}
+    return [
+        {"$match": match},
+        {
+            "$project": {
+                "type": 1,
+                "category": 1,
+                "amount_cents": AMOUNT_CENTS_EXPR,
+                "day": local_day_expr(timezone),
+            }
+        },
+        {
+            "$unionWith": {
+                "coll": BankTransaction.get_collection_name(),
+                "pipeline": [
+                    {"$match": match},
+                    {
+                        "$project": {
+                            "type": PLAID_TRANSACTION_TYPE,
+                            "category": PLAID_CATEGORY_NAME,
+                            "amount_cents": {"$abs": AMOUNT_CENTS_EXPR},
+                            "day": local_day_expr(plaid_timezone(timezone)),
+                        }
+                    },
+                ],
+            }
+        },
+    ]
+
+
+async def _compute_daily_totals(user_id: PydanticObjectId, timezone: str) -> list[DailyTotal]:
+    """Строки сумм по дням пользователя, посчитанные из ручных и Plaid транзакций."""
+    pipeline: list[dict[str, Any]] = [
+        *_local_days_pipeline(user_id, timezone),
+        {
+            "$group": {
+                "_id": {"type": "$type", "category": "$category", "day": "$day"},
+                "amount_cents": {"$sum": "$amount_cents"},
+            }
+        },
+    ]
+    rows = await Transaction.aggregate(pipeline).to_list()
+
+    # (type, category) -> day -> центы за день
+    daily: dict[tuple[str, str | None], dict[datetime, int]] = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        key = row["_id"]
+        for category in _keys(key["category"] or None):
+            day = day_label(key["day"].date())
+            daily[(key["type"], category)][day] += row["amount_cents"]
+
+    totals: list[DailyTotal] = []
+    for (transaction_type, category), by_day in daily.items():
+        cumulative = 0
+        for day in sorted(by_day):
+            cumulative += by_day[day]
+            totals.append(
+                DailyTotal(
+                    user_id=user_id,
+                    type=TransactionType(transaction_type),
+                    category=category,
+                    day=day,
+                    amount_cents=by_day[day],
+                    cumulative_cents=cumulative,
+                )
+            )
+    return totals
+
+
+async def rebuild_daily_totals(user_id: PydanticObjectId) -> None:
+    """
+    Пересчитывает префиксные суммы пользователя из ручных и Plaid транзакций
+    (дни — в текущем поясе пользователя). Пока пересчёт идёт, суммы не готовы
+    и чтения идут по транзакциям.
+    """
+    users = User.get_motor_collection()
+
+    for _attempt in range(MAX_REBUILD_PASSES):
+        # 🔒 Новое поколение + аренда; готовность снимаем до удаления строк
+        state = await users.find_one_and_update(
+            {"_id": user_id},
+            {
+                "$inc": {"daily_totals_generation": 1},
+                "$set": {
+                    "daily_totals_timezone": None,
+                    "daily_totals_dirty": False,
+                    "daily_totals_rebuild_until": datetime.now(UTC) + REBUILD_LEASE,
+                },
+            },
+            projection={"timezone": 1, "daily_totals_generation": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if state is None:
+            # Пользователя уже нет
+            _ = await DailyTotal.find(DailyTotal.user_id == user_id).delete()
+            return
+        await invalidate_user(user_id)
+
+        generation = state["daily_totals_generation"]
+        timezone = state.get("timezone", "UTC")
+        totals = await _compute_daily_totals(user_id, timezone)
+
+        _ = await DailyTotal.find(DailyTotal.user_id == user_id).delete()
+        collided = False
+        if totals:
+            try:
+                _ = await DailyTotal.insert_many(totals, ordered=False)
+            except BulkWriteError:
+                # Запись успела создать строку дня между удалением и вставкой
+                collided = True
+
+        if not collided:
+            # ✅ Готово, если за это время не было записей и другого пересчёта
+            result = await users.update_one(
+                {
+                    "_id": user_id,
+                    "daily_totals_generation": generation,
+                    "daily_totals_dirty": False,
+                },
+                {"$set": {"daily_totals_timezone": timezone, "daily_totals_rebuild_until": None}},
+            )
+            if result.modified_count:
+                await invalidate_user(user_id)
+                return
+
+        current = await _rebuild_state(user_id)
+        if current is None or current.get("daily_totals_generation") != generation:
+            # Начался более поздний пересчёт — он и доведёт суммы до конца
+            return
+
+    # Записи не дают закончить — отпускаем аренду: следующая запись или
+    # отложенный пересчёт попробуют снова, а пока чтения идут по транзакциям
+    logger.warning("Daily totals rebuild for user %s kept colliding with writes", user_id)
+    _ = await users.update_one(
+        {"_id": user_id, "daily_totals_generation": generation},
+        {"$set": {"daily_totals_rebuild_until": None}},
+    )
+    schedule_rebuild(user_id)
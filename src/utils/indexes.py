@@ -0,0 +1,55 @@
+from dataclasses import dataclass, field
+
+from beanie import Document
+from beanie.odm.settings.document import IndexModelField
+
+
+@dataclass
+class IndexDiff:
+    """Разница между индексами из Settings.indexes и индексами в коллекции."""
+
+    collection: str
+    missing: list[IndexModelField] = field(default_factory=list)  # Объявлены, но нет в базе
+    conflicting: list[IndexModelField] = field(default_factory=list)  # Те же поля, другие опции
+    extra: list[IndexModelField] = field(default_factory=list)  # Есть в базе, но не объявлены
+
+
+def declared_indexes(model: type[Document]) -> list[IndexModelField]:
+    """
+    Индексы из Settings.indexes модели (после init_beanie они уже
+    приведены к IndexModelField — и строки, и кортежи, и IndexModel).
+    """
+    return IndexModelField.merge_indexes([], model.get_settings().indexes or [])
+
+
+async def diff_indexes(model: type[Document]) -> IndexDiff:
+    collection = model.get_motor_collection()
+    live = IndexModelField.from_motor_index_information(await collection.index_information())
+    declared = declared_indexes(model)
+
+    diff = IndexDiff(collection=collection.name)
+    for index in declared:
+        if index in live:
+            continue
+        # Индекс с теми же полями, но другими опциями createIndexes не заменит —
+        # такой случай нужно разбирать вручную (drop + create)
+        if IndexModelField.find_index_with_the_same_fields(live, index) is not None:
+            diff.conflicting.append(index)
+        else:
+            diff.missing.append(index)
+
+    diff.extra = [
+        index
+        for index in live
+        if IndexModelField.find_index_with_the_same_fields(declared, index) is None
+    ]
+    return diff
+
+
+async def create_missing_indexes(diff: IndexDiff, model: type[Document]) -> list[str]:
+    """Создаёт недостающие индексы; возвращает их имена."""
+    if not diff.missing:
+        return []
+    return await model.get_motor_collection().create_indexes(
+        IndexModelField.list_to_index_model(diff.missing)
+    )
@@ -0,0 +1,19 @@
+from collections.abc import Callable
+from typing import Any
+
+# ────────────── 📈 Реестр метрик процесса ──────────────
+# Каждый компонент (кэши, пулы) регистрирует функцию, которая отдаёт свои счётчики.
+
+MetricsProvider = Callable[[], dict[str, Any]]
+
+_providers: dict[str, MetricsProvider] = {}
+
+
+def register_metrics(name: str, provider: MetricsProvider) -> None:
+    """Регистрирует источник метрик под именем секции."""
+    _providers[name] = provider
+
+
+def collect_metrics() -> dict[str, dict[str, Any]]:
+    """Собирает текущие значения всех зарегистрированных метрик."""
+    return {name: provider() for name, provider in _providers.items()}
@@ -0,0 +1,366 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from src.models import (
+    BankTransaction,
+    Category,
+    MigrationState,
+    MigrationStatus,
+    PaymentMethod,
+    Transaction,
+    User,
+)
+from src.utils.categories import resolve_category
+from src.utils.daily_totals import rebuild_daily_totals
+from src.utils.money import to_cents
+from src.utils.normalization import normalize_name
+from src.utils.payment_methods import resolve_payment_method
+
+# ────────────── 🧳 Миграции данных ──────────────
+# Миграция проходит коллекцию пачками по возрастанию _id и пишет изменения
+# одним bulk_write на пачку. После каждой пачки last_id сохраняется
+# в коллекции migrations — после падения продолжаем с того же места.
+#
+# Миграции идут параллельно с живым трафиком, поэтому:
+# - каждая операция повторяет условие выборки в фильтре (например,
+#   amount_cents: None) и не перетирает то, что успел записать запрос;
+# - код приложения до конца миграции читает и старый, и новый формат
+#   (например, AMOUNT_CENTS_EXPR вычисляет центы, если поля ещё нет).
+
+Plan = Callable[[list[dict[str, Any]]], Awaitable[list[UpdateOne]]]
+
+LEASE = timedelta(minutes=5)  # Сколько процесс держит миграцию без новых чекпоинтов
+DUPLICATE_KEY = 11000
+
+
+class MigrationLockedError(Exception):
+    """Миграцию прямо сейчас выполняет другой процесс."""
+
+
+@dataclass(frozen=True)
+class Migration:
+    name: str
+    model: type[Document]
+    query: dict[str, Any]  # Документы, которые ещё нужно мигрировать
+    projection: dict[str, Any]  # Поля, которые нужны plan
+    plan: Plan  # Пачка документов -> операции UpdateOne
+
+
+MIGRATIONS: dict[str, Migration] = {}
+
+
+def migration(
+    name: str, model: type[Document], query: dict[str, Any], projection: dict[str, Any]
+) -> Callable[[Plan], Plan]:
+    """Регистрирует функцию-план как миграцию (порядок регистрации = порядок запуска)."""
+
+    def register(plan: Plan) -> Plan:
+        MIGRATIONS[name] = Migration(name, model, query, projection, plan)
+        return plan
+
+    return register
+
+
+# ────────────── 🏃 Запуск ──────────────
+
+
+async def claim_migration(name: str, *, restart: bool = False) -> MigrationState:
+    """
+    Берёт аренду (lease) на миграцию. Если аренда другого процесса
+    ещё не истекла — MigrationLockedError. restart=True начинает с начала.
+    """
+    now = datetime.now(UTC)
+    changes: dict[str, Any] = {"lease_until": now + LEASE, "updated_at": now}
+    if restart:
+        changes |= {
+            "status": MigrationStatus.RUNNING.value,
+            "last_id": None,
+            "processed": 0,
+            "modified": 0,
+            "skipped": 0,
+            "error": None,
+            "started_at": now,
+            "finished_at": None,
+        }
+
+    try:
+        doc = await MigrationState.get_motor_collection().find_one_and_update(
+            {"name": name, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {
+                "$set": changes,
+                "$setOnInsert": {
+                    key: value
+                    for key, value in MigrationState(name=name).model_dump(exclude={"id"}).items()
+                    if key not in changes
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError as e:
+        # Документ есть, но аренда активна — upsert упёрся в уникальный индекс по name
+        raise MigrationLockedError(name) from e
+
+    return MigrationState.model_validate(doc)
+
+
+async def write_batch(collection: Any, ops: list[UpdateOne]) -> tuple[int, int]:
+    """bulk_write без порядка; дубли ключей пропускаем. Возвращает (изменено, пропущено)."""
+    try:
+        result = await collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        return e.details.get("nModified", 0), len(errors)
+    return result.modified_count, 0
+
+
+async def run_migration(
+    migration: Migration,
+    *,
+    batch_size: int,
+    ops_per_second: float,
+    restart: bool = False,
+) -> MigrationState:
+    state = await claim_migration(migration.name, restart=restart)
+    if state.status == MigrationStatus.DONE:
+        state.lease_until = None
+        _ = await state.save()
+        return state
+
+    state.status = MigrationStatus.RUNNING
+    state.error = None
+    collection = migration.model.get_motor_collection()
+    min_batch_seconds = batch_size / ops_per_second if ops_per_second > 0 else 0.0
+
+    try:
+        while True:
+            started = time.monotonic()
+
+            query = dict(migration.query)
+            if state.last_id is not None:
+                query["_id"] = {"$gt": state.last_id}
+            docs = (
+                await collection.find(query, migration.projection)
+                .sort("_id", ASCENDING)
+                .limit(batch_size)
+                .to_list(None)
+            )
+            if not docs:
+                break
+
+            ops = await migration.plan(docs)
+            if ops:
+                modified, skipped = await write_batch(collection, ops)
+                state.modified += modified
+                state.skipped += skipped
+
+            # ✅ Чекпоинт (и продление аренды)
+            now = datetime.now(UTC)
+            state.last_id = docs[-1]["_id"]
+            state.processed += len(docs)
+            state.updated_at = now
+            state.lease_until = now + LEASE
+            _ = await state.save()
+
+            # ⏱️ Не больше ops_per_second документов в секунду
+            elapsed = time.monotonic() - started
+            if elapsed < min_batch_seconds:
+                await asyncio.sleep(min_batch_seconds - elapsed)
+
+    except Exception as e:
+        state.status = MigrationStatus.FAILED
+        state.error = str(e)
+        state.lease_until = None
+        _ = await state.save()
+        raise
+
+    state.status = MigrationStatus.DONE
+    state.finished_at = datetime.now(UTC)
+    state.lease_until = None
+    _ = await state.save()
+    return state
+
+
+# ────────────── 💵 amount_cents ──────────────
+
+
+async def plan_amount_cents(docs: list[dict[str, Any]]) -> list[UpdateOne]:
+    return [
+        UpdateOne(
+            {"_id": doc["_id"], "amount_cents": None},
+            {"$set": {"amount_cents": to_cents(doc["amount"])}},
+        )
+        for doc in docs
+        if doc.get("amount") is not None
+    ]
+
+
+_ = migration(
+    "transactions-amount-cents",
+    Transaction,
+    query={"amount_cents": None},
+    projection={"amount": 1},
+)(plan_amount_cents)
+
+_ = migration(
+    "bank-transactions-amount-cents",
+    BankTransaction,
+    query={"amount_cents": None},
+    projection={"amount": 1},
+)(plan_amount_cents)
+
+
+# ────────────── 🔤 name_normalized ──────────────
+
+
+async def plan_name_normalized(docs: list[dict[str, Any]]) -> list[UpdateOne]:
+    # Дубль имени у пользователя уникальный индекс отклонит —
+    # такой документ остаётся без name_normalized (попадёт в skipped)
+    return [
+        UpdateOne(
+            {"_id": doc["_id"], "name": doc["name"], "name_normalized": None},
+            {"$set": {"name_normalized": normalize_name(doc["name"])}},
+        )
+        for doc in docs
+        if doc.get("name")
+    ]
+
+
+_ = migration(
+    "categories-name-normalized",
+    Category,
+    query={"name_normalized": None},
+    projection={"name": 1},
+)(plan_name_normalized)
+
+_ = migration(
+    "payment-methods-name-normalized",
+    PaymentMethod,
+    query={"name_normalized": None},
+    projection={"name": 1},
+)(plan_name_normalized)
+
+
+# ────────────── 🏷️ category_id ──────────────
+
+
+@migration(
+    "transactions-category-id",
+    Transaction,
+    query={"category_id": None, "category": {"$nin": [None, ""]}},
+    projection={"user_id": 1, "category": 1},
+)
+async def plan_category_id(docs: list[dict[str, Any]]) -> list[UpdateOne]:
+    """
+    ID категории по имени (дефолтные + кастомные категории пользователя).
+    Неизвестные имена оставляем без ID — их по-прежнему читаем по имени.
+    """
+    resolved: dict[tuple[PydanticObjectId, str], PydanticObjectId | None] = {}
+    ops: list[UpdateOne] = []
+
+    for doc in docs:
+        key = (doc["user_id"], normalize_name(doc["category"]))
+        if key not in resolved:
+            result = await resolve_category(doc["user_id"], None, doc["category"])
+            resolved[key] = result[0] if result else None
+
+        category_id = resolved[key]
+        if category_id is not None:
+            ops.append(
+                UpdateOne(
+                    {"_id": doc["_id"], "category_id": None, "category": doc["category"]},
+                    {"$set": {"category_id": category_id}},
+                )
+            )
+
+    return ops
+
+
+# ────────────── 💳 payment_method_id ──────────────
+
+
+async def plan_payment_method_id(docs: list[dict[str, Any]]) -> list[UpdateOne]:
+    """ID способа оплаты по имени; неизвестные имена оставляем без ID."""
+    resolved: dict[tuple[PydanticObjectId, str], PydanticObjectId | None] = {}
+    ops: list[UpdateOne] = []
+
+    for doc in docs:
+        key = (doc["user_id"], normalize_name(doc["payment_method"]))
+        if key not in resolved:
+            result = await resolve_payment_method(doc["user_id"], None, doc["payment_method"])
+            resolved[key] = result[0] if result else None
+
+        payment_method_id = resolved[key]
+        if payment_method_id is not None:
+            ops.append(
+                UpdateOne(
+                    {
+                        "_id": doc["_id"],
+                        "payment_method_id": None,
+                        "payment_method": doc["payment_method"],
+                    },
+                    {"$set": {"payment_method_id": payment_method_id}},
+                )
+            )
+
+    return ops
+
+
+_ = migration(
+    "transactions-payment-method-id",
+    Transaction,
+    query={"payment_method_id": None, "payment_method": {"$nin": [None, ""]}},
+    projection={"user_id": 1, "payment_method": 1},
+)(plan_payment_method_id)
+
+_ = migration(
+    "bank-transactions-payment-method-id",
+    BankTransaction,
+    query={"payment_method_id": None, "payment_method": {"$nin": [None, ""]}},
+    projection={"user_id": 1, "payment_method": 1},
+)(plan_payment_method_id)
+
+
+# ────────────── 🗓️ Дата Plaid-транзакций ──────────────
+
+
+@migration(
+    "bank-transactions-date-datetime",
+    BankTransaction,
+    query={"date": {"$type": "string"}},
+    projection={"date": 1},
+)
+async def plan_bank_transaction_date(docs: list[dict[str, Any]]) -> list[UpdateOne]:
+    """
+    Даты, записанные строкой ("2024-05-01"), -> BSON datetime в UTC,
+    чтобы они попадали в диапазонные запросы по индексу (user_id, date).
+    """
+    ops: list[UpdateOne] = []
+    for doc in docs:
+        parsed = datetime.fromisoformat(doc["date"])  # "2024-05-01" -> полночь
+        moment = parsed.replace(tzinfo=UTC) if parsed.tzinfo is None else parsed.astimezone(UTC)
+        ops.append(
+            UpdateOne({"_id": doc["_id"], "date": doc["date"]}, {"$set": {"date": moment}})
+        )
+    return ops
+
+
+# ────────────── 📈 Суммы по дням ──────────────
+
+
+@migration("daily-totals", User, query={}, projection={"_id": 1})
+async def plan_daily_totals(docs: list[dict[str, Any]]) -> list[UpdateOne]:
+    """Строит префиксные суммы (daily_totals) для пачки пользователей; сами users не меняются."""
+    for doc in docs:
+        await rebuild_daily_totals(doc["_id"])
+    return []
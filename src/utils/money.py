@@ -0,0 +1,60 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, NewType
+
+from bson import Decimal128
+
+# ────────────── 💵 Деньги в центах ──────────────
+# Каноническое представление суммы — целое число центов (int64 в MongoDB).
+# Суммирование в аналитике идёт по целым (точно и через $sum в MongoDB),
+# в Decimal/float переводим только на границе API.
+
+Cents = NewType("Cents", int)
+
+CENT = Decimal("0.01")
+
+
+def to_cents(value: Decimal | Decimal128 | float | int | str) -> Cents:
+    """Сумма -> центы с округлением половины вверх (12.345 -> 1235)."""
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    amount = value if isinstance(value, Decimal) else Decimal(str(value))
+    return Cents(int(amount.quantize(CENT, rounding=ROUND_HALF_UP) * 100))
+
+
+def from_cents(cents: int) -> Decimal:
+    """Центы -> Decimal с двумя знаками (1235 -> Decimal("12.35"))."""
+    return Decimal(cents).scaleb(-2)
+
+
+def sum_cents(rows: list[dict[str, Any]]) -> Cents:
+    return Cents(sum(row["amount_cents"] for row in rows))
+
+
+# amount * 100 в Decimal128 — то же число, что to_cents получает из str(amount)
+_AMOUNT_X100: dict[str, Any] = {"$multiply": [{"$toDecimal": "$amount"}, 100]}
+_HALF = Decimal128("0.5")
+
+# $round в MongoDB округляет половину к чётному (1234.5 -> 1234), а to_cents —
+# от нуля (-> 1235); поэтому округляем сами: $trunc($$x ± 0.5)
+_ROUND_HALF_UP_X: dict[str, Any] = {
+    "$trunc": [
+        {
+            "$cond": [
+                {"$lt": ["$$x", 0]},
+                {"$subtract": ["$$x", _HALF]},
+                {"$add": ["$$x", _HALF]},
+            ]
+        },
+        0,
+    ]
+}
+
+# Выражение агрегации: amount_cents документа, а для ещё не мигрированных
+# документов — вычисленное из amount по тем же правилам, что to_cents
+# (пока не прошла миграция *-amount-cents)
+AMOUNT_CENTS_EXPR: dict[str, Any] = {
+    "$ifNull": [
+        "$amount_cents",
+        {"$let": {"vars": {"x": _AMOUNT_X100}, "in": {"$toLong": _ROUND_HALF_UP_X}}},
+    ]
+}
@@ -0,0 +1,104 @@
+import threading
+from typing import Any
+
+from pymongo import monitoring
+
+from src.utils.metrics import register_metrics
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    🏊 Метрики пула соединений MongoDB по событиям CMAP:
+    сколько соединений открыто и занято, сколько ждали checkout.
+
+    События приходят из потоков драйвера (Motor работает через executor),
+    поэтому счётчики защищены блокировкой.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.open = 0  # Открытые соединения
+        self.in_use = 0  # Выданные запросам прямо сейчас
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.wait_total_seconds = 0.0
+        self.wait_max_seconds = 0.0
+
+    # ────────────── 🔌 Соединения ──────────────
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    # ────────────── ⏳ Checkout / checkin ──────────────
+
+    def connection_check_out_started(
+        self, event: monitoring.ConnectionCheckOutStartedEvent
+    ) -> None:
+        pass
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        # duration (секунды) есть в событиях начиная с PyMongo 4.7
+        wait = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_total_seconds += wait
+            self.wait_max_seconds = max(self.wait_max_seconds, wait)
+
+    def connection_check_out_failed(
+        self, event: monitoring.ConnectionCheckOutFailedEvent
+    ) -> None:
+        wait = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_max_seconds = max(self.wait_max_seconds, wait)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    # ────────────── 🗂️ Пул ──────────────
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "open": self.open,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "wait_avg_ms": round(self.wait_total_seconds / self.checkouts * 1000, 3)
+                if self.checkouts
+                else 0.0,
+                "wait_max_ms": round(self.wait_max_seconds * 1000, 3),
+            }
+
+
+pool_metrics = PoolMetricsListener()
+
+register_metrics("mongo_pool", pool_metrics.stats)
@@ -0,0 +1,6 @@
+def normalize_name(name: str) -> str:
+    """
+    Приводит название к виду для сравнения:
+    без пробелов по краям, с одиночными пробелами внутри и без учёта регистра.
+    """
+    return " ".join(name.split()).casefold()
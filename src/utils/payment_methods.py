@@ -0,0 +1,103 @@
+from beanie import PydanticObjectId
+from pymongo.errors import DuplicateKeyError
+
+from src.models import BankAccount, PaymentMethod
+from src.utils.normalization import normalize_name
+
+# Каналы оплаты Plaid -> названия методов, которые создаются у пользователя
+PLAID_CHANNEL_METHODS = {
+    "online": "Plaid - Online",
+    "in store": "Plaid - Card",
+    "other": "Plaid - Other",
+}
+PLAID_UNKNOWN_METHOD = "Plaid - Unknown"
+
+
+async def get_or_create_payment_method(
+    user_id: PydanticObjectId, name: str, icon: str | None = None
+) -> PaymentMethod:
+    """
+    Находит метод пользователя по нормализованному имени или создаёт новый.
+    Параллельную вставку того же имени отсекает уникальный индекс.
+    """
+    name_normalized = normalize_name(name)
+    method = await PaymentMethod.find_one(
+        PaymentMethod.user_id == user_id, PaymentMethod.name_normalized == name_normalized
+    )
+    if method:
+        return method
+
+    method = PaymentMethod(name=name.strip(), icon=icon, user_id=user_id)
+    try:
+        _ = await method.insert()
+    except DuplicateKeyError:
+        existing = await PaymentMethod.find_one(
+            PaymentMethod.user_id == user_id, PaymentMethod.name_normalized == name_normalized
+        )
+        if existing is None:
+            raise
+        return existing
+
+    return method
+
+
+async def resolve_payment_method(
+    user_id: PydanticObjectId,
+    payment_method_id: PydanticObjectId | None,
+    name: str | None,
+) -> tuple[PydanticObjectId | None, str | None] | None:
+    """
+    Приводит способ оплаты транзакции к паре (payment_method_id, name).
+    - передан ID — имя берётся из метода (None, если метода нет у пользователя)
+    - передано только имя — ищем метод по нормализованному имени;
+      неизвестное имя сохраняется как есть, без ID
+    """
+    if payment_method_id is not None:
+        method = await PaymentMethod.get(payment_method_id)
+        if method is None or method.user_id != user_id:
+            return None
+        return method.id, method.name
+
+    if not name:
+        return None, name
+
+    method = await PaymentMethod.find_one(
+        PaymentMethod.user_id == user_id, PaymentMethod.name_normalized == normalize_name(name)
+    )
+    if method is not None:
+        return method.id, method.name
+
+    return None, name
+
+
+class PlaidPaymentMethodResolver:
+    """
+    💳 Сопоставляет банковские транзакции Plaid с методами оплаты пользователя:
+    - карта пользователя с теми же последними 4 цифрами, что и у счёта
+    - иначе метод по каналу оплаты Plaid ("Plaid - Online", "Plaid - Card", ...)
+
+    Один экземпляр на синхронизацию: найденные методы кэшируются,
+    чтобы не ходить в базу на каждую транзакцию.
+    """
+
+    def __init__(self, user_id: PydanticObjectId) -> None:
+        self.user_id = user_id
+        self._by_last4: dict[str, PaymentMethod] | None = None
+        self._by_channel: dict[str, PaymentMethod] = {}
+
+    async def resolve(self, account: BankAccount, payment_channel: str | None) -> PaymentMethod:
+        if self._by_last4 is None:
+            methods = await PaymentMethod.find(
+                PaymentMethod.user_id == self.user_id, {"last4": {"$ne": None}}
+            ).to_list()
+            self._by_last4 = {m.last4: m for m in methods if m.last4}
+
+        if account.mask and account.mask in self._by_last4:
+            return self._by_last4[account.mask]
+
+        name = PLAID_CHANNEL_METHODS.get(payment_channel or "", PLAID_UNKNOWN_METHOD)
+        if name not in self._by_channel:
+            self._by_channel[name] = await get_or_create_payment_method(
+                self.user_id, name, icon="🏦"
+            )
+        return self._by_channel[name]
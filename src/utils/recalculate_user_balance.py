@@ -1,8 +1,28 @@
 from decimal import Decimal
 
 from beanie import PydanticObjectId
+from beanie.operators import Inc, Set
 
-from src.models import BankTransaction, Transaction, User
+from src.auth.user_cache import invalidate_user
+from src.models import BankTransaction, Transaction, TransactionType, User
+from src.schemas.projections import BankTransactionBalanceRow, TransactionBalanceRow
+from src.utils.money import from_cents
+
+
+def signed_amount(transaction_type: TransactionType, amount: Decimal) -> Decimal:
+    """Влияние транзакции на баланс: доход — плюс, расход — минус."""
+    return amount if transaction_type == TransactionType.INCOME else -amount
+
+
+async def apply_balance_delta(user: User, delta: Decimal) -> None:
+    """
+    Атомарно меняет баланс через $inc (без перезаписи всего документа)
+    и сбрасывает пользователя из кэша во всех воркерах.
+    """
+    if delta == Decimal("0"):
+        return
+    _ = await user.update(Inc({User.balance: delta}))
+    await invalidate_user(user.id)
 
 
 async def recalculate_user_balance(user_id: PydanticObjectId) -> None:
@@ -10,25 +30,26 @@ async def recalculate_user_balance(user_id: PydanticObjectId) -> None:
     if not user:
         return
 
-    balance = Decimal("0")
+    balance_cents = 0
 
     # Ручные транзакции
-    manual_txns = await Transaction.find(Transaction.user_id == user_id).to_list()
+    manual_txns = await Transaction.find(
+        Transaction.user_id == user_id, projection_model=TransactionBalanceRow
+    ).to_list()
     for txn in manual_txns:
-        if txn.type == "income":
-            balance += txn.amount
+        if txn.type == TransactionType.INCOME:
+            balance_cents += txn.amount_cents
         else:
-            balance -= txn.amount
+            balance_cents -= txn.amount_cents
 
-    # Банковские транзакции
-    bank_txns = await BankTransaction.find(BankTransaction.user_id == user_id).to_list()
+    # Банковские транзакции: Plaid доходы — отрицательные по amount
+    bank_txns = await BankTransaction.find(
+        BankTransaction.user_id == user_id, projection_model=BankTransactionBalanceRow
+    ).to_list()
     for txn in bank_txns:
-        # Plaid доходы — отрицательные по amount
-        amount = Decimal(str(txn.amount))
-        if txn.amount < 0:
-            balance += abs(amount)
-        else:
-            balance -= amount
+        balance_cents -= txn.amount_cents
+
+    balance = from_cents(balance_cents)
 
-    user.balance = balance
-    _ = await user.save()
+    _ = await user.update(Set({User.balance: balance}))
+    await invalidate_user(user_id)
@@ -0,0 +1,35 @@
+from decimal import Decimal
+from typing import Any, override
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+
+def mongo_json_default(obj: Any) -> Any:
+    """Типы из BSON и моделей, которые orjson не умеет сериализовать сам."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class MongoORJSONResponse(JSONResponse):
+    """
+    ⚡ JSON-ответ через orjson.
+    Понимает ObjectId/Decimal128/Decimal, наивные даты из MongoDB считает UTC ("...Z"),
+    поэтому сырые dict из агрегаций можно отдавать без Pydantic.
+    """
+
+    media_type = "application/json"
+
+    @override
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=mongo_json_default,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z,
+        )
@@ -0,0 +1,68 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class TTLCache[K, V]:
+    """
+    🧠 Ограниченный LRU-кэш с TTL для записей.
+
+    - при переполнении вытесняется самая давно использованная запись
+    - запись живёт ttl секунд (или до своего expires_at, если он передан)
+    - считает попадания и промахи для метрик
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[V, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            # ⏳ Запись протухла — выбрасываем
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+
+        # 🧹 Вытесняем самые старые записи
+        while len(self._data) > self.maxsize:
+            _ = self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        _ = self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+        }
@@ -0,0 +1,11 @@
+import os
+
+# Обязательные настройки src.config: тестам нужны только сами модули, не сервисы
+for name, value in {
+    "MONGODB_URI": "mongodb://localhost:27017/tests",
+    "SECRET_KEY": "tests",
+    "PLAID_CLIENT_ID": "tests",
+    "PLAID_SECRET": "tests",
+    "PLAID_ENV": "sandbox",
+}.items():
+    _ = os.environ.setdefault(name, value)
@@ -0,0 +1,108 @@
+import asyncio
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from beanie import PydanticObjectId
+
+from src.routers import ai
+from src.utils.ai_tips import tips_cache
+
+
+class FakeCompletions:
+    """chat.completions AsyncOpenAI: считает вызовы и отвечает с задержкой."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def create(self, **kwargs: Any) -> SimpleNamespace:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        message = SimpleNamespace(content="Совет 1\nСовет 2\nСовет 3")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeOpenAI:
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=FakeCompletions())
+
+
+@pytest.fixture
+def spending(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Траты за месяц без MongoDB; возвращает список сохранённых отпечатков."""
+    saved: list[str] = []
+
+    async def load_month_spending(user: Any) -> tuple[dict[str, Decimal], Decimal]:
+        return {"Coffee": Decimal("42.50")}, Decimal("42.50")
+
+    async def get_stored_tips(*args: Any) -> None:
+        return None
+
+    async def save_tips(user_id: Any, month: str, fingerprint: str, tips: list[str]) -> None:
+        saved.append(fingerprint)
+
+    async def build_rule_tips(*args: Any) -> list[str]:
+        return ["rules"]
+
+    monkeypatch.setattr(ai, "load_month_spending", load_month_spending)
+    monkeypatch.setattr(ai, "get_stored_tips", get_stored_tips)
+    monkeypatch.setattr(ai, "save_tips", save_tips)
+    monkeypatch.setattr(ai, "build_rule_tips", build_rule_tips)
+    tips_cache.clear()
+    return saved
+
+
+def test_concurrent_identical_requests_call_openai_once(spending: list[str]) -> None:
+    client = FakeOpenAI()
+    user = SimpleNamespace(id=PydanticObjectId())
+
+    async def scenario() -> list[dict[str, Any]]:
+        return await asyncio.gather(*(ai.get_ai_tips(user, client) for _ in range(20)))
+
+    responses = asyncio.run(scenario())
+
+    assert client.chat.completions.calls == 1
+    assert len(spending) == 1
+    assert all(response["engine"] == ai.ENGINE_OPENAI for response in responses)
+    assert all(response["tips"] == ["Совет 1", "Совет 2", "Совет 3"] for response in responses)
+
+    # Следующий запрос с теми же тратами берёт ответ из кэша
+    _ = asyncio.run(ai.get_ai_tips(user, client))
+    assert client.chat.completions.calls == 1
+
+
+def test_different_users_are_not_coalesced(spending: list[str]) -> None:
+    client = FakeOpenAI()
+    users = [SimpleNamespace(id=PydanticObjectId()) for _ in range(3)]
+
+    async def scenario() -> None:
+        _ = await asyncio.gather(*(ai.get_ai_tips(user, client) for user in users * 5))
+
+    asyncio.run(scenario())
+
+    assert client.chat.completions.calls == len(users)
+
+
+def test_cache_hit_skips_rule_queries(
+    spending: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client = FakeOpenAI()
+    user = SimpleNamespace(id=PydanticObjectId())
+    rule_calls = 0
+
+    async def build_rule_tips(*args: Any) -> list[str]:
+        nonlocal rule_calls
+        rule_calls += 1
+        return ["rules"]
+
+    monkeypatch.setattr(ai, "build_rule_tips", build_rule_tips)
+
+    _ = asyncio.run(ai.get_ai_tips(user, client))
+    assert rule_calls == 1
+
+    # Ответ уже в кэше: ни OpenAI, ни бюджетов с прошлым месяцем
+    response = asyncio.run(ai.get_ai_tips(user, client))
+    assert response["tips"] == ["Совет 1", "Совет 2", "Совет 3"]
+    assert client.chat.completions.calls == 1
+    assert rule_calls == 1
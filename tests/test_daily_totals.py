@@ -0,0 +1,155 @@
+import asyncio
+from collections import defaultdict
+from datetime import UTC, date, datetime
+from decimal import Decimal
+from typing import Any
+
+import pytest
+from beanie import PydanticObjectId, init_beanie
+from mongomock_motor import AsyncMongoMockClient
+
+from src.database import DOCUMENT_MODELS
+from src.models import DailyTotal, Transaction, TransactionType, User
+from src.utils import daily_totals
+from src.utils.calendar import day_label
+from src.utils.money import to_cents
+
+START = date(2026, 10, 1)
+
+
+async def init_db() -> None:
+    await init_beanie(database=AsyncMongoMockClient()["tests"], document_models=DOCUMENT_MODELS)
+
+
+async def add_expense(user: User, amount: str, day: int, category: str = "Food") -> Transaction:
+    transaction = Transaction(
+        user_id=user.id,
+        amount=Decimal(amount),
+        type=TransactionType.EXPENSE,
+        category=category,
+        date=datetime(2026, 10, day, 12, tzinfo=UTC),
+    )
+    _ = await transaction.insert()
+    return transaction
+
+
+async def totals_from_python(user_id: PydanticObjectId, timezone: str) -> list[DailyTotal]:
+    """
+    Та же раскладка, что и агрегация rebuild_daily_totals, но на Python:
+    mongomock не умеет $unionWith и $dateToString с поясом.
+    """
+    by_key: dict[tuple[str, str | None], dict[datetime, int]] = defaultdict(
+        lambda: defaultdict(int)
+    )
+    async for transaction in Transaction.find(Transaction.user_id == user_id):
+        for category in (transaction.category, None):
+            by_key[(transaction.type.value, category)][
+                day_label(transaction.date.date())
+            ] += to_cents(transaction.amount)
+
+    totals: list[DailyTotal] = []
+    for (kind, category), by_day in by_key.items():
+        cumulative = 0
+        for day in sorted(by_day):
+            cumulative += by_day[day]
+            totals.append(
+                DailyTotal(
+                    user_id=user_id,
+                    type=TransactionType(kind),
+                    category=category,
+                    day=day,
+                    amount_cents=by_day[day],
+                    cumulative_cents=cumulative,
+                )
+            )
+    return totals
+
+
+@pytest.fixture(autouse=True)
+def no_background_rebuilds(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(daily_totals, "schedule_rebuild", lambda user_id: None)
+
+
+def test_write_during_rebuild_is_not_lost(monkeypatch: pytest.MonkeyPatch) -> None:
+    seen_during_rebuild: list[Any] = []
+
+    async def scenario() -> None:
+        await init_db()
+        user = User(email="totals@example.com", first_name="T", last_name="T")
+        _ = await user.insert()
+        _ = await add_expense(user, "10.00", 1)
+        _ = await add_expense(user, "5.50", 2)
+
+        passes = 0
+
+        async def compute(user_id: PydanticObjectId, timezone: str) -> list[DailyTotal]:
+            nonlocal passes
+            passes += 1
+            totals = await totals_from_python(user_id, timezone)
+            if passes == 1:
+                # Запрос создаёт транзакцию, когда агрегация уже прочитала данные
+                stored = await User.get_motor_collection().find_one({"_id": user.id})
+                seen_during_rebuild.append(stored["daily_totals_timezone"])
+                transaction = await add_expense(user, "7.25", 3)
+                await daily_totals.record_transaction(transaction, UTC)
+            return totals
+
+        monkeypatch.setattr(daily_totals, "_compute_daily_totals", compute)
+        await daily_totals.rebuild_daily_totals(user.id)
+
+        # Второй проход учёл запись, которая пришла во время первого
+        assert passes == 2
+        fresh = await User.get(user.id)
+        assert fresh is not None
+        assert daily_totals.daily_totals_ready(fresh)
+        assert not fresh.daily_totals_dirty and fresh.daily_totals_rebuild_until is None
+        expense = TransactionType.EXPENSE
+        assert await daily_totals.get_range_cents(fresh, expense, START) == 2275
+        assert await daily_totals.get_range_cents(fresh, expense, START, category="Food") == 2275
+
+    asyncio.run(scenario())
+
+    # Пока шёл пересчёт, суммы не считались готовыми — чтения шли по транзакциям
+    assert seen_during_rebuild == [None]
+
+
+def test_write_after_rebuild_updates_totals(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(daily_totals, "_compute_daily_totals", totals_from_python)
+
+    async def scenario() -> None:
+        await init_db()
+        user = User(email="after@example.com", first_name="T", last_name="T")
+        _ = await user.insert()
+        _ = await add_expense(user, "10.00", 2)
+        await daily_totals.rebuild_daily_totals(user.id)
+
+        transaction = await add_expense(user, "1.00", 1)
+        await daily_totals.record_transaction(transaction, UTC)
+
+        fresh = await User.get(user.id)
+        assert fresh is not None and daily_totals.daily_totals_ready(fresh)
+        assert await daily_totals.get_range_cents(fresh, TransactionType.EXPENSE, START) == 1100
+
+    asyncio.run(scenario())
+
+
+def test_range_at_calendar_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(daily_totals, "_compute_daily_totals", totals_from_python)
+
+    async def scenario() -> None:
+        await init_db()
+        user = User(email="limits@example.com", first_name="T", last_name="T")
+        _ = await user.insert()
+        _ = await add_expense(user, "3.00", 5)
+        await daily_totals.rebuild_daily_totals(user.id)
+
+        fresh = await User.get(user.id)
+        assert fresh is not None
+        expense = TransactionType.EXPENSE
+        assert await daily_totals.get_range_cents(fresh, expense, date.min, date.max) == 300
+
+    asyncio.run(scenario())
+
+    # Окно запасного пути по транзакциям прижимается к границам дат
+    assert daily_totals._shift_day(day_label(date.min), -1) == day_label(date.min)
+    assert daily_totals._shift_day(day_label(date.max), 2).date() == date.max
@@ -0,0 +1,46 @@
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Тяжёлые SDK грузятся только при первом использовании (см. src/integrations)
+LAZY_MODULES = ("openai", "google.auth", "plaid.api.plaid_api")
+
+# Бюджет на импорт src.app (накопленное время из -X importtime, лучший из RUNS).
+# Замер: ~1.3 с (лучший из 8, 1.27–1.47 с); если снова грузить openai и
+# plaid_api при импорте — ~2.0 с
+IMPORT_BUDGET_SECONDS = 1.8
+RUNS = 3
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| src\.app$", re.MULTILINE)
+
+
+def import_app(*args: str, code: str = "import src.app") -> subprocess.CompletedProcess[str]:
+    # Отдельный процесс: в этом sys.modules всё уже импортировали другие тесты
+    return subprocess.run(
+        [sys.executable, *args, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+
+def test_app_import_skips_lazy_sdks() -> None:
+    code = "import json, sys; import src.app; print(json.dumps(sorted(sys.modules)))"
+    loaded = set(json.loads(import_app(code=code).stdout.splitlines()[-1]))
+
+    assert not [
+        name
+        for name in loaded
+        if any(name == lazy or name.startswith(f"{lazy}.") for lazy in LAZY_MODULES)
+    ]
+
+
+def test_app_import_time_budget() -> None:
+    timings: list[float] = []
+    for _ in range(RUNS):
+        match = IMPORTTIME_LINE.search(import_app("-X", "importtime").stderr)
+        assert match is not None
+        timings.append(int(match.group(1)) / 1_000_000)
+
+    assert min(timings) < IMPORT_BUDGET_SECONDS, f"import src.app: {timings}"
@@ -0,0 +1,32 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config import config
+from src.routers import metrics
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(config, "METRICS_TOKEN", "metrics-secret")
+    app = FastAPI()
+    app.include_router(metrics.router)
+    return TestClient(app)
+
+
+def test_metrics_require_token(client: TestClient) -> None:
+    assert client.get("/metrics/").status_code == 401
+    assert client.get("/metrics/", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+def test_metrics_with_token(client: TestClient) -> None:
+    response = client.get("/metrics/", headers={"Authorization": "Bearer metrics-secret"})
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
+
+
+def test_metrics_closed_without_configured_token(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config, "METRICS_TOKEN", None)
+    assert client.get("/metrics/", headers={"Authorization": "Bearer "}).status_code == 401
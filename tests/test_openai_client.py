@@ -0,0 +1,18 @@
+import pytest
+
+from src.config import config
+from src.integrations.openai import get_openai_client
+
+
+@pytest.mark.parametrize("base_url", [None, ""])
+def test_empty_base_url_keeps_openai_default(
+    monkeypatch: pytest.MonkeyPatch, base_url: str | None
+) -> None:
+    _ = pytest.importorskip("openai")
+    monkeypatch.setattr(config, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(config, "OPENAI_BASE_URL", base_url)
+    get_openai_client.cache_clear()
+    try:
+        assert str(get_openai_client().base_url) == "https://api.openai.com/v1/"
+    finally:
+        get_openai_client.cache_clear()
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any
+
+import fakeredis
+import pytest
+from beanie import PydanticObjectId
+
+from src.auth import user_cache as user_cache_module
+from src.auth.user_cache import RedisInvalidationBackend, UserCache
+
+USER_ID = str(PydanticObjectId())
+
+
+class FakeUser:
+    """Вместо документа User: кэшу нужен только model_copy."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def model_copy(self, deep: bool = False) -> "FakeUser":
+        return FakeUser(self.name)
+
+
+def redis_backend(server: fakeredis.FakeServer) -> RedisInvalidationBackend:
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return RedisInvalidationBackend(client=client)
+
+
+async def wait_until(condition: Any, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_invalidation_reaches_other_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def get_user(user_id: PydanticObjectId) -> FakeUser:
+        return FakeUser("stored")
+
+    monkeypatch.setattr(user_cache_module.User, "get", get_user)
+
+    async def scenario() -> None:
+        server = fakeredis.FakeServer()
+        first, second = UserCache(maxsize=10, ttl=60), UserCache(maxsize=10, ttl=60)
+        await first.start(redis_backend(server))
+        await second.start(redis_backend(server))
+        try:
+            _ = await first.get_user(USER_ID)
+            _ = await second.get_user(USER_ID)
+            assert len(second._cache) == 1
+
+            await first.invalidate(USER_ID)
+            assert len(first._cache) == 0
+            await wait_until(lambda: len(second._cache) == 0)
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(scenario())
+
+
+def test_load_racing_with_invalidate_is_not_cached(monkeypatch: pytest.MonkeyPatch) -> None:
+    loading = asyncio.Event()
+    release = asyncio.Event()
+
+    async def get_user(user_id: PydanticObjectId) -> FakeUser:
+        loading.set()
+        await release.wait()
+        return FakeUser("before update")
+
+    monkeypatch.setattr(user_cache_module.User, "get", get_user)
+
+    async def scenario() -> None:
+        cache = UserCache(maxsize=10, ttl=60)
+        load = asyncio.create_task(cache.get_user(USER_ID))
+        _ = await loading.wait()
+
+        # Документ изменили, пока чтение из MongoDB ещё не вернулось
+        await cache.invalidate(USER_ID)
+        release.set()
+
+        user = await load
+        assert user is not None and user.name == "before update"
+        assert len(cache._cache) == 0
+        assert not cache._generations and not cache._loading
+
+    asyncio.run(scenario())
+
+
+def test_listener_reconnects_and_resets_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def get_user(user_id: PydanticObjectId) -> FakeUser:
+        return FakeUser("stored")
+
+    monkeypatch.setattr(user_cache_module.User, "get", get_user)
+    monkeypatch.setattr(user_cache_module, "RECONNECT_MIN_DELAY", 0.01)
+
+    async def scenario() -> None:
+        server = fakeredis.FakeServer()
+        backend = redis_backend(server)
+        cache = UserCache(maxsize=10, ttl=60)
+        await cache.start(backend)
+        try:
+            _ = await cache.get_user(USER_ID)
+
+            # Redis пропал: слушатель не падает, а переподключается
+            server.connected = False
+            await wait_until(lambda: backend._pubsub is None)
+            server.connected = True
+            await wait_until(lambda: backend._pubsub is not None)
+
+            # Пропущенные за это время инвалидации не оставляют старых записей
+            assert len(cache._cache) == 0
+            _ = await cache.get_user(USER_ID)
+            publisher = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+            for _attempt in range(100):
+                _ = await publisher.publish("user-cache-invalidation", USER_ID)
+                if not len(cache._cache):
+                    break
+                await asyncio.sleep(0.01)
+            assert len(cache._cache) == 0
+        finally:
+            await cache.close()
+
+    asyncio.run(scenario())